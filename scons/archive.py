@@ -4,6 +4,7 @@ import os
 import shutil
 import sys
 import importlib
+import importlib.util
 import tarfile
 import zipfile
 #import requests
@@ -17,8 +18,11 @@ and applying unified diffs as patches
 
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'techtonik'))
 #print(os.path.join(os.path.realpath(__file__), 'techtonik'))
-patch = importlib.import_module('patch')
-wget = importlib.import_module('wget')
+
+# The 'patch' and 'wget' modules pull in urllib and logging, so they're only loaded
+# by the functions using them rather than by every build script importing this one.
+# SCons resets sys.path after reading the build scripts, so they're loaded by path.
+_techtonik_directory = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'techtonik')
 
 # ----------------------------------------------------------------------------------------------- #
 
@@ -83,6 +87,8 @@ def download_url_in_urlfile(target, source, env):
     @param  source  Expected to contain only one file, the url list file
     @param  env     SCons build environment"""
 
+    wget = _load_techtonik_module('wget')
+
     urls = split_lines(source[0].get_text_contents())
     for url in urls:
         try:
@@ -178,6 +184,7 @@ def apply_patch(patchfile_path, target_directory = None):
     @param  patchfile_path    Path to the unified diff file containing patching instructions
     @param  target_directory  Base directory the patch will be applied in"""
 
+    patch = _load_techtonik_module('patch')
     patchset = patch.fromfile(patchfile_path)
 
     if target_directory is None:
@@ -186,3 +193,26 @@ def apply_patch(patchfile_path, target_directory = None):
         patchset.apply(root = target_directory)
 
 # ----------------------------------------------------------------------------------------------- #
+
+def _load_techtonik_module(module_name):
+    """Loads one of the modules bundled in the 'techtonik' directory
+
+    @param  module_name  Name of the module that will be loaded, i.e. 'wget'
+    @returns The loaded module
+    @remarks
+        Build actions run after SCons has reset sys.path, so the module is loaded
+        from its file rather than searched for."""
+
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    module_specification = importlib.util.spec_from_file_location(
+        module_name, os.path.join(_techtonik_directory, module_name + '.py')
+    )
+    module = importlib.util.module_from_spec(module_specification)
+    module_specification.loader.exec_module(module)
+    sys.modules[module_name] = module
+
+    return module
+
+# ----------------------------------------------------------------------------------------------- #
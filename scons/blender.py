@@ -3,11 +3,15 @@
 import os
 import shutil
 import platform
+import importlib
 import re
 
 if platform.system() == 'Windows':
     import winreg
 
+memorybudget = importlib.import_module('memorybudget')
+hashcache = importlib.import_module('hashcache')
+
 # ----------------------------------------------------------------------------------------------- #
 
 # Paths in which the Blender executables can be found on Windows systems
@@ -23,6 +27,9 @@ _blender_windows_path = {
 # Default version of Blender we will use
 _default_blender_version = '2.7'
 
+# Memory in MiB a Blender export is assumed to need unless BLENDER_MEMORY_ESTIMATE is set
+_default_memory_estimate = 2048
+
 # ----------------------------------------------------------------------------------------------- #
 
 def setup(environment):
@@ -37,6 +44,8 @@ def setup(environment):
     environment.AddMethod(_export_animations_fbx_or_collada, "export_animations_collada")
     environment.AddMethod(_export_animations_gltf, "export_animations_gltf")
 
+    environment.SetDefault(BLENDER_MEMORY_ESTIMATE = _default_memory_estimate)
+
 # ----------------------------------------------------------------------------------------------- #
 
 def enumerate_blendfiles(root_directory, variant_directory = None):
@@ -197,7 +206,7 @@ def _export_fbx_or_collada(environment, target_path, blendfile_path, meshes = No
 
     # Finally, invoke Blender to export the model using an export script that
     # gets executed by Blender itself
-    return environment.Command(
+    export_command = environment.Command(
         source = blendfile_path,
         action = (
             '"' + blender_executable + '" "$SOURCE"' +
@@ -210,6 +219,10 @@ def _export_fbx_or_collada(environment, target_path, blendfile_path, meshes = No
         ),
         target = target_path
     )
+    _set_export_memory_estimate(environment, export_command)
+    hashcache.prefetch_sources(export_command)
+
+    return export_command
 
 # ----------------------------------------------------------------------------------------------- #
 
@@ -260,10 +273,24 @@ def _export_animations_fbx_or_collada(
         ),
         target = target_path
     )
+    _set_export_memory_estimate(environment, export_command)
     environment.Depends(export_command, animation_blendfile_path)
+    hashcache.prefetch_sources(export_command)
 
 # ----------------------------------------------------------------------------------------------- #
 
 def _export_animations_gltf(environment):
     pass
 
+# ----------------------------------------------------------------------------------------------- #
+
+def _set_export_memory_estimate(environment, export_command):
+    """Lets an export wait for memory if links or other exports already use up the budget
+
+    @param  environment     Environment that may specify a BLENDER_MEMORY_ESTIMATE in MiB
+    @param  export_command  Targets produced by the export"""
+
+    if 'BLENDER_MEMORY_ESTIMATE' in environment:
+        memorybudget.set_memory_estimate(export_command, environment['BLENDER_MEMORY_ESTIMATE'])
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+import sys
+import argparse
+import importlib
+
+"""
+Critical path and parallelism report for traced builds
+
+Analyzes the trace written by a build with TRACE=1 enabled. Combines the measured
+durations of the build's targets with their dependencies to find the longest chain
+of targets that had to be built one after another (the critical path), how well the
+available worker slots were used and which targets, if built faster, would shorten
+the build the most.
+
+Run it after a traced build:
+
+    python buildreport.py obj/trace.json
+"""
+
+shared = importlib.import_module('shared')
+
+# ----------------------------------------------------------------------------------------------- #
+
+def analyze_trace(trace_events):
+    """Analyzes the build events recorded in a trace
+
+    @param  trace_events  Events from a trace file written by a traced build
+    @returns A dictionary with the results of the analysis
+    @remarks
+        The critical path assumes an unlimited number of worker slots. It is the lower
+        bound for the build's wall clock time that adding more jobs can't improve."""
+
+    targets = _get_build_targets(trace_events)
+    if len(targets) == 0:
+        raise ValueError('The trace contains no build events')
+
+    (critical_path_durations, predecessors) = _get_longest_chains(targets)
+
+    # Walk back from the target that completes the longest chain
+    last_target = max(critical_path_durations, key = critical_path_durations.get)
+    critical_path = []
+    current_target = last_target
+    while not (current_target is None):
+        critical_path.append(current_target)
+        current_target = predecessors[current_target]
+    critical_path.reverse()
+
+    build_start = min(target['start'] for target in targets.values())
+    build_end = max(target['start'] + target['duration'] for target in targets.values())
+    wall_time = build_end - build_start
+
+    busy_time = sum(target['duration'] for target in targets.values())
+    worker_slot_count = len(set(target['worker_slot'] for target in targets.values()))
+
+    return {
+        'wall_time': wall_time,
+        'busy_time': busy_time,
+        'worker_slot_count': worker_slot_count,
+        'average_parallelism': (busy_time / wall_time) if (wall_time > 0) else 1.0,
+        'idle_slot_time': max(worker_slot_count * wall_time - busy_time, 0),
+        'critical_path': [
+            (name, targets[name]['duration']) for name in critical_path
+        ],
+        'critical_path_duration': critical_path_durations[last_target],
+        'speedup_candidates': _get_speedup_candidates(
+            targets, critical_path, critical_path_durations[last_target]
+        )
+    }
+
+# ----------------------------------------------------------------------------------------------- #
+
+def print_report(analysis, candidate_count = 10):
+    """Prints the results of a trace analysis to the console
+
+    @param  analysis         Analysis results as returned by analyze_trace()
+    @param  candidate_count  Maximum number of speed-up candidates to list"""
+
+    print('Wall clock time:          {:>10.2f}s'.format(analysis['wall_time']))
+    print('Time spent building:      {:>10.2f}s'.format(analysis['busy_time']))
+    print('Worker slots used:        {:>10}'.format(analysis['worker_slot_count']))
+    print('Average parallelism:      {:>10.2f}'.format(analysis['average_parallelism']))
+    print('Idle slot time:           {:>10.2f}s'.format(analysis['idle_slot_time']))
+    print('Critical path:            {:>10.2f}s'.format(analysis['critical_path_duration']))
+    print('')
+
+    print('Critical path (' + str(len(analysis['critical_path'])) + ' targets):')
+    for name, duration in analysis['critical_path']:
+        print('  {:>8.2f}s  {}'.format(duration, name))
+    print('')
+
+    print('Targets whose speed-up would shorten the critical path the most:')
+    for name, duration, saving in analysis['speedup_candidates'][0:candidate_count]:
+        print(
+            '  {:>8.2f}s saved if instant ({:.2f}s now)  {}'.format(saving, duration, name)
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_build_targets(trace_events):
+    """Extracts the built targets and their dependencies from a list of trace events
+
+    @param  trace_events  Events from a trace file written by a traced build
+    @returns A dictionary of targets by name with their timings and dependencies"""
+
+    targets = {}
+    aliases = {}
+
+    for event in trace_events:
+        if event.get('ph') != 'X':
+            continue
+
+        arguments = event.get('args', {})
+        name = event['name']
+        targets[name] = {
+            'start': event['ts'] / 1000000.0,
+            'duration': event['dur'] / 1000000.0,
+            'worker_slot': event.get('tid', 0),
+            'dependencies': arguments.get('dependencies', [])
+        }
+
+        # Targets built as a side effect of another target point to the same event
+        for additional_target in arguments.get('targets', []):
+            aliases[additional_target] = name
+
+    # Resolve dependencies on side effect targets and drop those that weren't built
+    for target in targets.values():
+        dependencies = set()
+        for dependency in target['dependencies']:
+            dependency = aliases.get(dependency, dependency)
+            if dependency in targets:
+                dependencies.add(dependency)
+        target['dependencies'] = dependencies
+
+    return targets
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_longest_chains(targets, excluded_target = None):
+    """Determines the longest chain of dependent targets ending at each target
+
+    @param  targets          Targets with their durations and dependencies
+    @param  excluded_target  Target whose duration will be treated as zero
+    @returns A tuple with the length of the longest chain ending at each target and
+             the predecessor of each target within that chain"""
+
+    chain_durations = {}
+    predecessors = {}
+
+    # A target can only start after its dependencies have finished, so processing
+    # them by their start times visits dependencies before the targets needing them
+    for name in sorted(targets, key = lambda name: targets[name]['start']):
+        target = targets[name]
+
+        longest_dependency = None
+        longest_duration = 0.0
+        for dependency in target['dependencies']:
+            dependency_duration = chain_durations.get(dependency, 0.0)
+            if (longest_dependency is None) or (dependency_duration > longest_duration):
+                longest_dependency = dependency
+                longest_duration = dependency_duration
+
+        if name == excluded_target:
+            chain_durations[name] = longest_duration
+        else:
+            chain_durations[name] = longest_duration + target['duration']
+        predecessors[name] = longest_dependency
+
+    return (chain_durations, predecessors)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_speedup_candidates(targets, critical_path, critical_path_duration):
+    """Determines how much the critical path would shrink if a target built instantly
+
+    @param  targets                 Targets with their durations and dependencies
+    @param  critical_path           Names of the targets on the critical path
+    @param  critical_path_duration  Duration of the critical path
+    @returns A list of (name, duration, saving) tuples, largest saving first
+    @remarks
+        Only targets on the critical path can shorten it. Once a target is removed,
+        another chain may become the critical one, so the saving can be less than
+        the target's own duration."""
+
+    candidates = []
+
+    for name in critical_path:
+        (chain_durations, predecessors) = _get_longest_chains(targets, name)
+        saving = critical_path_duration - max(chain_durations.values())
+        if saving >= 0.001: # Ignore savings below the trace's useful resolution
+            candidates.append((name, targets[name]['duration'], saving))
+
+    candidates.sort(key = lambda candidate: candidate[2], reverse = True)
+    return candidates
+
+# ----------------------------------------------------------------------------------------------- #
+
+def main(arguments):
+    """Prints the critical path report for a trace file
+
+    @param  arguments  Command line arguments without the script name
+    @returns The exit code for the process"""
+
+    parser = argparse.ArgumentParser(
+        description = 'Critical path and parallelism report for a traced build'
+    )
+    parser.add_argument(
+        'trace_file', nargs = '?', default = 'obj/trace.json',
+        help = 'trace written by a build with TRACE=1 (default: obj/trace.json)'
+    )
+    parser.add_argument(
+        '--top', type = int, default = 10,
+        help = 'number of speed-up candidates to list (default: 10)'
+    )
+    options = parser.parse_args(arguments)
+
+    trace = shared.load_json_file(options.trace_file)
+    if trace is None:
+        print('Could not read trace file ' + options.trace_file, file = sys.stderr)
+        return 1
+
+    try:
+        analysis = analyze_trace(trace.get('traceEvents', []))
+    except ValueError as error:
+        print(str(error), file = sys.stderr)
+        return 1
+
+    print_report(analysis, options.top)
+    return 0
+
+# ----------------------------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+import atexit
+import importlib
+import threading
+import time
+
+import SCons.Script.Main
+
+from SCons.Node.FS import Dir
+
+"""
+Build timing trace for SCons builds
+
+Records when each target was built, on which worker thread and with which command.
+At the end of the build, the recorded events are written as a Chrome trace-event
+file that can be opened in Perfetto or chrome://tracing and the slowest targets
+are listed on the console.
+"""
+
+shared = importlib.import_module('shared')
+buildreport = importlib.import_module('buildreport')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Number of targets listed in the summary printed at the end of the build
+_summary_target_count = 10
+
+# Path the trace will be written to, None while tracing is disabled
+_trace_file_path = None
+
+# Completed build events, each a dictionary in Chrome's trace-event format
+_events = []
+
+# Worker slot numbers assigned to the threads SCons runs its build tasks on
+_worker_slots = {}
+
+# Extra information about the target a worker thread is currently building
+_current_task = threading.local()
+
+# Build tasks are executed on several threads, so the event list needs protection
+_events_lock = threading.Lock()
+
+# Time at which tracing started, all timestamps in the trace are relative to it
+_start_time = None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(trace_file_path):
+    """Starts recording the time taken by each build task
+
+    @param  trace_file_path  Path the Chrome trace-event file will be written to
+    @remarks
+        Tracing hooks into SCons' build task, so it covers every builder, including
+        those running Python functions instead of commands. Enabling it more than
+        once has no effect beyond the first call."""
+
+    global _trace_file_path, _start_time
+
+    if not (_trace_file_path is None):
+        return
+
+    _trace_file_path = trace_file_path
+    _start_time = time.perf_counter()
+
+    original_execute = SCons.Script.Main.BuildTask.execute
+
+    def traced_execute(task):
+        _execute_traced_task(task, original_execute)
+
+    SCons.Script.Main.BuildTask.execute = traced_execute
+
+    atexit.register(_finish_build)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def is_enabled():
+    """Checks whether build tasks are currently being traced
+
+    @returns True if tracing has been enabled, otherwise False"""
+
+    return not (_trace_file_path is None)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def annotate(key, value):
+    """Attaches additional information to the target being built on the calling thread
+
+    @param  key    Name under which the information will appear in the trace
+    @param  value  Information that will be stored, must be serializable to JSON
+    @remarks
+        Builders implemented in Python can use this to, for example, tell whether
+        a target was restored from a cache. Does nothing if tracing is disabled."""
+
+    arguments = getattr(_current_task, 'arguments', None)
+    if not (arguments is None):
+        arguments[key] = value
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _execute_traced_task(task, original_execute):
+    """Executes a SCons build task and records how long it took
+
+    @param  task              Build task that will be executed
+    @param  original_execute  Original execute method of SCons' build task"""
+
+    arguments = {}
+    _current_task.arguments = arguments
+
+    start_time = time.perf_counter()
+    try:
+        original_execute(task)
+    finally:
+        end_time = time.perf_counter()
+        _current_task.arguments = None
+        _record_task(task, start_time, end_time, arguments)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _record_task(task, start_time, end_time, arguments):
+    """Adds a completed build task to the trace
+
+    @param  task        Build task that has been executed
+    @param  start_time  Performance counter value when the task started
+    @param  end_time    Performance counter value when the task ended
+    @param  arguments   Additional information about the task"""
+
+    target = task.targets[0]
+    if isinstance(target, Dir) or not target.has_builder():
+        return # Directories are only created, not built
+
+    executor = target.get_executor()
+    if len(executor.get_action_list()) == 0:
+        return # Aliases and other targets that only group other targets
+
+    arguments['command'] = str(executor)
+    arguments['targets'] = [ str(node) for node in task.targets ]
+
+    # Record the built inputs so the critical path through the build can be determined
+    dependencies = set()
+    for node in task.targets:
+        for child in node.children(scan = False):
+            if child.has_builder() and not isinstance(child, Dir):
+                dependencies.add(str(child))
+    arguments['dependencies'] = sorted(dependencies)
+
+    with _events_lock:
+        thread_id = threading.get_ident()
+        worker_slot = _worker_slots.get(thread_id)
+        if worker_slot is None:
+            worker_slot = len(_worker_slots)
+            _worker_slots[thread_id] = worker_slot
+
+        _events.append(
+            {
+                'name': str(target),
+                'cat': 'build',
+                'ph': 'X',
+                'ts': int((start_time - _start_time) * 1000000),
+                'dur': int((end_time - start_time) * 1000000),
+                'pid': 1,
+                'tid': worker_slot,
+                'args': arguments
+            }
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _finish_build():
+    """Writes the trace file and prints the slowest targets when SCons exits"""
+
+    if len(_events) == 0:
+        return
+
+    trace_events = []
+    for worker_slot in sorted(_worker_slots.values()):
+        trace_events.append(
+            {
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': 1,
+                'tid': worker_slot,
+                'args': { 'name': 'Worker ' + str(worker_slot) }
+            }
+        )
+    trace_events.extend(_events)
+
+    shared.save_json_file(
+        _trace_file_path, { 'traceEvents': trace_events, 'displayTimeUnit': 'ms' }
+    )
+
+    slowest_events = sorted(_events, key = lambda event: event['dur'], reverse = True)
+    print('Slowest targets (trace written to ' + _trace_file_path + '):')
+    for event in slowest_events[0:_summary_target_count]:
+        print('  {:>8.2f}s  {}'.format(event['dur'] / 1000000.0, event['name']))
+
+    analysis = buildreport.analyze_trace(trace_events)
+    print(
+        'Critical path: {:.2f}s over {} targets, average parallelism {:.2f} '.format(
+            analysis['critical_path_duration'],
+            len(analysis['critical_path']),
+            analysis['average_parallelism']
+        ) +
+        '(run buildreport.py on the trace for details)'
+    )
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+
+import os
+import atexit
+import hashlib
+import importlib
+import subprocess
+import tempfile
+import threading
+import zlib
+import lzma
+
+from SCons.Script import Action
+from SCons.Subst import SUBST_CMD
+
+"""
+Object file cache for C/C++ builds
+
+Compile commands are routed through a cache that stores object files under the hash
+of the preprocessed source code, the compiler command line and the compiler binary's
+fingerprint. Because the object file's own path is not part of the hash, an object
+compiled once can be reused for any variant directory that compiles the same source
+with the same settings, i.e. after switching branches or build configurations.
+"""
+
+shared = importlib.import_module('shared')
+cplusplus = importlib.import_module('cplusplus')
+buildtrace = importlib.import_module('buildtrace')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Construction variables holding the compile commands that will be routed through the cache
+_compile_command_variables = [ 'CCCOM', 'SHCCCOM', 'CXXCOM', 'SHCXXCOM' ]
+
+# Version of the cache entry format, changing it invalidates all existing entries
+_cache_format_version = '1'
+
+# Tags stored in the first byte of each cache entry to identify its compression
+_compression_tags = {
+    'none': b'N',
+    'zlib': b'Z',
+    'lzma': b'X'
+}
+
+# Hits, misses and stores of the current build, reported when the build ends
+_statistics = {
+    'hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'uncacheable': 0
+}
+
+# Object files are compiled on several threads, so the statistics need protection
+_statistics_lock = threading.Lock()
+
+# Cache directories that had objects stored in them and their configured size limits
+_size_limits = {}
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(environment, maximum_size, compression = 'zlib', cache_directory = None):
+    """Routes the C/C++ compile commands of an environment through the object file cache
+
+    @param  environment      Environment whose compile commands will be cached
+    @param  maximum_size     Maximum size of the cache in bytes. When it is exceeded,
+                             the least recently used object files are evicted.
+    @param  compression      Compression for cache entries ('none', 'zlib' or 'lzma')
+    @param  cache_directory  Directory holding the cache, defaults to a directory
+                             in the user's cache directory shared by all projects"""
+
+    if not (compression in _compression_tags):
+        raise ValueError('Unknown compile cache compression "' + str(compression) + '"')
+
+    if cache_directory is None:
+        cache_directory = shared.get_cache_directory('objects')
+
+    environment['COMPILE_CACHE_DIRECTORY'] = os.path.abspath(cache_directory)
+    environment['COMPILE_CACHE_MAXIMUM_SIZE'] = maximum_size
+    environment['COMPILE_CACHE_COMPRESSION'] = compression
+
+    # Replace the compile commands with an action that checks the cache first.
+    # The original command is kept in a separate variable, it will be executed
+    # on a cache miss and its expansion also becomes the action's build signature.
+    for command_variable in _compile_command_variables:
+        uncached_command_variable = 'UNCACHED_' + command_variable
+        if uncached_command_variable in environment:
+            continue # Cache already enabled in this environment or the one it was cloned from
+
+        environment[uncached_command_variable] = environment[command_variable]
+        environment[command_variable] = Action(
+            _create_cached_compile_function(uncached_command_variable),
+            strfunction = _create_compile_string_function(uncached_command_variable),
+            varlist = [ uncached_command_variable ]
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_statistics():
+    """Returns the hits, misses and stores of the object file cache in the current build
+
+    @returns A dictionary with the number of hits, misses, stores and uncacheable compiles"""
+
+    with _statistics_lock:
+        return dict(_statistics)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_uncached_command_variable(action):
+    """Looks up the variable holding the original compile command of a cached compile
+
+    @param  action  SCons action that will be checked
+    @returns The name of the variable holding the original compile command or None
+             if the action is not a compile routed through the object file cache"""
+
+    execute_function = getattr(action, 'execfunction', None)
+    return getattr(execute_function, 'uncached_command_variable', None)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _create_cached_compile_function(uncached_command_variable):
+    """Creates a SCons function action that compiles a source file through the cache
+
+    @param  uncached_command_variable  Variable holding the original compile command
+    @returns A function that can be used as a SCons action"""
+
+    def cached_compile(target, source, env):
+        return _compile_with_cache(target, source, env, uncached_command_variable)
+
+    # Lets other tools find the original command behind the action
+    cached_compile.uncached_command_variable = uncached_command_variable
+
+    return cached_compile
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _create_compile_string_function(uncached_command_variable):
+    """Creates a function that displays the original compile command when compiling
+
+    @param  uncached_command_variable  Variable holding the original compile command
+    @returns A function that can be used as a SCons action's string function"""
+
+    def compile_string(target, source, env):
+        return env.subst('$' + uncached_command_variable, SUBST_CMD, target, source)
+
+    return compile_string
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _compile_with_cache(target, source, env, uncached_command_variable):
+    """Provides an object file from the cache or compiles it and stores it in the cache
+
+    @param  target                     Expected to contain only one file, the object file
+    @param  source                     Expected to contain only one file, the source file
+    @param  env                        SCons build environment
+    @param  uncached_command_variable  Variable holding the original compile command
+    @returns The exit code of the compiler or 0 if the object file came from the cache"""
+
+    cache_key = None
+    if (len(target) == 1) and (len(source) == 1):
+        cache_key = _get_cache_key(target, source, env, uncached_command_variable)
+
+    if cache_key is None:
+        with _statistics_lock:
+            _statistics['uncacheable'] += 1
+        buildtrace.annotate('compile_cache', 'uncacheable')
+        return _run_uncached_compile(target, source, env, uncached_command_variable)
+
+    cache_directory = env['COMPILE_CACHE_DIRECTORY']
+    entry_path = os.path.join(cache_directory, cache_key[:2], cache_key)
+    object_path = str(target[0])
+
+    if _restore_cache_entry(entry_path, object_path):
+        with _statistics_lock:
+            _statistics['hits'] += 1
+        buildtrace.annotate('compile_cache', 'hit')
+        return 0
+
+    exit_code = _run_uncached_compile(target, source, env, uncached_command_variable)
+    with _statistics_lock:
+        _statistics['misses'] += 1
+    buildtrace.annotate('compile_cache', 'miss')
+
+    if (exit_code == 0) and os.path.isfile(object_path):
+        if _store_cache_entry(entry_path, object_path, env['COMPILE_CACHE_COMPRESSION']):
+            with _statistics_lock:
+                _statistics['stores'] += 1
+                _size_limits[cache_directory] = env['COMPILE_CACHE_MAXIMUM_SIZE']
+
+    return exit_code
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _run_uncached_compile(target, source, env, uncached_command_variable):
+    """Runs the original compile command
+
+    @param  target                     Object file that will be produced
+    @param  source                     Source file that will be compiled
+    @param  env                        SCons build environment
+    @param  uncached_command_variable  Variable holding the original compile command
+    @returns The exit code of the compiler"""
+
+    compile_action = Action('$' + uncached_command_variable)
+    return compile_action(target, source, env, show = False)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_cache_key(target, source, env, uncached_command_variable):
+    """Calculates the key under which an object file is stored in the cache
+
+    @param  target                     Object file that will be produced
+    @param  source                     Source file that will be compiled
+    @param  env                        SCons build environment
+    @param  uncached_command_variable  Variable holding the original compile command
+    @returns The cache key or None if the compile can't be cached"""
+
+    # The Microsoft compiler writes debug information into a shared PDB file,
+    # we can't restore that from a cache, so only GCC and clang are supported.
+    if cplusplus.get_compiler_name(env) == 'msvc':
+        return None
+
+    compiler_fingerprint = cplusplus.get_compiler_fingerprint(env)
+    if compiler_fingerprint is None:
+        return None
+
+    command_lines = env.subst_list('$' + uncached_command_variable, SUBST_CMD, target, source)
+    if len(command_lines) != 1:
+        return None
+
+    object_path = str(target[0])
+
+    # Form the command line without the output file (so a hit works for any variant
+    # directory) and the command line that runs only the preprocessor
+    key_arguments = []
+    preprocess_arguments = []
+    include_working_directory = False
+
+    arguments = [ str(argument) for argument in command_lines[0] ]
+    index = 0
+    while index < len(arguments):
+        argument = arguments[index]
+        if argument == '-o':
+            index += 2
+            continue
+        elif argument.startswith('-o') and (argument[2:] == object_path):
+            index += 1
+            continue
+
+        # The dependency file is written next to the object file, so its path is left out
+        # of the key. Preprocessing still writes it, which also covers cache hits.
+        if argument == '-MF':
+            preprocess_arguments.extend(arguments[index:index + 2])
+            index += 2
+            continue
+        elif argument.startswith('-MF'):
+            preprocess_arguments.append(argument)
+            index += 1
+            continue
+
+        # Objects optimized with profile data also depend on the profile files,
+        # which can change without the command line or the source changing
+        if argument.startswith('-fprofile-use'):
+            return None
+
+        # Split debug information goes into a .dwo file next to the object file,
+        # which the cache doesn't store
+        if argument == '-gsplit-dwarf':
+            return None
+
+        # Debug information records the working directory, so objects with debug
+        # information can only be shared by builds in the same directory
+        if argument.startswith('-g') and (argument != '-g0'):
+            include_working_directory = True
+
+        key_arguments.append(argument)
+        if argument != '-c':
+            preprocess_arguments.append(argument)
+
+        index += 1
+
+    preprocess_arguments.append('-E')
+
+    try:
+        preprocess_process = subprocess.Popen(
+            preprocess_arguments,
+            stdout = subprocess.PIPE,
+            stderr = subprocess.DEVNULL,
+            env = shared.get_process_environment(env)
+        )
+        (preprocessed_source, stderr) = preprocess_process.communicate()
+    except OSError:
+        return None
+
+    # If preprocessing fails, let the real compile report the error
+    if preprocess_process.returncode != 0:
+        return None
+
+    key_hash = hashlib.sha256()
+    key_hash.update(_cache_format_version.encode('utf-8') + b'\0')
+    key_hash.update(compiler_fingerprint.encode('utf-8') + b'\0')
+    for argument in key_arguments:
+        key_hash.update(argument.encode('utf-8') + b'\0')
+    if include_working_directory:
+        key_hash.update(os.getcwd().encode('utf-8') + b'\0')
+    key_hash.update(preprocessed_source)
+
+    return key_hash.hexdigest()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _restore_cache_entry(entry_path, object_path):
+    """Restores an object file from the cache if the cache contains it
+
+    @param  entry_path   Path of the cache entry for the object file
+    @param  object_path  Path the object file will be written to
+    @returns True if the object file was restored, False if there was no cache entry"""
+
+    try:
+        with open(entry_path, 'rb') as entry_file:
+            contents = entry_file.read()
+    except OSError:
+        return False
+
+    compression_tag = contents[0:1]
+    try:
+        if compression_tag == _compression_tags['zlib']:
+            object_contents = zlib.decompress(contents[1:])
+        elif compression_tag == _compression_tags['lzma']:
+            object_contents = lzma.decompress(contents[1:])
+        elif compression_tag == _compression_tags['none']:
+            object_contents = contents[1:]
+        else:
+            return False
+    except (zlib.error, lzma.LZMAError):
+        return False
+
+    object_directory = os.path.dirname(os.path.abspath(object_path))
+    os.makedirs(object_directory, exist_ok = True)
+    _write_file_atomically(object_path, object_contents)
+
+    # The modification time of the cache entry tracks when it was last used
+    try:
+        os.utime(entry_path)
+    except OSError:
+        pass
+
+    return True
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _store_cache_entry(entry_path, object_path, compression):
+    """Stores an object file in the cache
+
+    @param  entry_path   Path of the cache entry for the object file
+    @param  object_path  Path of the object file that will be stored
+    @param  compression  Compression that will be applied to the cache entry
+    @returns True if the object file was stored, False otherwise"""
+
+    try:
+        with open(object_path, 'rb') as object_file:
+            object_contents = object_file.read()
+    except OSError:
+        return False
+
+    if compression == 'zlib':
+        contents = zlib.compress(object_contents, 1)
+    elif compression == 'lzma':
+        contents = lzma.compress(object_contents, preset = 1)
+    else:
+        contents = object_contents
+
+    try:
+        os.makedirs(os.path.dirname(entry_path), exist_ok = True)
+        _write_file_atomically(entry_path, _compression_tags[compression] + contents)
+    except OSError:
+        return False
+
+    return True
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _write_file_atomically(file_path, contents):
+    """Writes a file via a temporary file so other processes never see it half-written
+
+    @param  file_path  Path of the file that will be written
+    @param  contents   Bytes that will be written into the file"""
+
+    (file_handle, temporary_path) = tempfile.mkstemp(
+        dir = os.path.dirname(os.path.abspath(file_path)), suffix = '.tmp'
+    )
+    try:
+        with os.fdopen(file_handle, 'wb') as temporary_file:
+            temporary_file.write(contents)
+        os.replace(temporary_path, file_path)
+    except:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _evict_least_recently_used(cache_directory, maximum_size):
+    """Deletes the least recently used cache entries until the cache fits its size limit
+
+    @param  cache_directory  Directory holding the object file cache
+    @param  maximum_size     Maximum size of the cache in bytes
+    @returns The size of the cache after eviction"""
+
+    entries = []
+    total_size = 0
+
+    for root, directory_names, file_names in os.walk(cache_directory):
+        for file_name in file_names:
+            if file_name.endswith('.tmp') or file_name == 'statistics.json':
+                continue
+
+            entry_path = os.path.join(root, file_name)
+            try:
+                entry_status = os.stat(entry_path)
+            except OSError:
+                continue
+
+            entries.append((entry_status.st_mtime_ns, entry_status.st_size, entry_path))
+            total_size += entry_status.st_size
+
+    if total_size <= maximum_size:
+        return total_size
+
+    # Evict down to 90% of the limit so the next build doesn't immediately
+    # have to do another full pass over the cache directory
+    target_size = maximum_size * 9 // 10
+    entries.sort()
+    for (modification_time, size, entry_path) in entries:
+        if total_size <= target_size:
+            break
+        try:
+            os.remove(entry_path)
+            total_size -= size
+        except OSError:
+            pass
+
+    return total_size
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _finish_build():
+    """Enforces the cache size limits and reports the cache statistics of the build"""
+
+    statistics = get_statistics()
+
+    cache_size = None
+    for cache_directory, maximum_size in _size_limits.items():
+        cache_size = _evict_least_recently_used(cache_directory, maximum_size)
+
+        # Keep running totals so the long-term hit rate can be checked
+        statistics_path = os.path.join(cache_directory, 'statistics.json')
+        totals = shared.load_json_file(statistics_path, {})
+        for key, value in statistics.items():
+            totals[key] = totals.get(key, 0) + value
+        shared.save_json_file(statistics_path, totals)
+
+    lookups = statistics['hits'] + statistics['misses']
+    if lookups > 0:
+        message = (
+            'Compile cache: ' + str(statistics['hits']) + ' hits, ' +
+            str(statistics['misses']) + ' misses (' +
+            str(statistics['hits'] * 100 // lookups) + '% hit rate)'
+        )
+        if not (cache_size is None):
+            message += ', ' + str(cache_size // (1024 * 1024)) + ' MiB in cache'
+        print(message)
+
+atexit.register(_finish_build)
+
+# ----------------------------------------------------------------------------------------------- #
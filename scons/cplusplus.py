@@ -1,14 +1,34 @@
 #!/usr/bin/env python
 
 import os
+import shutil
 import platform
 import subprocess
+import importlib
+import tempfile
+import fnmatch
 import re
 
 """
 Helpers for building C/C++ projects with SCons
 """
 
+shared = importlib.import_module('shared')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Name of the file in the cache directory that stores compiler probe results
+_compiler_probe_cache_file_name = 'compiler-probes.json'
+
+# Compiler probe results shared by all environments, loaded from disk on first use
+_compiler_probe_cache = None
+
+# Linkers that are much faster than GNU ld, by preference, with the executable to look for
+_fast_linkers = [
+    ('mold', 'mold'),
+    ('lld', 'ld.lld')
+]
+
 # ----------------------------------------------------------------------------------------------- #
 
 def setup(environment):
@@ -98,6 +118,65 @@ def enumerate_sources(source_directory, variant_directory = None):
 
 # ----------------------------------------------------------------------------------------------- #
 
+def group_unity_batches(sources, batch_size, excluded_sources = None):
+    """Groups C++ source code files into batches that can be compiled as a single unit
+
+    @param  sources           Paths of the source code files that will be grouped
+    @param  batch_size        Maximum number of source code files in one batch
+    @param  excluded_sources  File names or wildcard patterns of sources that can not
+                              be compiled together with other sources
+    @returns A tuple of the batches (each a list of source paths) and a list of
+             sources that have to be compiled individually
+    @remarks
+        Sources are grouped by directory and sorted by name, so the same set of files
+        always produces the same batches. Adding or removing a file only affects
+        the batches of the directory it is in. C sources are never batched since
+        the batch files are compiled as C++."""
+
+    unity_file_extensions = [
+        '.C',
+        '.cpp',
+        '.cc',
+        '.cxx'
+    ]
+
+    sources_by_directory = {}
+    individual_sources = []
+
+    for source in sources:
+        file_path = str(source)
+        file_title, file_extension = os.path.splitext(file_path)
+
+        is_excluded = not (file_extension in unity_file_extensions)
+        if (not is_excluded) and (not (excluded_sources is None)):
+            for pattern in excluded_sources:
+                if fnmatch.fnmatch(file_path, pattern):
+                    is_excluded = True
+                elif fnmatch.fnmatch(os.path.basename(file_path), pattern):
+                    is_excluded = True
+
+        if is_excluded:
+            individual_sources.append(source)
+        else:
+            sources_by_directory.setdefault(os.path.dirname(file_path), []).append(file_path)
+
+    batches = []
+
+    for directory in sorted(sources_by_directory.keys()):
+        directory_sources = sorted(sources_by_directory[directory])
+
+        # A lone source file gains nothing from being batched
+        if len(directory_sources) == 1:
+            individual_sources.append(directory_sources[0])
+            continue
+
+        for index in range(0, len(directory_sources), batch_size):
+            batches.append(directory_sources[index:index + batch_size])
+
+    return (batches, individual_sources)
+
+# ----------------------------------------------------------------------------------------------- #
+
 def find_or_guess_include_directory(package_path):
     """Tries to locate the include directory for a package. A package is a typical
     C/C++ library distribution as it could be found in a .tar.gz archive.
@@ -312,16 +391,7 @@ def get_compiler_name(environment):
     @param  environment  Environment from which the compiler will be looked up
     @returns The name of the compiler (or shared name of a group compilers) being used"""
 
-    compiler_executable = None
-
-    if 'CXX' in environment:
-        compiler_executable = environment['CXX']
-        if compiler_executable == "$CC":
-            compiler_executable = environment['CC']
-    elif 'CC' in environment:
-        compiler_executable = environment['CC']
-    else:
-        raise FileNotFoundError('No C/C++ compiler found')
+    compiler_executable = _get_compiler_executable(environment)
 
     if (compiler_executable == 'cl') or (compiler_executable == 'icc'):
         return 'msvc'
@@ -338,30 +408,32 @@ def get_compiler_version(environment):
     """Determines the version number of the C/C++ compiler being used
 
     @param  environment  Environment from which the C/C++ compiler executable will be looked up
-    @returns The compiler version number, as an array of [Major, Minor, Revision]"""
+    @returns The compiler version number, as an array of [Major, Minor, Revision]
+    @remarks
+        Probing the compiler means launching it, so the result is stored in the
+        environment and in the persistent compiler probe cache. The latter is keyed
+        by the compiler binary's fingerprint and shared by all environments."""
 
     # If we already checked which compiler the user is running, just return the cached version
     if 'COMPILER_VERSION' in environment:
         return environment['COMPILER_VERSION']
 
-    compiler_executable = None
-
-    # Pick up the compiler executable provided to us by SCons
-    if 'CXX' in environment:
-        compiler_executable = environment['CXX']
-        if compiler_executable == "$CC":
-	          compiler_executable = environment['CC']
-    elif 'CC' in environment:
-        compiler_executable = environment['CC']
-    else:
-        raise FileNotFoundError('No C/C++ compiler found')
+    compiler_executable = _get_compiler_executable(environment)
 
-    # If it's the Microsoft compiler, do the acrobatics to figure out its version
+    # SCons' own Visual C++ setup may already know the version of the Microsoft compiler
     if (compiler_executable == 'cl') or (compiler_executable == 'icc'):
         if 'MSVC_VERSION' in environment:
             compiler_version = environment['MSVC_VERSION']
             return compiler_version.split('.')
 
+    # See if this exact compiler binary has been probed before
+    probe_results = _get_compiler_probe_results(environment)
+    if (not (probe_results is None)) and ('version' in probe_results):
+        environment['COMPILER_VERSION'] = probe_results['version']
+        return environment['COMPILER_VERSION']
+
+    # If it's the Microsoft compiler, do the acrobatics to figure out its version
+    if (compiler_executable == 'cl') or (compiler_executable == 'icc'):
         if 'MSVS' in environment:
             cl_install_directory = environment['MSVS']['VCINSTALLDIR']
 
@@ -386,10 +458,231 @@ def get_compiler_version(environment):
         return None
 
     environment['COMPILER_VERSION'] = compiler_version.group().split('.')
+
+    if not (probe_results is None):
+        probe_results['version'] = environment['COMPILER_VERSION']
+        probe_results['name'] = get_compiler_name(environment)
+        _save_compiler_probe_cache()
+
     return environment['COMPILER_VERSION']
 
 # ----------------------------------------------------------------------------------------------- #
 
+def supports_compiler_flag(environment, flag):
+    """Checks whether the C/C++ compiler accepts the specified command line flag
+
+    @param  environment  Environment from which the C/C++ compiler executable will be looked up
+    @param  flag         Compiler flag that will be checked, i.e. '-gsplit-dwarf'
+    @returns True if the compiler accepted the flag, False otherwise
+    @remarks
+        The result is stored in the persistent compiler probe cache, so the compiler
+        is only launched the first time a flag is checked for a specific compiler binary."""
+
+    probe_results = _get_compiler_probe_results(environment)
+    if not (probe_results is None):
+        flags = probe_results.setdefault('flags', {})
+        if flag in flags:
+            return flags[flag]
+
+    compiler_executable = _get_compiler_executable(environment)
+    is_msvc = (compiler_executable == 'cl') or (compiler_executable == 'icc')
+
+    # Compile an empty source file with the flag. Warnings are turned into errors
+    # because both GCC and clang only warn about some unknown options.
+    (file_handle, probe_source_path) = tempfile.mkstemp(suffix = '.cpp')
+    os.close(file_handle)
+    try:
+        if is_msvc:
+            arguments = [compiler_executable, '/nologo', '/WX', '/Zs', flag, probe_source_path]
+        else:
+            arguments = [
+                compiler_executable, '-Werror', flag, '-fsyntax-only', probe_source_path
+            ]
+
+        try:
+            probe_process = subprocess.Popen(
+                arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            probe_process.communicate()
+            is_supported = (probe_process.returncode == 0)
+        except OSError:
+            is_supported = False
+    finally:
+        os.remove(probe_source_path)
+
+    if not (probe_results is None):
+        probe_results['flags'][flag] = is_supported
+        _save_compiler_probe_cache()
+
+    return is_supported
+
+# ----------------------------------------------------------------------------------------------- #
+
+def supports_linker_flag(environment, flag):
+    """Checks whether the C/C++ compiler can link an executable with the specified flag
+
+    @param  environment  Environment from which the C/C++ compiler executable will be looked up
+    @param  flag         Linker flag that will be checked, i.e. '-fuse-ld=mold'
+    @returns True if linking with the flag succeeded, False otherwise
+    @remarks
+        Like compiler flags, the result is stored in the persistent compiler probe cache.
+        Only GCC and clang are supported, for the Microsoft linker this returns False."""
+
+    probe_results = _get_compiler_probe_results(environment)
+    if not (probe_results is None):
+        flags = probe_results.setdefault('linker_flags', {})
+        if flag in flags:
+            return flags[flag]
+
+    compiler_executable = _get_compiler_executable(environment)
+    if (compiler_executable == 'cl') or (compiler_executable == 'icc'):
+        return False
+
+    probe_directory = tempfile.mkdtemp()
+    try:
+        probe_source_path = os.path.join(probe_directory, 'probe.cpp')
+        with open(probe_source_path, 'w') as probe_source_file:
+            probe_source_file.write('int main() { return 0; }\n')
+
+        arguments = [
+            compiler_executable, flag, probe_source_path,
+            '-o', os.path.join(probe_directory, 'probe')
+        ]
+
+        try:
+            probe_process = subprocess.Popen(
+                arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            probe_process.communicate()
+            is_supported = (probe_process.returncode == 0)
+        except OSError:
+            is_supported = False
+    finally:
+        shutil.rmtree(probe_directory, ignore_errors = True)
+
+    if not (probe_results is None):
+        probe_results['linker_flags'][flag] = is_supported
+        _save_compiler_probe_cache()
+
+    return is_supported
+
+# ----------------------------------------------------------------------------------------------- #
+
+def find_fast_linker(environment):
+    """Looks for a linker that is faster than GNU ld and usable with the C/C++ compiler
+
+    @param  environment  Environment from which the C/C++ compiler executable will be looked up
+    @returns The linker name to pass via -fuse-ld (i.e. 'mold') or None if only
+             the default linker can be used"""
+
+    for linker_name, linker_executable in _fast_linkers:
+        if environment.WhereIs(linker_executable) is None:
+            continue # Checked every time, so installing the linker later is noticed
+
+        if supports_linker_flag(environment, '-fuse-ld=' + linker_name):
+            return linker_name
+
+    return None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_compiler_fingerprint(environment):
+    """Forms a string that uniquely identifies the compiler binary being used
+
+    @param  environment  Environment from which the C/C++ compiler executable will be looked up
+    @returns The compiler fingerprint or None if the compiler binary could not be found
+    @remarks
+        The fingerprint consists of the compiler's resolved path, size, modification
+        time and inode number. It changes whenever the compiler is replaced or updated."""
+
+    compiler_executable = _get_compiler_executable(environment)
+
+    compiler_path = environment.WhereIs(compiler_executable)
+    if compiler_path is None:
+        if os.path.isfile(compiler_executable):
+            compiler_path = compiler_executable
+        else:
+            return None
+
+    compiler_path = os.path.realpath(compiler_path)
+    try:
+        compiler_status = os.stat(compiler_path)
+    except OSError:
+        return None
+
+    return (
+        compiler_path + '|' +
+        str(compiler_status.st_size) + '|' +
+        str(compiler_status.st_mtime_ns) + '|' +
+        str(compiler_status.st_ino)
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_compiler_executable(environment):
+    """Looks up the C/C++ compiler executable SCons has selected for an environment
+
+    @param  environment  Environment from which the C/C++ compiler executable will be looked up
+    @returns The name or path of the C/C++ compiler executable"""
+
+    if 'CXX' in environment:
+        compiler_executable = environment['CXX']
+        if compiler_executable == "$CC":
+            compiler_executable = environment['CC']
+    elif 'CC' in environment:
+        compiler_executable = environment['CC']
+    else:
+        raise FileNotFoundError('No C/C++ compiler found')
+
+    return compiler_executable
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_compiler_probe_results(environment):
+    """Looks up the persisted probe results for the compiler binary used by an environment
+
+    @param  environment  Environment from which the C/C++ compiler executable will be looked up
+    @returns A dictionary holding the probe results (can be modified to add new results)
+             or None if the compiler binary could not be fingerprinted"""
+
+    global _compiler_probe_cache
+
+    compiler_fingerprint = get_compiler_fingerprint(environment)
+    if compiler_fingerprint is None:
+        return None
+
+    if _compiler_probe_cache is None:
+        _compiler_probe_cache = shared.load_json_file(
+            os.path.join(shared.get_cache_directory(), _compiler_probe_cache_file_name), {}
+        )
+
+    if compiler_fingerprint in _compiler_probe_cache:
+        return _compiler_probe_cache[compiler_fingerprint]
+
+    # This is a new or changed compiler binary. Drop any results recorded for
+    # an earlier binary at the same path, they're stale now.
+    compiler_path = compiler_fingerprint.split('|')[0]
+    for stale_fingerprint in list(_compiler_probe_cache.keys()):
+        if stale_fingerprint.split('|')[0] == compiler_path:
+            del _compiler_probe_cache[stale_fingerprint]
+
+    probe_results = {}
+    _compiler_probe_cache[compiler_fingerprint] = probe_results
+    return probe_results
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _save_compiler_probe_cache():
+    """Writes the compiler probe results to the persistent cache file"""
+
+    if not (_compiler_probe_cache is None):
+        shared.save_json_file(
+            os.path.join(shared.get_cache_directory(), _compiler_probe_cache_file_name),
+            _compiler_probe_cache
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
 def _add_include_directory(environment, include_directory, system = False):
     """Adds an C/C++ include directory to the build
 
@@ -457,11 +750,13 @@ def _add_preprocessor_constant(environment, constant_name, constant_value = None
 
 # ----------------------------------------------------------------------------------------------- #
 
-def _get_build_directory_name(environment):
+def _get_build_directory_name(environment, instrumented = None):
     """Determines the name of the build directory for the current compiler version
     and output settings (such as platform and whether it's a debug or release build)
 
-    @param  environment  Environment for which the build directory will be determined
+    @param  environment   Environment for which the build directory will be determined
+    @param  instrumented  Whether to name the directory of a build instrumented for
+                          profile-guided optimization, defaults to the PGO setting
     @returns The name the build directory should have
     @remarks
         The build directory is a directory whose name uniquely identifies the compiler,
@@ -478,10 +773,18 @@ def _get_build_directory_name(environment):
     if compiler_version is None:
         raise FileNotFoundError("C/C++ compiler could not be found")
 
-    return _make_build_directory_name(
+    build_directory_name = _make_build_directory_name(
         environment, compiler_name, compiler_version[0], compiler_version[1]
     )
 
+    # Instrumented binaries are much slower, so they must not replace the regular ones
+    if instrumented is None:
+        instrumented = ('PGO' in environment) and (environment['PGO'] == 'generate')
+    if instrumented:
+        build_directory_name += '-instrumented'
+
+    return build_directory_name
+
 # ----------------------------------------------------------------------------------------------- #
 
 def _get_variant_directory_name(environment):
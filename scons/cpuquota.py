@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import os
+import math
+import importlib
+
+"""
+Number of CPUs usable by the build
+
+Inside containers and CI pods, os.cpu_count() reports the CPUs of the host even though
+the build may only be allowed to use a few of them. This takes the CPU affinity of the
+build process and the CPU quota of the control group it runs in into account.
+"""
+
+shared = importlib.import_module('shared')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Files providing the CPU quota and period for each control group version
+_cgroup_v1_quota_files = ('cpu.cfs_quota_us', 'cpu.cfs_period_us')
+_cgroup_v2_quota_file = 'cpu.max'
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_usable_cpu_count():
+    """Determines how many CPUs the build can keep busy
+
+    @returns The number of CPUs the build process may use, at least 1"""
+
+    if hasattr(os, 'sched_getaffinity'):
+        cpu_count = len(os.sched_getaffinity(0))
+    else:
+        cpu_count = os.cpu_count() or 1
+
+    cpu_quota = get_cpu_quota()
+    if (not (cpu_quota is None)) and (cpu_quota < cpu_count):
+        cpu_count = cpu_quota
+
+    return max(cpu_count, 1)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_cpu_quota():
+    """Looks up the CPU quota of the control group the build process runs in
+
+    @returns The number of CPUs the quota amounts to, rounded up, or None if
+             the build process is not restricted by a CPU quota
+    @remarks
+        A parent group's quota also applies to the group the build process runs in,
+        so the tightest quota of all the groups is used."""
+
+    for group_directories in shared.get_cgroup_directories('cpu'):
+        tightest_quota = None
+        for group_directory in group_directories:
+            cpu_quota = _read_cpu_quota(group_directory)
+            if (not (cpu_quota is None)) and (
+                (tightest_quota is None) or (cpu_quota < tightest_quota)
+            ):
+                tightest_quota = cpu_quota
+
+        if not (tightest_quota is None):
+            return tightest_quota
+
+    return None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _read_cpu_quota(group_directory):
+    """Reads the CPU quota of a single control group
+
+    @param  group_directory  Directory of the control group in the cgroup file system
+    @returns The number of CPUs the quota amounts to or None if the group has no quota"""
+
+    try:
+        v2_quota_path = os.path.join(group_directory, _cgroup_v2_quota_file)
+        if os.path.isfile(v2_quota_path):
+            with open(v2_quota_path, 'r') as quota_file:
+                (quota, period) = quota_file.read().split()[0:2] # 'max 100000' if unlimited
+        else:
+            quota_paths = [ os.path.join(group_directory, name) for name in _cgroup_v1_quota_files ]
+            with open(quota_paths[0], 'r') as quota_file:
+                quota = quota_file.read().strip() # '-1' if unlimited
+            with open(quota_paths[1], 'r') as period_file:
+                period = period_file.read().strip()
+
+        quota = int(quota)
+        period = int(period)
+    except (OSError, ValueError):
+        return None
+
+    if (quota <= 0) or (period <= 0):
+        return None
+
+    return max(int(math.ceil(quota / period)), 1)
+
+# ----------------------------------------------------------------------------------------------- #
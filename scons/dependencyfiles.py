@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+import os
+import copy
+import json
+import platform
+
+import SCons.Builder
+import SCons.Node
+import SCons.Scanner
+import SCons.Tool
+
+"""
+Dependency tracking for C/C++ builds through compiler-generated dependency files
+
+Instead of parsing sources and headers in Python to find their #includes, the compiler
+writes the headers it actually included into a dependency file next to each object
+file. On the next build, that file provides the object file's implicit dependencies.
+SCons' own C scanner is only used for object files that have not been compiled yet.
+"""
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Object file builders whose sources will be scanned via dependency files
+_object_builder_names = [ 'Object', 'StaticObject', 'SharedObject' ]
+
+# Marks a scanner path that carries the dependencies from a dependency file
+_dependency_file_marker = '<dependency file>'
+
+# Index of the function storing build information for tracked object files in SCons
+_store_info_index = None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(environment):
+    """Makes an environment's object files track their dependencies via dependency files
+
+    @param  environment  Environment in which dependency files will be used
+    @remarks
+        The object file builders are replaced by copies in this environment only,
+        other environments keep using SCons' C scanner."""
+
+    _register_store_info_function()
+
+    if platform.system() == 'Windows':
+        environment.Append(CCFLAGS = [ '/sourceDependencies', '${TARGET}.json' ])
+    else:
+        environment.Append(CCFLAGS = [ '-MMD', '-MF', '${TARGET}.d' ])
+
+    for builder_name in _object_builder_names:
+        if builder_name in environment['BUILDERS']:
+            environment['BUILDERS'][builder_name] = _copy_object_builder(
+                environment['BUILDERS'][builder_name]
+            )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _copy_object_builder(builder):
+    """Creates a copy of an object file builder that uses dependency files
+
+    @param  builder  Object file builder that will be copied
+    @returns The copied builder"""
+
+    # The object file builders pick the compile action by source file suffix.
+    # Only the builder itself is copied, the suffix-to-action table stays shared.
+    if isinstance(builder, SCons.Builder.CompositeBuilder):
+        return SCons.Builder.CompositeBuilder(
+            _copy_object_builder(builder.builder), builder.cmdgen
+        )
+
+    builder = copy.copy(builder)
+    builder.source_scanner = _dependency_file_scanner
+    builder.emitter = _create_object_emitter(builder.emitter)
+    return builder
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _register_store_info_function():
+    """Registers the function that stores build information for tracked object files"""
+
+    global _store_info_index
+
+    if _store_info_index is None:
+        _store_info_index = max(SCons.Node.store_info_map.keys()) + 1
+        SCons.Node.store_info_map[_store_info_index] = _store_info_with_dependency_file
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _create_object_emitter(original_emitter):
+    """Creates an emitter that marks object files so their dependency file is ingested
+
+    @param  original_emitter  Emitter of the object file builder that will be wrapped
+    @returns The new emitter"""
+
+    def emit_object(target, source, env):
+        if original_emitter:
+            (target, source) = original_emitter(target = target, source = source, env = env)
+
+        for node in target:
+            node.disambiguate().store_info = _store_info_index
+
+        return (target, source)
+
+    return emit_object
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _store_info_with_dependency_file(node):
+    """Stores the build information of an object file after rescanning its dependencies
+
+    @param  node  Object file whose build information will be stored
+    @remarks
+        Before the first compile, the object file's dependencies come from SCons'
+        C scanner. Recording the dependencies from the fresh dependency file instead
+        means the next build sees the same dependencies and doesn't recompile."""
+
+    if node.get_state() == SCons.Node.executed:
+        node.implicit = None
+        node.scan()
+
+    SCons.Node.store_info_file(node)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_scanner_path(env, directory, target, source):
+    """Provides the dependencies from an object file's dependency file to the scanner
+
+    @param  env        Environment the object file is compiled in
+    @param  directory  Directory from which relative include paths are resolved
+    @param  target     Object files produced by the compile
+    @param  source     Source files being compiled
+    @returns A tuple holding the dependencies if a dependency file exists, otherwise
+             the include directories for SCons' C scanner"""
+
+    dependencies = None
+    if (len(target) > 0) and (len(source) > 0):
+        dependencies = _read_dependency_file(target[0].abspath)
+
+    if dependencies is None:
+        return SCons.Scanner.FindPathDirs('CPPPATH')(env, directory, target, source)
+    else:
+        source_path = source[0].srcnode().abspath
+        return tuple([ _dependency_file_marker, source_path ] + dependencies)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _scan_source(node, env, path):
+    """Looks up the implicit dependencies of a source or header file
+
+    @param  node  Source or header file whose dependencies will be looked up
+    @param  env   Environment the source file is compiled in
+    @param  path  Scanner path as provided by _get_scanner_path()
+    @returns The files the node depends on"""
+
+    if (len(path) > 0) and isinstance(path[0], str) and (path[0] == _dependency_file_marker):
+
+        # The dependency file lists all headers included by the source, directly or
+        # indirectly, so the headers themselves don't need to be scanned
+        if node.srcnode().abspath != path[1]:
+            return []
+
+        return [ env.File(dependency_path) for dependency_path in path[2:] ]
+
+    fallback_scanner = SCons.Tool.SourceFileScanner.select(node)
+    if fallback_scanner is None:
+        return []
+
+    return fallback_scanner(node, env, path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _read_dependency_file(object_path):
+    """Reads the dependencies the compiler recorded for an object file
+
+    @param  object_path  Path of the object file whose dependency file will be read
+    @returns A list of absolute paths or None if there is no usable dependency file"""
+
+    if platform.system() == 'Windows':
+        dependency_file_path = object_path + '.json'
+    else:
+        dependency_file_path = object_path + '.d'
+
+    try:
+        with open(dependency_file_path, 'r', encoding = 'utf-8', errors = 'replace') as file:
+            contents = file.read()
+    except OSError:
+        return None
+
+    if platform.system() == 'Windows':
+        try:
+            paths = json.loads(contents)['Data']['Includes']
+        except (ValueError, KeyError, TypeError):
+            return None
+    else:
+        paths = _parse_make_dependencies(contents)
+        if paths is None:
+            return None
+
+        # The first prerequisite is the source file itself
+        paths = paths[1:]
+
+    # Paths are relative to the directory the compiler ran in, which is SCons' own
+    dependencies = []
+    for path in paths:
+        absolute_path = os.path.abspath(path)
+        if not (absolute_path in dependencies):
+            dependencies.append(absolute_path)
+
+    return dependencies
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _parse_make_dependencies(contents):
+    """Extracts the prerequisites from a dependency file in makefile syntax
+
+    @param  contents  Contents of a dependency file written by GCC or clang
+    @returns The prerequisites of the first rule or None if no rule was found"""
+
+    contents = contents.replace('\\\r\n', ' ').replace('\\\n', ' ')
+
+    # Look for the colon separating the target from its prerequisites, skipping
+    # drive letters in Windows paths (which are followed by a slash)
+    separator_index = -1
+    for index, character in enumerate(contents):
+        if (character == ':') and ((index + 1 == len(contents)) or contents[index + 1].isspace()):
+            separator_index = index
+            break
+
+    if separator_index == -1:
+        return None
+
+    rule = contents[separator_index + 1:].split('\n', 1)[0]
+
+    prerequisites = []
+    current = ''
+    index = 0
+    while index < len(rule):
+        character = rule[index]
+        if (character == '\\') and (index + 1 < len(rule)) and (rule[index + 1] in ' #'):
+            current += rule[index + 1]
+            index += 2
+            continue
+        elif (character == '$') and (index + 1 < len(rule)) and (rule[index + 1] == '$'):
+            current += '$'
+            index += 2
+            continue
+        elif character.isspace():
+            if len(current) > 0:
+                prerequisites.append(current)
+                current = ''
+        else:
+            current += character
+        index += 1
+
+    if len(current) > 0:
+        prerequisites.append(current)
+
+    return prerequisites
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Scanner that takes dependencies from dependency files and falls back to SCons' scanners
+_dependency_file_scanner = SCons.Scanner.ScannerBase(
+    _scan_source,
+    name = 'DependencyFileScanner',
+    path_function = _get_scanner_path,
+    recursive = True
+)
+
+# ----------------------------------------------------------------------------------------------- #
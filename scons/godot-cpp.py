@@ -123,7 +123,7 @@ def compile(environment, godot_cpp_directory):
 
     return environment.build_scons(
         source = input_files_subset,
-        arguments = '-j8 --directory=' + godot_cpp_directory + ' bits=64' + additional_arguments,
+        arguments = '--directory=' + godot_cpp_directory + ' bits=64' + additional_arguments,
         target = godot_cpp_library_path
     )
 
@@ -3,6 +3,9 @@
 import os
 import shutil
 import platform
+import importlib
+
+hashcache = importlib.import_module('hashcache')
 
 # ----------------------------------------------------------------------------------------------- #
 
@@ -188,10 +191,15 @@ def _call_godot(environment, source, arguments, target):
     #if source is None:
     #    source = godot_executable
 
-    return environment.Command(
+    godot_command = environment.Command(
         target, source, '"' + godot_executable + '" ' + arguments
     )
 
+    # Godot projects tend to have large assets that are slow to hash one by one
+    hashcache.prefetch_sources(godot_command)
+
+    return godot_command
+
 # ----------------------------------------------------------------------------------------------- #
 
 def _export_project(environment):
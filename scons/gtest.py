@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+import os
+import importlib
+import subprocess
+import threading
+import time
+
+from xml.etree import ElementTree
+
+"""
+Sharded runner for Google Test executables
+
+Runs several copies of a unit test executable in parallel, each executing a slice of
+the tests selected through Google Test's sharding environment variables. The XML
+results of the individual shards are merged into a single file for CI servers.
+"""
+
+shared = importlib.import_module('shared')
+buildtrace = importlib.import_module('buildtrace')
+cpuquota = importlib.import_module('cpuquota')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Counters on <testsuites> and <testsuite> elements that are summed when merging shards
+_summed_attributes = [ 'tests', 'failures', 'disabled', 'errors', 'skipped' ]
+
+# Test suite reporting shards that crashed or left no complete result file
+_shard_failure_suite_name = 'UnitTestShards'
+
+# Characters at the end of a failed shard's output that are kept in the result file
+_failure_output_length = 4096
+
+# ----------------------------------------------------------------------------------------------- #
+
+def run_sharded_tests(target, source, env):
+    """Runs a Google Test executable in parallel shards and merges their results
+
+    @param  target  Path of the merged XML result file
+    @param  source  Unit test executable that will be run
+    @param  env     Environment providing TEST_SHARD_COUNT and the process environment
+    @returns Always 0, failed tests are reported in the result file, not as a build error
+    @remarks
+        The shard count is taken from the TEST_SHARD_COUNT construction variable and
+        defaults to the number of CPUs. It is limited to the number of tests so small
+        test suites don't launch processes that have nothing to do."""
+
+    test_executable_path = source[0].abspath
+    result_path = target[0].abspath
+
+    process_environment = shared.get_process_environment(env)
+
+    shard_count = env.get('TEST_SHARD_COUNT')
+    if shard_count is None:
+        shard_count = cpuquota.get_usable_cpu_count()
+    else:
+        shard_count = int(shard_count)
+
+    test_count = _count_tests(test_executable_path, process_environment)
+    if not (test_count is None):
+        shard_count = min(shard_count, test_count)
+    shard_count = max(shard_count, 1)
+
+    shards = []
+    for shard_index in range(shard_count):
+        shards.append(
+            {
+                'index': shard_index,
+                'result_path': result_path + '.shard-' + str(shard_index) + '.xml',
+                'exit_code': None,
+                'output': b'',
+                'seconds': 0.0
+            }
+        )
+
+    threads = []
+    for shard in shards:
+        thread = threading.Thread(
+            target = _run_shard,
+            args = (test_executable_path, shard, shard_count, process_environment)
+        )
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    # Print the output of each shard in one piece so it stays readable
+    for shard in shards:
+        output = shard['output'].decode('utf-8', errors = 'replace')
+        if len(output) > 0:
+            print(output, end = '' if output.endswith('\n') else '\n')
+
+    shard_test_counts = _merge_result_files(shards, result_path)
+    for shard in shards:
+        if os.path.isfile(shard['result_path']):
+            os.remove(shard['result_path'])
+
+    _print_shard_timings(source[0], shards, shard_test_counts)
+    buildtrace.annotate(
+        'shard_seconds', [ round(shard['seconds'], 3) for shard in shards ]
+    )
+
+    # Failing tests don't fail the build, the CI server picks them up from the XML file
+    return 0
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _count_tests(test_executable_path, process_environment):
+    """Asks a Google Test executable how many tests it contains
+
+    @param  test_executable_path  Path of the unit test executable
+    @param  process_environment   Environment variables the executable will be run with
+    @returns The number of tests or None if they could not be listed"""
+
+    try:
+        listing = subprocess.run(
+            [ test_executable_path, '--gtest_list_tests' ],
+            stdout = subprocess.PIPE,
+            stderr = subprocess.DEVNULL,
+            env = process_environment
+        )
+    except OSError:
+        return None
+
+    if listing.returncode != 0:
+        return None
+
+    # Test suites are listed flush left with the test names indented below them
+    test_count = 0
+    for line in listing.stdout.decode('utf-8', errors = 'replace').splitlines():
+        if line.startswith('  ') and len(line.strip()) > 0:
+            test_count += 1
+
+    return test_count
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _run_shard(test_executable_path, shard, shard_count, process_environment):
+    """Runs a single shard of the unit tests
+
+    @param  test_executable_path  Path of the unit test executable
+    @param  shard                 Dictionary describing the shard, receives the results
+    @param  shard_count           Total number of shards the tests are split into
+    @param  process_environment   Environment variables the executable will be run with"""
+
+    shard_environment = dict(process_environment)
+    shard_environment['GTEST_TOTAL_SHARDS'] = str(shard_count)
+    shard_environment['GTEST_SHARD_INDEX'] = str(shard['index'])
+
+    start_time = time.monotonic()
+    try:
+        completed_process = subprocess.run(
+            [ test_executable_path, '--gtest_output=xml:' + shard['result_path'] ],
+            stdout = subprocess.PIPE,
+            stderr = subprocess.STDOUT,
+            env = shard_environment
+        )
+        shard['exit_code'] = completed_process.returncode
+        shard['output'] = completed_process.stdout
+    except OSError as error:
+        shard['output'] = str(error).encode('utf-8') + b'\n'
+
+    shard['seconds'] = time.monotonic() - start_time
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _merge_result_files(shards, merged_result_path):
+    """Merges the XML result files of several shards into a single result file
+
+    @param  shards              Shards that have been run
+    @param  merged_result_path  Path the merged XML file will be written to
+    @returns A list with the number of tests each shard ran, None for shards without results
+    @remarks
+        The shard files are read with a streaming parser, test suites are released as
+        soon as their test cases have been moved into the merged document. Test suites
+        split across several shards are combined into a single test suite again.
+        A shard that crashed or left no complete result file is added as a failed test,
+        so the merged file doesn't look like a passing run without that shard's tests."""
+
+    merged_suites = {}
+    totals = dict.fromkeys(_summed_attributes, 0)
+    total_time = 0.0
+    timestamp = None
+    shard_test_counts = []
+
+    for shard in shards:
+        shard_result_path = shard['result_path']
+        if not os.path.isfile(shard_result_path):
+            _add_shard_failure(
+                merged_suites, totals, shard, 'exited without writing a result file'
+            )
+            shard_test_counts.append(None)
+            continue
+
+        shard_test_count = 0
+        shard_failure_count = 0
+        try:
+            for event, element in ElementTree.iterparse(
+                shard_result_path, events = ('start', 'end')
+            ):
+                if element.tag == 'testsuites':
+                    if event == 'start':
+                        shard_test_count = int(element.get('tests', '0'))
+                        if timestamp is None:
+                            timestamp = element.get('timestamp')
+                    continue
+
+                if (event != 'end') or (element.tag != 'testsuite'):
+                    continue
+
+                suite_name = element.get('name', '')
+                merged_suite = merged_suites.get(suite_name)
+                if merged_suite is None:
+                    merged_suite = ElementTree.Element('testsuite', { 'name': suite_name })
+                    merged_suite.set('time', '0')
+                    for attribute in _summed_attributes:
+                        merged_suite.set(attribute, '0')
+                    merged_suites[suite_name] = merged_suite
+
+                for attribute in _summed_attributes:
+                    count = int(element.get(attribute, '0'))
+                    merged_suite.set(attribute, str(int(merged_suite.get(attribute)) + count))
+                    totals[attribute] += count
+                    if (attribute == 'failures') or (attribute == 'errors'):
+                        shard_failure_count += count
+
+                suite_time = float(element.get('time', '0').rstrip('s') or '0')
+                merged_suite.set('time', _format_time(float(merged_suite.get('time')) + suite_time))
+                total_time += suite_time
+
+                merged_suite.extend(list(element))
+                element.clear()
+
+        except ElementTree.ParseError:
+            print('Unit test results in ' + shard_result_path + ' are incomplete')
+            _add_shard_failure(merged_suites, totals, shard, 'wrote an incomplete result file')
+        else:
+            if (shard['exit_code'] != 0) and (shard_failure_count == 0):
+                _add_shard_failure(
+                    merged_suites, totals, shard, 'failed without reporting a failed test'
+                )
+
+        shard_test_counts.append(shard_test_count)
+
+    merged_root = ElementTree.Element('testsuites', { 'name': 'AllTests' })
+    for attribute in _summed_attributes:
+        merged_root.set(attribute, str(totals[attribute]))
+    merged_root.set('time', _format_time(total_time))
+    if not (timestamp is None):
+        merged_root.set('timestamp', timestamp)
+
+    merged_root.extend(merged_suites.values())
+
+    ElementTree.ElementTree(merged_root).write(
+        merged_result_path, encoding = 'UTF-8', xml_declaration = True
+    )
+
+    return shard_test_counts
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _add_shard_failure(merged_suites, totals, shard, problem):
+    """Records a shard whose tests could not be fully reported as a failed test
+
+    @param  merged_suites  Test suites of the merged document by their names
+    @param  totals         Counters that will be written to the <testsuites> element
+    @param  shard          Shard whose tests went missing
+    @param  problem        Description of what went wrong with the shard"""
+
+    if shard['exit_code'] is None:
+        message = 'Shard ' + str(shard['index']) + ' could not be started'
+    else:
+        message = (
+            'Shard ' + str(shard['index']) + ' ' + problem +
+            ' (exit code ' + str(shard['exit_code']) + ')'
+        )
+
+    suite_name = _shard_failure_suite_name
+    merged_suite = merged_suites.get(suite_name)
+    if merged_suite is None:
+        merged_suite = ElementTree.Element('testsuite', { 'name': suite_name })
+        merged_suite.set('time', '0')
+        for attribute in _summed_attributes:
+            merged_suite.set(attribute, '0')
+        merged_suites[suite_name] = merged_suite
+
+    test_case = ElementTree.SubElement(
+        merged_suite,
+        'testcase',
+        {
+            'name': 'Shard' + str(shard['index']),
+            'classname': suite_name,
+            'status': 'run',
+            'result': 'completed',
+            'time': _format_time(shard['seconds'])
+        }
+    )
+    failure = ElementTree.SubElement(test_case, 'failure', { 'message': message, 'type': '' })
+    failure.text = shard['output'].decode('utf-8', errors = 'replace')[-_failure_output_length:]
+
+    for attribute in ('tests', 'failures'):
+        merged_suite.set(attribute, str(int(merged_suite.get(attribute)) + 1))
+        totals[attribute] += 1
+
+    print(message)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _format_time(seconds):
+    """Formats a duration the way Google Test writes it into its XML files
+
+    @param  seconds  Duration in seconds
+    @returns The duration as a string with millisecond precision"""
+
+    return '{:.3f}'.format(seconds)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _print_shard_timings(test_executable, shards, shard_test_counts):
+    """Prints a table showing how long each shard took to run its tests
+
+    @param  test_executable    Node of the unit test executable that was run
+    @param  shards             Shards that have been run
+    @param  shard_test_counts  Number of tests each shard ran, None if unknown"""
+
+    print('Unit test shards for ' + str(test_executable) + ':')
+    print('  Shard  Tests  Seconds  Exit code')
+
+    for shard, test_count in zip(shards, shard_test_counts):
+        if test_count is None:
+            test_count = '-'
+        if shard['exit_code'] is None:
+            exit_code = '-'
+        else:
+            exit_code = shard['exit_code']
+
+        print(
+            '  {:>5}  {:>5}  {:>7.2f}  {:>9}'.format(
+                shard['index'], test_count, shard['seconds'], exit_code
+            )
+        )
+
+    # The slowest shard determines the wall clock time, compare it to a perfect split
+    slowest_seconds = max(shard['seconds'] for shard in shards)
+    average_seconds = sum(shard['seconds'] for shard in shards) / len(shards)
+    if average_seconds > 0.0:
+        print(
+            '  Slowest shard took {:.2f}x the average of {:.2f} seconds'.format(
+                slowest_seconds / average_seconds, average_seconds
+            )
+        )
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+
+import os
+import mmap
+import time
+import atexit
+import hashlib
+import importlib
+import threading
+
+import SCons.Node.FS
+import SCons.Script
+import SCons.Script.Main
+
+from SCons.Util import flatten
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+"""
+Fast change detection for builds with large assets
+
+Blender files exported to FBX and the assets of Godot projects are often hundreds of
+megabytes in size. SCons' default decider hashes the contents of each dependency and
+re-hashes any file it has not seen unmodified for two days, so builds of asset-heavy
+projects spend most of their time reading gigabytes of unchanged files.
+
+SCons' content decider stays in charge, but the hashes of large files come from
+a persistent hash cache: a large file is trusted to be unchanged while its size,
+modification time (in nanoseconds) and inode match the cache. Small files are hashed
+by SCons as before, SCons' own timestamps only have a resolution of seconds. Large
+files whose attributes changed are hashed through a memory-mapped view with xxHash
+(if installed) or BLAKE2 and, for the sources of asset exports, in a thread pool as
+soon as the build starts.
+
+Because a file's modification time can lie (a clock jumping back, a tool restoring
+old timestamps), a full verification pass can be requested every few days in which
+all dependencies are compared by their contents and the cached hashes are discarded.
+"""
+
+shared = importlib.import_module('shared')
+cpuquota = importlib.import_module('cpuquota')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Files at least this large have their hashes cached, smaller ones are quicker to hash again
+_large_file_size = 1048576
+
+# Version of the cache file's layout, caches of another version are discarded
+_cache_version = 1
+
+# Name of the hash algorithm, stored with each hash so a changed algorithm is noticed
+if xxhash is None:
+    _hash_algorithm = 'blake2b-128'
+else:
+    _hash_algorithm = 'xxh3-128'
+
+# Path the hash cache will be saved to, None while the hash cache is disabled
+_cache_file_path = None
+
+# Cached hashes by absolute path as [ size, mtime_ns, inode, algorithm, hash ] lists
+_cached_hashes = None
+
+# Time of the last full verification pass in seconds since the epoch
+_verification_time = None
+
+# Whether this build compares all dependencies by their contents
+_verifying = False
+
+# Whether the hash cache has been modified since it was loaded
+_cache_modified = False
+
+# Protects the hash cache while the prefetching threads update it
+_cache_lock = threading.Lock()
+
+# Nodes whose large files will be hashed in the background when the build starts
+_prefetched_nodes = []
+
+# Futures of the hashes currently computed in the background, by absolute path
+_pending_hashes = {}
+
+# SCons' own method to hash the contents of a file
+_original_get_content_hash = None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(environment, cache_file_path, verify_interval_days = 0):
+    """Enables the hash cache for the contents of large files
+
+    @param  environment           Environment whose targets will use the hash cache
+    @param  cache_file_path       Path the hash cache will be saved to
+    @param  verify_interval_days  Days after which all dependencies are compared by their
+                                  contents once, 0 to always trust unchanged timestamps
+    @remarks
+        The hash cache is used by all content signatures SCons calculates, so it
+        and the verification pass are set up by the first call only."""
+
+    global _cache_file_path, _original_get_content_hash
+
+    if _cache_file_path is None:
+        _cache_file_path = cache_file_path
+        _load_hash_cache()
+
+        if verify_interval_days > 0:
+            seconds_since_verification = time.time() - _verification_time
+            if seconds_since_verification >= verify_interval_days * 86400:
+                _begin_verification()
+
+        _original_get_content_hash = SCons.Node.FS.File.get_content_hash
+        SCons.Node.FS.File.get_content_hash = _get_content_hash
+
+        original_build_targets = SCons.Script.Main._build_targets
+
+        def build_targets_with_prefetch(*arguments, **keyword_arguments):
+            return _build_targets_with_prefetch(
+                original_build_targets, arguments, keyword_arguments
+            )
+
+        SCons.Script.Main._build_targets = build_targets_with_prefetch
+
+        atexit.register(_save_hash_cache)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def is_verifying():
+    """Tells whether this build compares all dependencies by their contents
+
+    @returns True if the periodic verification pass is running in this build"""
+
+    return _verifying
+
+# ----------------------------------------------------------------------------------------------- #
+
+def prefetch_sources(targets):
+    """Lets the large sources of the specified targets be hashed when the build starts
+
+    @param  targets  Target nodes (as returned by a builder) whose sources will be hashed
+    @remarks
+        SCons decides whether targets are outdated one after another, so hashing the
+        large sources up front in a thread pool keeps it from waiting for the disk."""
+
+    for target in flatten(targets):
+        _prefetched_nodes.extend(target.sources)
+        _prefetched_nodes.extend(target.depends)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_content_hash(node):
+    """Replacement for SCons' method that hashes the contents of a file
+
+    @param  node  File node whose contents will be hashed
+    @returns The hash of the file's contents"""
+
+    if not node.rexists():
+        return _original_get_content_hash(node)
+
+    file_path = node.rfile().get_abspath()
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return _original_get_content_hash(node)
+
+    if file_stat.st_size < _large_file_size:
+        return _original_get_content_hash(node)
+
+    return _get_cached_hash(file_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_cached_hash(file_path):
+    """Looks up the hash of a large file in the cache, hashing the file if needed
+
+    @param  file_path  Absolute path of the file whose hash will be returned
+    @returns The hash of the file's contents"""
+
+    # If the file is being hashed in the background, let that finish
+    with _cache_lock:
+        pending_hash = _pending_hashes.get(file_path)
+    if not (pending_hash is None):
+        pending_hash.result()
+
+    return _hash_file_unless_cached(file_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _hash_file_unless_cached(file_path):
+    """Hashes a large file and caches its hash unless a current hash is already cached
+
+    @param  file_path  Absolute path of the file whose hash will be returned
+    @returns The hash of the file's contents"""
+
+    global _cache_modified
+
+    file_stat = os.stat(file_path)
+    with _cache_lock:
+        cached_hash = _cached_hashes.get(file_path)
+    if _is_cached_hash_current(cached_hash, file_stat):
+        return cached_hash[4]
+
+    content_hash = _hash_file(file_path)
+
+    # Only cache the hash if the file wasn't modified while it was being hashed
+    cached_hash = [
+        file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, _hash_algorithm, content_hash
+    ]
+    if _is_cached_hash_current(cached_hash, os.stat(file_path)):
+        with _cache_lock:
+            _cached_hashes[file_path] = cached_hash
+            _cache_modified = True
+
+    return content_hash
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _is_cached_hash_current(cached_hash, file_stat):
+    """Checks whether a cached hash was computed for the file as it is now
+
+    @param  cached_hash  Entry from the hash cache or None
+    @param  file_stat    Current status of the file as returned by os.stat()
+    @returns True if the cached hash can be used"""
+
+    if cached_hash is None:
+        return False
+
+    return (
+        (cached_hash[0] == file_stat.st_size) and
+        (cached_hash[1] == file_stat.st_mtime_ns) and
+        (cached_hash[2] == file_stat.st_ino) and
+        (cached_hash[3] == _hash_algorithm)
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _hash_file(file_path):
+    """Hashes the contents of a file through a memory-mapped view
+
+    @param  file_path  Path of the file that will be hashed
+    @returns The hash of the file's contents as a hexadecimal string"""
+
+    if xxhash is None:
+        hasher = hashlib.blake2b(digest_size = 16)
+    else:
+        hasher = xxhash.xxh3_128()
+
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size > 0: # Empty files can't be mapped
+            with mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as file_contents:
+                hasher.update(file_contents)
+
+    return hasher.hexdigest()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _build_targets_with_prefetch(original_build_targets, arguments, keyword_arguments):
+    """Starts hashing the registered large files before SCons builds the targets
+
+    @param  original_build_targets  SCons' own function building the targets
+    @param  arguments               Positional arguments for SCons' function
+    @param  keyword_arguments       Keyword arguments for SCons' function
+    @returns Whatever SCons' function returned"""
+
+    global _verification_time, _cache_modified
+
+    executor = _start_prefetching()
+    try:
+        nodes = original_build_targets(*arguments, **keyword_arguments)
+    finally:
+        if not (executor is None):
+            executor.shutdown(wait = True, cancel_futures = True)
+
+    # Only a verification pass that wasn't interrupted counts
+    if _verifying:
+        with _cache_lock:
+            _verification_time = time.time()
+            _cache_modified = True
+
+    return nodes
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _start_prefetching():
+    """Hashes the large files registered via prefetch_sources() in a thread pool
+
+    @returns The thread pool doing the hashing or None if there is nothing to hash"""
+
+    file_paths = []
+    for node in _prefetched_nodes:
+        node = node.disambiguate()
+        if isinstance(node, SCons.Node.FS.File):
+            file_path = node.srcnode().rfile().get_abspath()
+            if not (file_path in file_paths):
+                file_paths.append(file_path)
+
+    uncached_file_paths = []
+    for file_path in file_paths:
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            continue # Generated during the build
+        if file_stat.st_size >= _large_file_size:
+            if not _is_cached_hash_current(_cached_hashes.get(file_path), file_stat):
+                uncached_file_paths.append(file_path)
+
+    if len(uncached_file_paths) == 0:
+        return None
+
+    concurrent_futures = importlib.import_module('concurrent.futures')
+    executor = concurrent_futures.ThreadPoolExecutor(
+        max_workers = min(cpuquota.get_usable_cpu_count(), len(uncached_file_paths)),
+        thread_name_prefix = 'hashcache'
+    )
+
+    with _cache_lock:
+        for file_path in uncached_file_paths:
+            _pending_hashes[file_path] = executor.submit(_prefetch_hash, file_path)
+
+    return executor
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _prefetch_hash(file_path):
+    """Hashes a large file in the background so the hash is cached when SCons needs it
+
+    @param  file_path  Absolute path of the file that will be hashed"""
+
+    try:
+        _hash_file_unless_cached(file_path)
+    except OSError:
+        pass # SCons will report the problem if it needs the file
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _begin_verification():
+    """Makes this build compare all dependencies by their contents"""
+
+    global _verifying, _cached_hashes, _cache_modified
+
+    _verifying = True
+
+    # Also keeps SCons from reusing the stored signatures of files older than two days
+    SCons.Script.SetOption('max_drift', -1)
+
+    with _cache_lock:
+        _cached_hashes = {}
+        _cache_modified = True
+
+    print('Verifying all dependencies by their contents (HASH_VERIFY_DAYS has passed)')
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _load_hash_cache():
+    """Loads the hash cache from the cache file, starting empty if there is none"""
+
+    global _cached_hashes, _verification_time, _cache_modified
+
+    contents = shared.load_json_file(_cache_file_path, {})
+    if (not isinstance(contents, dict)) or (contents.get('version') != _cache_version):
+        contents = {}
+
+    _cached_hashes = contents.get('files', {})
+    _verification_time = contents.get('verified')
+
+    # Without a cache file, the verification interval starts now
+    if _verification_time is None:
+        _verification_time = time.time()
+        _cache_modified = True
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _save_hash_cache():
+    """Saves the hash cache when SCons exits, dropping the hashes of deleted files"""
+
+    with _cache_lock:
+        if not _cache_modified:
+            return
+
+        cached_hashes = {}
+        for file_path, cached_hash in _cached_hashes.items():
+            if os.path.exists(file_path):
+                cached_hashes[file_path] = cached_hash
+
+        contents = {
+            'version': _cache_version,
+            'verified': _verification_time,
+            'files': cached_hashes
+        }
+
+    shared.save_json_file(_cache_file_path, contents)
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+import os
+import importlib
+
+from SCons.Node.FS import File
+
+"""
+Header fan-out and rebuild cost report for C/C++ builds
+
+Goes through the include graph of every compiled translation unit and ranks headers
+by how many translation units include them and how many seconds of compilation
+changing the header would cause. Compile times are taken from a build trace
+(recorded with TRACE=1), so headers whose churn makes incremental builds expensive
+can be found and prioritized for forward declarations or splitting.
+"""
+
+shared = importlib.import_module('shared')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# File extensions of C/C++ headers
+_header_file_extensions = [ '.h', '.hh', '.hpp', '.hxx', '.h++', '.inl', '.inc', '.ipp', '.tcc' ]
+
+# Number of headers listed on the console
+_reported_header_count = 25
+
+# ----------------------------------------------------------------------------------------------- #
+
+def write_header_report(compiled_objects, trace_file_path, report_file_path):
+    """Determines the fan-out and rebuild cost of all headers and writes a report
+
+    @param  compiled_objects  List of (object files, project header directory) tuples
+                              for all object files compiled in the build
+    @param  trace_file_path   Path of the build trace providing compile times
+    @param  report_file_path  Path the JSON report will be written to
+    @remarks
+        Compile times are only known for translation units that were compiled in
+        the traced build, so for meaningful costs, trace a full rebuild first."""
+
+    compile_seconds = _load_compile_seconds(trace_file_path)
+
+    headers = {}
+    translation_unit_count = 0
+    timed_translation_unit_count = 0
+
+    visited_objects = set()
+    for objects, header_directory in compiled_objects:
+        for object_node in objects:
+            if object_node in visited_objects:
+                continue
+            visited_objects.add(object_node)
+
+            translation_unit = str(object_node)
+            translation_unit_count += 1
+
+            seconds = compile_seconds.get(translation_unit)
+            if not (seconds is None):
+                timed_translation_unit_count += 1
+
+            for header, generated_targets in _collect_headers(object_node).items():
+                header_path = header.abspath
+                entry = headers.get(header_path)
+                if entry is None:
+                    entry = {
+                        'header': str(header),
+                        'kind': _get_header_kind(header, header_directory),
+                        'translation_units': [],
+                        'rebuilt_targets': set()
+                    }
+                    headers[header_path] = entry
+
+                entry['translation_units'].append(translation_unit)
+                entry['rebuilt_targets'].add(translation_unit)
+                entry['rebuilt_targets'].update(generated_targets)
+
+    # Changing a header rebuilds the translation units including it and any generated
+    # files in between, such as the precompiled header, each of them only once
+    for entry in headers.values():
+        rebuilt_targets = entry.pop('rebuilt_targets')
+        entry['compile_seconds'] = round(
+            sum(compile_seconds.get(target, 0.0) for target in rebuilt_targets), 3
+        )
+        entry['translation_units'].sort()
+
+    ranked_headers = sorted(
+        headers.values(),
+        key = lambda entry: (entry['compile_seconds'], len(entry['translation_units'])),
+        reverse = True
+    )
+
+    shared.save_json_file(
+        report_file_path,
+        {
+            'translation_units': translation_unit_count,
+            'timed_translation_units': timed_translation_unit_count,
+            'headers': ranked_headers
+        }
+    )
+
+    _print_report(
+        ranked_headers, translation_unit_count, timed_translation_unit_count, report_file_path
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _load_compile_seconds(trace_file_path):
+    """Loads the time each target took to build from a build trace
+
+    @param  trace_file_path  Path of the trace written by a build with TRACE=1
+    @returns A dictionary with the build time in seconds by target path"""
+
+    compile_seconds = {}
+
+    trace = shared.load_json_file(trace_file_path)
+    if trace is None:
+        return compile_seconds
+
+    for event in trace.get('traceEvents', []):
+        if event.get('ph') == 'X':
+            compile_seconds[event['name']] = event['dur'] / 1000000.0
+
+    return compile_seconds
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _collect_headers(object_node):
+    """Collects all headers whose change would cause an object file to be recompiled
+
+    @param  object_node  Object file whose headers will be collected
+    @returns A dictionary of header file nodes, each with a set of the generated files
+             through which the object file depends on the header
+    @remarks
+        Follows generated dependencies, so headers baked into a precompiled header
+        count for all object files using the precompiled header."""
+
+    headers = {}
+    expanded_nodes = set()
+    pending_nodes = [ (object_node, ()) ]
+
+    while len(pending_nodes) > 0:
+        (node, generated_targets) = pending_nodes.pop()
+        for child in node.children():
+            if not isinstance(child.disambiguate(), File):
+                continue # Values, aliases and directories can't be included
+
+            # A header can be reached both directly and through a generated file
+            if _is_header(child):
+                headers.setdefault(child, set()).update(generated_targets)
+
+            if child.has_builder() and not (child in expanded_nodes):
+                expanded_nodes.add(child)
+                pending_nodes.append((child, generated_targets + (str(child),)))
+
+    return headers
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _is_header(node):
+    """Checks whether a file is a C/C++ header
+
+    @param  node  File node that will be checked
+    @returns True if the file is a header, otherwise False"""
+
+    extension = os.path.splitext(node.name)[1].lower()
+    return extension in _header_file_extensions
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_header_kind(header, header_directory):
+    """Determines where a header comes from
+
+    @param  header            Header file node whose origin will be determined
+    @param  header_directory  Absolute path of the header directory of the project
+                              that included the header, None if it has none
+    @returns 'project' for the project's own headers, 'generated' for headers
+             produced by the build and 'package' for all other headers"""
+
+    if header.has_builder():
+        return 'generated'
+
+    if not (header_directory is None):
+        header_path = header.srcnode().abspath
+        if header_path.startswith(header_directory + os.sep):
+            return 'project'
+
+    return 'package'
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _print_report(
+    ranked_headers, translation_unit_count, timed_translation_unit_count, report_file_path
+):
+    """Prints the most expensive headers to the console
+
+    @param  ranked_headers                Headers sorted by their rebuild cost
+    @param  translation_unit_count        Number of translation units in the build
+    @param  timed_translation_unit_count  Number of translation units with compile times
+    @param  report_file_path              Path of the JSON report with all headers"""
+
+    print(
+        'Headers by rebuild cost ({} of {} translation units have compile times):'.format(
+            timed_translation_unit_count, translation_unit_count
+        )
+    )
+    print('  Rebuild s   TUs  Kind       Header')
+
+    for entry in ranked_headers[0:_reported_header_count]:
+        print(
+            '  {:>9.2f}  {:>4}  {:<9}  {}'.format(
+                entry['compile_seconds'], len(entry['translation_units']),
+                entry['kind'], entry['header']
+            )
+        )
+
+    if timed_translation_unit_count < translation_unit_count:
+        print('  Record compile times for all units via a full rebuild with TRACE=1')
+
+    print('Full report written to ' + report_file_path)
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+import os
+import select
+import platform
+import subprocess
+
+import SCons.Script.Main
+
+from SCons.Script import GetOption
+
+"""
+Shared concurrency budget for SCons builds
+
+Acts as the server of GNU make's jobserver protocol: a pipe holds one token for each
+job allowed by SCons' -j option. Every build task holds a token while it runs. Tools
+that can split their work, such as GCC's link-time optimizer (-flto=jobserver) or
+nested SCons builds, only take the tokens that are currently free, so all of them
+together never run more jobs than the outer -j allows.
+"""
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Byte written into the pipe for each token, GNU make uses '+' as well
+_token = b'+'
+
+# Descriptors of the token pipe, None while the jobserver is not running
+_read_descriptor = None
+_write_descriptor = None
+
+# Number of jobs the outer build was started with
+_job_count = 1
+
+# ----------------------------------------------------------------------------------------------- #
+
+def is_supported():
+    """Checks whether the jobserver can be used on the current platform
+
+    @returns True if the jobserver is supported, False otherwise
+    @remarks
+        The jobserver hands its pipe to child processes, which is not possible on
+        Windows (GNU make uses a named semaphore there)."""
+
+    return platform.system() != 'Windows'
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable():
+    """Starts the jobserver with one token for each job allowed by SCons' -j option
+
+    @remarks
+        Only the first call has an effect. Build tasks start holding tokens from here on,
+        so this should happen while the build scripts are read."""
+
+    global _read_descriptor, _write_descriptor, _job_count
+
+    _job_count = max(GetOption('num_jobs') or 1, 1)
+
+    if (not is_supported()) or not (_read_descriptor is None):
+        return
+
+    (_read_descriptor, _write_descriptor) = os.pipe()
+    os.write(_write_descriptor, _token * _job_count)
+
+    original_execute = SCons.Script.Main.BuildTask.execute
+
+    def execute_with_token(task):
+        _execute_with_token(task, original_execute)
+
+    SCons.Script.Main.BuildTask.execute = execute_with_token
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_job_count():
+    """Returns the number of jobs the build was started with
+
+    @returns The number of jobs specified via SCons' -j option"""
+
+    return _job_count
+
+# ----------------------------------------------------------------------------------------------- #
+
+def acquire_free_tokens(maximum_count):
+    """Takes tokens from the jobserver without waiting for busy tokens to be returned
+
+    @param  maximum_count  Maximum number of tokens that will be taken
+    @returns The number of tokens that were taken, these need to be released again
+    @remarks
+        Without a jobserver, all requested tokens are granted, leaving it to the outer
+        -j to limit the number of jobs."""
+
+    if _read_descriptor is None:
+        return max(maximum_count, 0)
+
+    acquired_count = 0
+    while acquired_count < maximum_count:
+        (readable, writable, failed) = select.select([ _read_descriptor ], [], [], 0)
+        if len(readable) == 0:
+            break
+
+        # Another thread or process may take the token first, then this waits until
+        # a token is returned, which is as long as any job runs
+        os.read(_read_descriptor, 1)
+        acquired_count += 1
+
+    return acquired_count
+
+# ----------------------------------------------------------------------------------------------- #
+
+def release_tokens(count):
+    """Returns tokens to the jobserver
+
+    @param  count  Number of tokens that will be returned"""
+
+    if (_write_descriptor is None) or (count <= 0):
+        return
+
+    os.write(_write_descriptor, _token * count)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def spawn(sh, escape, cmd, args, env):
+    """Runs a command with access to the jobserver, replaces SCons' SPAWN function
+
+    @param  sh      Shell the command will be run with
+    @param  escape  Function that escapes arguments for the shell (not used)
+    @param  cmd     Executable that will be run (not used, it's the first argument)
+    @param  args    Arguments forming the command line, including the executable
+    @param  env     Environment variables the command will be run with
+    @returns The exit code of the command
+    @remarks
+        SCons closes all inherited descriptors for the processes it starts, so this
+        passes on the token pipe and tells GNU make compatible tools about it."""
+
+    if _read_descriptor is None:
+        pass_descriptors = ()
+    else:
+        pass_descriptors = (_read_descriptor, _write_descriptor)
+
+        env = dict(env)
+        env['MAKEFLAGS'] = (
+            env.get('MAKEFLAGS', '') +
+            ' -j --jobserver-auth=' + str(_read_descriptor) + ',' + str(_write_descriptor)
+        )
+
+    process = subprocess.Popen(
+        [ sh, '-c', ' '.join(args) ], env = env, close_fds = True, pass_fds = pass_descriptors
+    )
+    return process.wait()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _execute_with_token(task, original_execute):
+    """Executes a SCons build task while holding a token from the jobserver
+
+    @param  task              Build task that will be executed
+    @param  original_execute  Original execute method of SCons' build task"""
+
+    os.read(_read_descriptor, 1)
+    try:
+        original_execute(task)
+    finally:
+        release_tokens(1)
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Link time benchmark for debug builds
+
+Generates a synthetic C++ project with plenty of debug information, compiles it once
+with full debug information and once with split DWARF (the FAST_LINK=1 setup) and
+then measures how long each available linker takes to link it.
+
+Run it to decide whether installing mold or lld is worth it on a machine:
+
+    python linkbenchmark.py --compiler g++ --units 200
+"""
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Linkers that will be tried, by the name passed to -fuse-ld, and whether they can
+# build a GDB index
+_linkers = [
+    ('bfd', False),
+    ('gold', True),
+    ('lld', True),
+    ('mold', True)
+]
+
+# Compiler flags for each debug information mode that will be measured
+_debug_modes = [
+    ('full', [ '-g3', '-ggdb' ]),
+    ('split', [ '-g3', '-ggdb', '-gsplit-dwarf', '-ggnu-pubnames' ])
+]
+
+# ----------------------------------------------------------------------------------------------- #
+
+def run_benchmark(compiler, unit_count, function_count, run_count):
+    """Measures the link times of all available linkers
+
+    @param  compiler        C++ compiler that will compile and link the benchmark project
+    @param  unit_count      Number of translation units the benchmark project consists of
+    @param  function_count  Number of functions in each translation unit
+    @param  run_count       Number of times each link is repeated, the median is reported
+    @returns A list of (linker, mode, median seconds, output size) tuples, None for
+             combinations that could not be linked"""
+
+    work_directory = tempfile.mkdtemp(prefix = 'linkbenchmark-')
+    try:
+        source_paths = _write_sources(work_directory, unit_count, function_count)
+
+        results = []
+        for mode, mode_flags in _debug_modes:
+            object_paths = _compile_sources(compiler, source_paths, mode, mode_flags)
+            if object_paths is None:
+                print('Could not compile the benchmark with ' + mode + ' debug information')
+                continue
+
+            for linker, supports_gdb_index in _linkers:
+                link_arguments = [ compiler, '-fuse-ld=' + linker ]
+                if supports_gdb_index:
+                    link_arguments.append('-Wl,--gdb-index')
+
+                executable_path = os.path.join(work_directory, mode + '-' + linker)
+                link_arguments.extend([ '-o', executable_path ] + object_paths)
+
+                durations = []
+                for run_index in range(run_count):
+                    start_time = time.perf_counter()
+                    exit_code = subprocess.call(
+                        link_arguments, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL
+                    )
+                    if exit_code != 0:
+                        break # Linker not installed or not usable with this compiler
+                    durations.append(time.perf_counter() - start_time)
+
+                if len(durations) < run_count:
+                    results.append((linker, mode, None, None))
+                else:
+                    results.append(
+                        (
+                            linker, mode,
+                            statistics.median(durations), os.path.getsize(executable_path)
+                        )
+                    )
+
+        return results
+
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def print_results(results):
+    """Prints the measured link times as a table
+
+    @param  results  Results as returned by run_benchmark()"""
+
+    print('  Linker  Debug info  Median link s  Executable MiB')
+    for linker, mode, seconds, size in results:
+        if seconds is None:
+            print('  {:<6}  {:<10}  {:>13}  {:>14}'.format(linker, mode, 'unavailable', '-'))
+        else:
+            print(
+                '  {:<6}  {:<10}  {:>13.3f}  {:>14.1f}'.format(
+                    linker, mode, seconds, size / 1048576.0
+                )
+            )
+
+    # Compare against the default setup, GNU ld with full debug information
+    baseline = None
+    fastest = None
+    for linker, mode, seconds, size in results:
+        if seconds is None:
+            continue
+        if (linker == 'bfd') and (mode == 'full'):
+            baseline = seconds
+        if (fastest is None) or (seconds < fastest[2]):
+            fastest = (linker, mode, seconds)
+
+    if (not (baseline is None)) and (not (fastest is None)) and (fastest[2] > 0.0):
+        print(
+            'Fastest: {} with {} debug information, {:.1f}x faster than bfd with full'.format(
+                fastest[0], fastest[1], baseline / fastest[2]
+            )
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _write_sources(work_directory, unit_count, function_count):
+    """Writes the sources of the synthetic benchmark project
+
+    @param  work_directory  Directory the sources will be written to
+    @param  unit_count      Number of translation units that will be generated
+    @param  function_count  Number of functions in each translation unit
+    @returns The paths of the generated sources"""
+
+    source_paths = []
+
+    # Templates and standard containers produce the kind of debug information
+    # real code does, with many types repeated in every translation unit
+    for unit_index in range(unit_count):
+        source_path = os.path.join(work_directory, 'unit' + str(unit_index) + '.cpp')
+        with open(source_path, 'w') as source_file:
+            source_file.write('#include <map>\n#include <string>\n#include <vector>\n\n')
+            source_file.write('template<typename T> struct Holder { T value; int count; };\n\n')
+            for function_index in range(function_count):
+                source_file.write(
+                    'int unit{0}_function{1}(int input) {{\n'
+                    '  std::vector<Holder<std::string>> items(input % 7 + 1);\n'
+                    '  std::map<int, std::string> names;\n'
+                    '  names[input] = std::to_string(input + {1});\n'
+                    '  return static_cast<int>(items.size() + names.size()) + {1};\n'
+                    '}}\n\n'.format(unit_index, function_index)
+                )
+        source_paths.append(source_path)
+
+    main_path = os.path.join(work_directory, 'main.cpp')
+    with open(main_path, 'w') as main_file:
+        for unit_index in range(unit_count):
+            main_file.write('int unit{0}_function0(int input);\n'.format(unit_index))
+        main_file.write('\nint main(int argumentCount, char **) {\n  int sum = 0;\n')
+        for unit_index in range(unit_count):
+            main_file.write('  sum += unit{0}_function0(argumentCount);\n'.format(unit_index))
+        main_file.write('  return sum & 1;\n}\n')
+    source_paths.append(main_path)
+
+    return source_paths
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _compile_sources(compiler, source_paths, mode, mode_flags):
+    """Compiles the benchmark sources in parallel
+
+    @param  compiler      C++ compiler that will be used
+    @param  source_paths  Paths of the sources that will be compiled
+    @param  mode          Name of the debug information mode, used for the object names
+    @param  mode_flags    Compiler flags selecting the debug information mode
+    @returns The paths of the object files or None if compilation failed"""
+
+    def compile_source(source_path):
+        object_path = os.path.splitext(source_path)[0] + '-' + mode + '.o'
+        exit_code = subprocess.call(
+            [ compiler, '-c', '-O0', source_path, '-o', object_path ] + mode_flags,
+            stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL
+        )
+        if exit_code == 0:
+            return object_path
+        else:
+            return None
+
+    with ThreadPoolExecutor(max_workers = os.cpu_count() or 1) as executor:
+        object_paths = list(executor.map(compile_source, source_paths))
+
+    if None in object_paths:
+        return None
+
+    return object_paths
+
+# ----------------------------------------------------------------------------------------------- #
+
+def main(arguments):
+    """Runs the link time benchmark and prints the results
+
+    @param  arguments  Command line arguments without the script name
+    @returns The exit code for the process"""
+
+    parser = argparse.ArgumentParser(description = 'Link time benchmark for debug builds')
+    parser.add_argument(
+        '--compiler', default = os.environ.get('CXX', 'g++'),
+        help = 'C++ compiler to compile and link with (default: $CXX or g++)'
+    )
+    parser.add_argument(
+        '--units', type = int, default = 100,
+        help = 'number of translation units to generate (default: 100)'
+    )
+    parser.add_argument(
+        '--functions', type = int, default = 50,
+        help = 'number of functions in each translation unit (default: 50)'
+    )
+    parser.add_argument(
+        '--runs', type = int, default = 3,
+        help = 'number of times each link is repeated (default: 3)'
+    )
+    options = parser.parse_args(arguments)
+
+    if shutil.which(options.compiler) is None:
+        print('Compiler ' + options.compiler + ' not found', file = sys.stderr)
+        return 1
+
+    print(
+        'Linking {} translation units with {} functions each, median of {} runs:'.format(
+            options.units + 1, options.functions, options.runs
+        )
+    )
+    results = run_benchmark(options.compiler, options.units, options.functions, options.runs)
+    if len(results) == 0:
+        return 1
+
+    print_results(results)
+    return 0
+
+# ----------------------------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
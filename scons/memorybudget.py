@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+import os
+import importlib
+import threading
+
+import SCons.Script.Main
+
+from SCons.Util import flatten
+
+"""
+Memory budget for memory-hungry build actions
+
+Some build actions, such as link-time optimized links or Blender exports, can each
+need several gigabytes of memory. Their targets are given a memory estimate and such
+a target is only built when its estimate fits into the memory budget next to the
+estimates of the targets already being built. Compiles and other actions without an
+estimate are never held back.
+
+The budget is the memory available to the build when it starts, limited by the memory
+control group the build runs in (as containers and CI runners do) or, outside of one,
+by the available memory reported in /proc/meminfo.
+"""
+
+shared = importlib.import_module('shared')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Memory each job slot not used by a memory-hungry action is assumed to need, in MiB
+_job_memory_estimate = 512
+
+# Files providing the memory limit and usage for each control group version
+_cgroup_v1_memory_files = ('memory.limit_in_bytes', 'memory.usage_in_bytes')
+_cgroup_v2_memory_files = ('memory.max', 'memory.current')
+
+# Memory control group limits above this are the kernel's way of saying 'unlimited'
+_unlimited_memory = 1 << 60
+
+# Memory in MiB the targets with an estimate may use together, None while disabled
+_memory_budget = None
+
+# Memory in MiB estimated for the targets that are currently being built
+_reserved_memory = 0
+
+# Lets build tasks wait until enough of the memory budget is free
+_budget_condition = threading.Condition()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(job_count, memory_budget = None):
+    """Starts holding back memory-hungry build tasks that don't fit into the budget
+
+    @param  job_count      Number of jobs the build runs in parallel
+    @param  memory_budget  Memory in MiB the targets with an estimate may use together,
+                           None to derive it from the memory available to the build
+    @remarks
+        Only the first call has an effect. If no budget is given and the available
+        memory can't be determined (i.e. on Windows), build tasks aren't held back."""
+
+    global _memory_budget
+
+    if not (_memory_budget is None):
+        return
+
+    if memory_budget is None:
+        available_memory = get_available_memory()
+        if available_memory is None:
+            return
+
+        # Leave room for the compiles that keep running in the other job slots
+        memory_budget = available_memory - (job_count - 1) * _job_memory_estimate
+
+    _memory_budget = max(memory_budget, 0)
+
+    original_execute = SCons.Script.Main.BuildTask.execute
+
+    def execute_within_budget(task):
+        _execute_within_budget(task, original_execute)
+
+    SCons.Script.Main.BuildTask.execute = execute_within_budget
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_memory_budget():
+    """Returns the memory the targets with an estimate may use together
+
+    @returns The memory budget in MiB or None if targets aren't held back"""
+
+    return _memory_budget
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_available_memory():
+    """Determines how much memory is available to the build
+
+    @returns The available memory in MiB or None if it could not be determined"""
+
+    available_memory = _read_available_system_memory()
+
+    cgroup_memory = _read_available_cgroup_memory()
+    if not (cgroup_memory is None):
+        if (available_memory is None) or (cgroup_memory < available_memory):
+            available_memory = cgroup_memory
+
+    return available_memory
+
+# ----------------------------------------------------------------------------------------------- #
+
+def set_memory_estimate(targets, memory_estimate):
+    """Specifies how much memory building the specified targets is expected to need
+
+    @param  targets          Target nodes (as returned by a builder) the estimate is for
+    @param  memory_estimate  Memory in MiB one build action for the targets needs at most
+    @remarks
+        If several targets are produced by the same build action, the largest estimate
+        applies to the action. Targets without an estimate are built without waiting."""
+
+    for target in flatten(targets):
+        target.attributes.memory_estimate = memory_estimate
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _execute_within_budget(task, original_execute):
+    """Executes a SCons build task once its memory estimate fits into the budget
+
+    @param  task              Build task that will be executed
+    @param  original_execute  Original execute method of SCons' build task
+    @remarks
+        The waiting task occupies its worker thread, but not its jobserver token, so
+        the tools run by other tasks (i.e. GCC's LTO partitions) can use the job."""
+
+    memory_estimate = 0
+    for target in task.targets:
+        memory_estimate = max(memory_estimate, getattr(target.attributes, 'memory_estimate', 0))
+
+    if memory_estimate <= 0:
+        original_execute(task)
+        return
+
+    global _reserved_memory
+
+    # An estimate exceeding the whole budget is only admitted while nothing else is
+    # reserved, otherwise it could never be built
+    with _budget_condition:
+        while (_reserved_memory > 0) and (_reserved_memory + memory_estimate > _memory_budget):
+            _budget_condition.wait()
+        _reserved_memory += memory_estimate
+
+    try:
+        original_execute(task)
+    finally:
+        with _budget_condition:
+            _reserved_memory -= memory_estimate
+            _budget_condition.notify_all()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _read_available_system_memory():
+    """Reads the memory available for starting new programs from /proc/meminfo
+
+    @returns The available memory in MiB or None if it could not be read"""
+
+    try:
+        with open('/proc/meminfo', 'r') as meminfo_file:
+            for line in meminfo_file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024 # Reported in KiB
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _read_available_cgroup_memory():
+    """Determines the memory left to the memory control group the build runs in
+
+    @returns The memory in MiB below the group's limit or None if there is no limit
+    @remarks
+        A parent group's limit also applies to the group the build process runs in,
+        so the least memory below any of the groups' limits is used."""
+
+    for group_directories in shared.get_cgroup_directories('memory'):
+        available_memory = None
+        for group_directory in group_directories:
+            group_memory = _read_cgroup_memory_below_limit(group_directory)
+            if (not (group_memory is None)) and (
+                (available_memory is None) or (group_memory < available_memory)
+            ):
+                available_memory = group_memory
+
+        if not (available_memory is None):
+            return available_memory
+
+    return None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _read_cgroup_memory_below_limit(group_directory):
+    """Reads how much memory is left below the memory limit of a single control group
+
+    @param  group_directory  Directory of the control group in the cgroup file system
+    @returns The memory in MiB below the group's limit or None if the group has no limit"""
+
+    if os.path.isfile(os.path.join(group_directory, _cgroup_v2_memory_files[0])):
+        (limit_file_name, usage_file_name) = _cgroup_v2_memory_files
+    else:
+        (limit_file_name, usage_file_name) = _cgroup_v1_memory_files
+
+    limit = _read_cgroup_value(os.path.join(group_directory, limit_file_name))
+    usage = _read_cgroup_value(os.path.join(group_directory, usage_file_name))
+    if (limit is None) or (usage is None) or (limit >= _unlimited_memory):
+        return None
+
+    return max(limit - usage, 0) // 1048576
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _read_cgroup_value(file_path):
+    """Reads a number of bytes from a control group file
+
+    @param  file_path  Path of the control group file that will be read
+    @returns The number of bytes or None if the file is missing or says 'max'"""
+
+    try:
+        with open(file_path, 'r') as cgroup_file:
+            contents = cgroup_file.read().strip()
+    except OSError:
+        return None
+
+    if contents.isdigit():
+        return int(contents)
+    else:
+        return None
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+import platform
+import importlib
+
+from SCons.Action import CommandAction
+from SCons.Action import CommandGeneratorAction
+from SCons.Action import FunctionAction
+from SCons.Action import ListAction
+from SCons.Node.FS import File
+from SCons.Node.Python import Value
+from SCons.Subst import SUBST_CMD
+
+"""
+Ninja build file generator for SCons projects
+
+Converts the dependency graph SCons has built from the build scripts into a Ninja
+build file. Compiles track their header dependencies via compiler-generated depfiles,
+so Ninja can do up-to-date checks without SCons' Python-side header scanning.
+"""
+
+compilecache = importlib.import_module('compilecache')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# SCons function actions that only do checks or are no-ops for the builds we generate
+_ignored_functions = [
+    'SharedFlagChecker',
+    'LibSymlinksActionFunction'
+]
+
+# Rules shared by all build statements in the generated Ninja file
+_ninja_rules = (
+    'rule command\n' +
+    '  command = $cmd\n' +
+    '  description = $desc\n' +
+    '\n' +
+    'rule compile\n' +
+    '  command = $cmd -MMD -MF $out.d\n' +
+    '  description = $desc\n' +
+    '  depfile = $out.d\n' +
+    '  deps = gcc\n' +
+    '\n' +
+    'rule compile_msvc\n' +
+    '  command = $cmd /showIncludes\n' +
+    '  description = $desc\n' +
+    '  deps = msvc\n' +
+    '\n' +
+    'rule scons\n' +
+    '  command = $scons_command $out\n' +
+    '  description = SCons $out\n' +
+    '  pool = console\n' +
+    '\n' +
+    'rule regenerate\n' +
+    '  command = $scons_command $out\n' +
+    '  description = Regenerating $out\n' +
+    '  generator = 1\n' +
+    '  pool = console\n'
+)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def write_ninja_file(
+    environment, ninja_file_path, scons_command, regeneration_inputs
+):
+    """Writes a Ninja build file containing all targets known to SCons
+
+    @param  environment          Environment providing the compiler settings
+    @param  ninja_file_path      Path the Ninja build file will be written to
+    @param  scons_command        Command that runs SCons with the current build settings.
+                                 Used to regenerate the Ninja file and to build targets
+                                 whose actions can't be expressed as commands.
+    @param  regeneration_inputs  Files (build scripts and build system modules) which,
+                                 when changed, require the Ninja file to be regenerated
+    @remarks
+        Ninja needs to be run from the directory holding the top-level SConstruct
+        because all paths are relative to it, just like in SCons' own commands."""
+
+    ninja_file_node = environment.File(ninja_file_path)
+    is_msvc = (platform.system() == 'Windows')
+    object_suffixes = [
+        environment.subst('$OBJSUFFIX'), environment.subst('$SHOBJSUFFIX'), '.gch'
+    ]
+
+    lines = [
+        '# Ninja build file generated by the Nuclex build system. Do not edit.',
+        '# Run Ninja from the directory containing the top-level SConstruct.',
+        'ninja_required_version = 1.3',
+        'scons_command = ' + _escape_command(scons_command),
+        '',
+        _ninja_rules
+    ]
+
+    # Regenerate this file when a build script or a build system module changes
+    lines.append(
+        'build ' + _escape_path(str(ninja_file_node)) + ': regenerate ' +
+        ' '.join(_escape_path(path) for path in regeneration_inputs)
+    )
+    lines.append('')
+
+    all_outputs = []
+    generated_outputs = []
+    visited_executors = set()
+
+    for node in _enumerate_built_files(environment.Dir('#')):
+        if node is ninja_file_node:
+            continue
+
+        executor = node.get_executor()
+        if id(executor) in visited_executors:
+            continue
+        visited_executors.add(id(executor))
+
+        targets = executor.get_all_targets()
+        sources = executor.get_all_sources()
+        build_environment = executor.get_build_env()
+
+        # Files generated from values (such as unity build batches) are written right
+        # away, Ninja has no dependency to track for them. Should they get deleted,
+        # a single SCons run recreates them all (see below).
+        if (len(sources) > 0) and all(isinstance(source, Value) for source in sources):
+            for action in executor.get_action_list():
+                action(targets, sources, build_environment, show = False)
+            generated_outputs.extend(_escape_path(str(target)) for target in targets)
+            continue
+
+        commands = _get_commands(executor, targets, sources, build_environment)
+
+        outputs = ' '.join(_escape_path(str(target)) for target in targets)
+        inputs = ' '.join(
+            _escape_path(str(source)) for source in sources if not isinstance(source, Value)
+        )
+        all_outputs.append(outputs)
+
+        if commands is None:
+            lines.append('build ' + outputs + ': scons ' + inputs)
+            lines.append('')
+            continue
+
+        # Compiles get their header dependencies from depfiles written by the compiler,
+        # for everything else, rely on the dependencies SCons' scanners found
+        is_compile = any(
+            str(target).endswith(suffix) for target in targets for suffix in object_suffixes
+        )
+        if is_compile:
+            if is_msvc:
+                rule = 'compile_msvc'
+            else:
+                rule = 'compile'
+            implicit_dependencies = _get_implicit_dependencies(targets, False)
+        else:
+            rule = 'command'
+            implicit_dependencies = _get_implicit_dependencies(targets, True)
+
+        statement = 'build ' + outputs + ': ' + rule + ' ' + inputs
+        if len(implicit_dependencies) > 0:
+            statement += ' | ' + ' '.join(_escape_path(path) for path in implicit_dependencies)
+
+        lines.append(statement)
+        lines.append('  cmd = ' + _escape_command(' && '.join(commands)))
+        lines.append('  desc = ' + _escape_command(str(targets[0])))
+        lines.append('')
+
+    if len(generated_outputs) > 0:
+        lines.append('build ' + ' '.join(generated_outputs) + ': scons')
+        lines.append('  restat = 1')
+        lines.append('')
+
+    lines.append('build all: phony ' + ' '.join(all_outputs))
+    lines.append('default all')
+    lines.append('')
+
+    with open(ninja_file_node.abspath, 'w', encoding = 'utf-8') as ninja_file:
+        ninja_file.write('\n'.join(lines))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _enumerate_built_files(directory):
+    """Recursively enumerates all file nodes below a directory that have a builder
+
+    @param  directory  SCons directory node from which on files will be enumerated
+    @returns A generator yielding all file nodes that are built by SCons"""
+
+    for name, entry in sorted(directory.entries.items()):
+        if (name == '.') or (name == '..'):
+            continue
+
+        # Targets that don't exist yet may still be undecided between file and directory
+        entry = entry.disambiguate()
+
+        if isinstance(entry, File):
+            if entry.has_builder():
+                yield entry
+        elif hasattr(entry, 'entries'):
+            yield from _enumerate_built_files(entry)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_commands(executor, targets, sources, environment):
+    """Turns the actions of a SCons executor into shell commands
+
+    @param  executor     SCons executor whose actions will be converted
+    @param  targets      Targets produced by the executor
+    @param  sources      Sources consumed by the executor
+    @param  environment  Environment in which the executor runs its actions
+    @returns A list of shell commands or None if an action can't be run outside SCons"""
+
+    commands = []
+
+    actions = list(executor.get_action_list())
+    while len(actions) > 0:
+        action = actions.pop(0)
+
+        # Resolve actions that generate other actions, such as $CXXCOM
+        while isinstance(action, CommandGeneratorAction):
+            action = action._generate(targets, sources, environment, 0, executor)
+
+        if isinstance(action, ListAction):
+            actions = list(action.list) + actions
+            continue
+
+        if isinstance(action, CommandAction):
+            (command_lines, ignore, silent) = action.process(
+                targets, sources, environment, executor
+            )
+            for command_line in command_lines:
+                command = _join_command_line(command_line, environment)
+                if ignore:
+                    command = _ignore_exit_code(command)
+                commands.append(command)
+
+        elif isinstance(action, FunctionAction):
+
+            # Compiles routed through the object file cache run their original command
+            uncached_command_variable = compilecache.get_uncached_command_variable(action)
+            if not (uncached_command_variable is None):
+                command_lines = environment.subst_list(
+                    '$' + uncached_command_variable, SUBST_CMD, targets, sources
+                )
+                for command_line in command_lines:
+                    commands.append(_join_command_line(command_line, environment))
+
+            elif action.function_name() in _ignored_functions:
+                continue
+
+            # Installing is just copying
+            elif action.function_name() == 'installFunc':
+                for target, source in zip(targets, sources):
+                    commands.append(_get_copy_command(str(source), str(target)))
+
+            else:
+                return None
+
+        else:
+            return None
+
+    return commands
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_implicit_dependencies(targets, scan):
+    """Collects the implicit dependencies of targets that Ninja needs to know about
+
+    @param  targets  Targets whose implicit dependencies will be collected
+    @param  scan     Whether to run SCons' scanners to discover implicit dependencies
+    @returns A list with the paths of all implicit dependencies"""
+
+    dependencies = []
+
+    for target in targets:
+        if scan:
+            target.scan()
+            if not (target.implicit is None):
+                for dependency in target.implicit:
+                    if isinstance(dependency.disambiguate(), File):
+                        dependencies.append(str(dependency))
+
+        for dependency in target.depends:
+            if isinstance(dependency.disambiguate(), File):
+                dependencies.append(str(dependency))
+
+    return sorted(set(dependencies))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _join_command_line(command_line, environment):
+    """Joins the arguments of a substituted SCons command line into a shell command
+
+    @param  command_line  List of arguments as produced by SCons' subst_list()
+    @param  environment   Environment providing the shell escape function
+    @returns The command line as a single string"""
+
+    escape = environment['ESCAPE']
+
+    arguments = []
+    for argument in command_line:
+        if hasattr(argument, 'escape'):
+            arguments.append(argument.escape(escape))
+        else:
+            arguments.append(str(argument))
+
+    return ' '.join(arguments)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _ignore_exit_code(command):
+    """Wraps a shell command so its exit code is ignored (SCons' '-' command prefix)
+
+    @param  command  Command whose exit code will be ignored
+    @returns The wrapped command"""
+
+    if platform.system() == 'Windows':
+        return 'cmd /c "' + command + ' & exit 0"'
+    else:
+        return '(' + command + ') || true'
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_copy_command(source_path, target_path):
+    """Forms a shell command that copies a file
+
+    @param  source_path  Path of the file that will be copied
+    @param  target_path  Path the file will be copied to
+    @returns A shell command copying the file"""
+
+    if platform.system() == 'Windows':
+        return 'cmd /c copy /y "' + source_path + '" "' + target_path + '" >NUL'
+    else:
+        return 'cp -f "' + source_path + '" "' + target_path + '"'
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _escape_path(path):
+    """Escapes a path for use in a Ninja build statement
+
+    @param  path  Path that will be escaped
+    @returns The escaped path"""
+
+    return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _escape_command(command):
+    """Escapes a shell command for use as a Ninja variable value
+
+    @param  command  Command that will be escaped
+    @returns The escaped command"""
+
+    return command.replace('$', '$$').replace('\n', ' ')
+
+# ----------------------------------------------------------------------------------------------- #
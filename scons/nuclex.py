@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import os
+import re
 import importlib
 import platform
 import types
@@ -12,18 +13,68 @@ from SCons.Variables import PathVariable
 from SCons.Variables import BoolVariable
 from SCons.Script import ARGUMENTS
 from SCons.Script import Dir
+from SCons.Script import Action
+from SCons.Script import GetOption
+from SCons.Script import SetOption
 from SCons.Util import WhereIs
 
 # Nuclex SCons libraries
 shared = importlib.import_module('shared')
-cplusplus = importlib.import_module('cplusplus')
-dotnet = importlib.import_module('dotnet')
-blender = importlib.import_module('blender')
-godot = importlib.import_module('godot')
+jobserver = importlib.import_module('jobserver')
+memorybudget = importlib.import_module('memorybudget')
+cpuquota = importlib.import_module('cpuquota')
+hashcache = importlib.import_module('hashcache')
+signaturedb = importlib.import_module('signaturedb')
+
+# Language modules, loaded by the create_*_environment() function that needs them,
+# so a build script only pays for the languages and asset systems it actually builds.
+# Optional features (compile cache, traces, PGO, ...) load their modules when used.
+cplusplus = None
+dotnet = None
+blender = None
+godot = None
+
+# Modules used by the actions of on-demand targets. Actions run after SCons has
+# restored the module search path, so these are loaded when the target is set up.
+ninjafile = None
+headerreport = None
 
 # Inline stuff
 #execfile('nuclex-cplusplus.py')
 
+# Directories that are never searched for build scripts
+_ignored_build_script_directories = [
+    'References', '__pycache__', 'CVS'
+]
+
+# Name of the file in the intermediate directory that remembers build script locations
+_build_script_index_file_name = 'build-script-index.json'
+
+# Build scripts that have been read via build_all()
+_read_build_scripts = []
+
+# Directories of all projects whose build scripts build_all() is reading or has read
+_build_all_project_directories = []
+
+# Object files compiled by build_library(), by source directory and variant directory name
+_library_objects = {}
+
+# All object files compiled in the build together with their project's header directory
+_compiled_objects = []
+
+# Variables that accept a comma-separated list to build several configurations at once
+_multi_configuration_variables = [ 'DEBUG', 'TARGET_ARCH' ]
+
+# Whether build scripts were told that they only build the first configuration
+_single_configuration_warning_shown = False
+
+# Number of parallel jobs chosen when no -j is specified, None until chosen
+_default_job_count = None
+
+# Memory in MiB a link is assumed to need with and without link-time optimization
+_lto_link_memory_estimate = 4096
+_link_memory_estimate = 1024
+
 
 # Plan:
 #   - if TARGET_ARCH is set, use it. For multi-builds,
@@ -43,6 +94,10 @@ def create_generic_environment():
         variables = _parse_default_command_line_options()
     )
 
+    _enable_build_trace_if_requested(environment)
+    _enable_shared_job_budget(environment)
+    _enable_fast_change_detection(environment)
+    _use_variant_signature_database(environment, 'generic', fallback = True)
     _register_generic_extension_methods(environment)
 
     return environment
@@ -52,10 +107,66 @@ def create_generic_environment():
 def create_cplusplus_environment():
     """Creates a new environment with the required variables for building C/C++ projects
 
+    @returns A new SCons environment set up for C/C++ builds
+    @remarks
+        If several build configurations are requested on the command line
+        (i.e. DEBUG=0,1), only the first one is set up and a warning is shown. Use
+        create_cplusplus_environments() in build scripts that should build all of them."""
+
+    global _single_configuration_warning_shown
+
+    configurations = _get_build_configurations()
+    if (len(configurations) > 1) and not _single_configuration_warning_shown:
+        print(
+            '\033[93mWarning: ' + str(len(configurations)) + ' build configurations ' +
+            'were requested, but a build script uses create_cplusplus_environment(), ' +
+            'which only builds the first one. Use create_cplusplus_environments() ' +
+            'to build all of them.\033[0m'
+        )
+        _single_configuration_warning_shown = True
+
+    environment = _create_cplusplus_environment(configurations[0])
+    _use_variant_signature_database(environment)
+
+    return environment
+
+# ----------------------------------------------------------------------------------------------- #
+
+def create_cplusplus_environments():
+    """Creates an environment for each build configuration requested on the command line
+
+    @returns A list of SCons environments set up for C/C++ builds, one per configuration
+    @remarks
+        DEBUG and TARGET_ARCH accept comma-separated lists, the environments cover
+        all combinations (DEBUG=0,1 TARGET_ARCH=amd64,x86 yields four). Their targets
+        end up in one build graph, so all configurations build in parallel under one
+        -j and share the compiler probes and the scans of the headers they include."""
+
+    environments = []
+    for arguments in _get_build_configurations():
+        environments.append(_create_cplusplus_environment(arguments))
+
+    # All configurations built together share one signature database
+    variant_names = []
+    for environment in environments:
+        variant_names.append(_get_variant_name(environment))
+    _use_variant_signature_database(environments[0], '+'.join(variant_names))
+
+    return environments
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _create_cplusplus_environment(arguments):
+    """Creates a new environment for building C/C++ projects in one build configuration
+
+    @param  arguments  Command line arguments with a single value for each variable
     @returns A new SCons environment set up for C/C++ builds"""
 
+    global cplusplus
+    cplusplus = importlib.import_module('cplusplus')
+
     environment = Environment(
-        variables = _parse_default_command_line_options(),
+        variables = _parse_default_command_line_options(arguments),
         SOURCE_DIRECTORY = 'Source',
         HEADER_DIRECTORY = 'Include',
         TESTS_DIRECTORY = 'Tests',
@@ -74,6 +185,11 @@ def create_cplusplus_environment():
     # Nuclex standard build settings and extensions
     _set_standard_cplusplus_compiler_flags(environment)
     _set_standard_cplusplus_linker_flags(environment)
+    _enable_fast_linking_if_requested(environment)
+    _enable_build_trace_if_requested(environment)
+    _enable_shared_job_budget(environment)
+    _enable_fast_change_detection(environment)
+    _enable_time_trace_if_requested(environment)
     _register_generic_extension_methods(environment)
     _register_cplusplus_extension_methods(environment)
 
@@ -86,6 +202,9 @@ def create_dotnet_environment():
 
     @returns A new scons environment set up for .NET builds"""
 
+    global dotnet
+    dotnet = importlib.import_module('dotnet')
+
     environment = Environment(
         variables = _parse_default_command_line_options(),
         SOURCE_DIRECTORY = 'Source',
@@ -97,6 +216,10 @@ def create_dotnet_environment():
     # Register extension methods and additional variables
     dotnet.setup(environment)
 
+    _enable_build_trace_if_requested(environment)
+    _enable_shared_job_budget(environment)
+    _enable_fast_change_detection(environment)
+    _use_variant_signature_database(environment)
     _register_generic_extension_methods(environment)
     _register_dotnet_extension_methods(environment)
 
@@ -109,6 +232,9 @@ def create_blender_environment():
 
     @returns A new scons environment set up for Blender exports"""
 
+    global blender
+    blender = importlib.import_module('blender')
+
     environment = Environment(
         variables = _parse_default_command_line_options()
     )
@@ -116,6 +242,10 @@ def create_blender_environment():
     # Extension methods for Blender
     blender.setup(environment)
 
+    _enable_build_trace_if_requested(environment)
+    _enable_shared_job_budget(environment)
+    _enable_fast_change_detection(environment)
+    _use_variant_signature_database(environment, 'blender', fallback = True)
     _register_generic_extension_methods(environment)
     _register_blender_extension_methods(environment)
 
@@ -128,6 +258,9 @@ def create_godot_environment():
 
     @returns A new scons environment set up for Godot exports"""
 
+    global godot
+    godot = importlib.import_module('godot')
+
     environment = Environment(
         variables = _parse_default_command_line_options()
     )
@@ -135,6 +268,10 @@ def create_godot_environment():
     # Extension methods for Blender
     godot.setup(environment)
 
+    _enable_build_trace_if_requested(environment)
+    _enable_shared_job_budget(environment)
+    _enable_fast_change_detection(environment)
+    _use_variant_signature_database(environment, 'godot', fallback = True)
     _register_generic_extension_methods(environment)
     _register_godot_extension_methods(environment)
 
@@ -142,30 +279,214 @@ def create_godot_environment():
 
 # ----------------------------------------------------------------------------------------------- #
 
-def build_all(environment, root_directory):
+def build_all(environment, root_directory, ignored_directories = None):
     """Compiles all SCons build scripts below the specified directory
 
-    @param  environment     SCons environment that will be starting the nested builds
-    @param  root_directory  Directory below which all SCons build scripts will be executed"""
+    @param  environment          SCons environment that will be starting the nested builds
+    @param  root_directory       Directory below which all SCons build scripts will be executed
+    @param  ignored_directories  Additional directory names that will not be searched"""
+
+    # The profiler is only loaded when requested, it traces allocations from then on
+    readprofile = None
+    if ('PROFILE_READ' in environment) and environment['PROFILE_READ']:
+        readprofile = importlib.import_module('readprofile')
+        readprofile.enable(
+            os.path.join(
+                environment.Dir('#').abspath,
+                environment['INTERMEDIATE_DIRECTORY'],
+                'read-profile.json'
+            )
+        )
+
+    build_scripts = _get_all_build_scripts(environment, root_directory, ignored_directories)
+
+    # Known before any build script is read, so projects can refer to projects read later
+    for build_script in build_scripts:
+        project_directory = os.path.dirname(os.path.abspath(build_script))
+        if not (project_directory in _build_all_project_directories):
+            _build_all_project_directories.append(project_directory)
 
-    build_scripts = _get_all_build_scripts(root_directory)
     for build_script in build_scripts:
-        environment.SConscript(build_script)
+        if readprofile is None:
+            environment.SConscript(build_script)
+        else:
+            readprofile.read_build_script(environment, build_script)
+        _read_build_scripts.append(os.path.abspath(build_script))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def emit_ninja(environment, ninja_file_path = 'build.ninja'):
+    """Sets up a 'ninja' target that exports the build graph as a Ninja build file
+
+    @param  environment      Environment whose compiler settings will be used
+    @param  ninja_file_path  Path the Ninja build file will be written to
+    @returns The SCons target writing the Ninja build file
+    @remarks
+        Call this after all build scripts have been read, then run 'scons ninja'
+        once. Afterwards, Ninja can be used from the directory containing the SConstruct
+        to build everything with the same settings. The Ninja build file re-runs SCons
+        to regenerate itself if any build script or build system module changes."""
+
+    global ninjafile
+    ninjafile = importlib.import_module('ninjafile')
+
+    # Command that re-runs SCons with the same build settings as now
+    scons_command = '"' + _find_scons_executable(environment) + '" -Q'
+    scons_command += ' --directory="' + Dir('#').abspath + '"'
+    for key, value in sorted(ARGUMENTS.items()):
+        scons_command += ' "' + key + '=' + value + '"'
+
+    environment['NINJA_SCONS_COMMAND'] = scons_command
+
+    build_ninja_file = environment.Command(
+        source = [],
+        action = Action(_write_ninja_file, 'Writing Ninja build file $TARGET'),
+        target = ninja_file_path
+    )
+    environment.AlwaysBuild(build_ninja_file)
+    environment.Alias('ninja', build_ninja_file)
+
+    # Only write the Ninja build file when asked to. SCons releases the build actions
+    # of targets it has built, so it must not run alongside the regular build.
+    environment.Ignore(build_ninja_file[0].dir, build_ninja_file)
+
+    return build_ninja_file
+
+# ----------------------------------------------------------------------------------------------- #
+
+def emit_header_report(environment, report_file_path = None):
+    """Sets up a 'header-report' target that ranks headers by their rebuild cost
+
+    @param  environment       Environment providing the intermediate directory
+    @param  report_file_path  Path the JSON report will be written to, defaults to
+                              'header-report.json' in the intermediate directory
+    @returns The SCons target writing the header report
+    @remarks
+        Call this after all build scripts have been read, then run
+        'scons header-report'. The rebuild cost of a header is the sum of the compile
+        times of all translation units including it, taken from the trace of the last
+        build with TRACE=1. Trace a full rebuild to have compile times for all units."""
+
+    global headerreport
+    headerreport = importlib.import_module('headerreport')
+
+    if report_file_path is None:
+        report_file_path = os.path.join(
+            environment.Dir('#').abspath,
+            environment['INTERMEDIATE_DIRECTORY'],
+            'header-report.json'
+        )
+
+    environment['HEADER_REPORT_TRACE_FILE'] = _get_trace_file_path(environment)
+
+    build_header_report = environment.Command(
+        source = [],
+        action = Action(_write_header_report, 'Writing header report $TARGET'),
+        target = report_file_path
+    )
+    environment.AlwaysBuild(build_header_report)
+    environment.Alias('header-report', build_header_report)
+
+    # Only write the report when asked to, like the Ninja build file
+    environment.Ignore(build_header_report[0].dir, build_header_report)
+
+    return build_header_report
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _write_header_report(target, source, env):
+    """Writes the header fan-out and rebuild cost report
+
+    @param  target  Expected to contain only one file, the JSON report
+    @param  source  Not used
+    @param  env     SCons build environment providing the trace file path"""
+
+    headerreport.write_header_report(
+        _compiled_objects, env['HEADER_REPORT_TRACE_FILE'], target[0].abspath
+    )
 
 # ----------------------------------------------------------------------------------------------- #
 
-def _get_all_build_scripts(root_directory):
+def _write_ninja_file(target, source, env):
+    """Writes the build graph into a Ninja build file
+
+    @param  target  Expected to contain only one file, the Ninja build file
+    @param  source  Not used
+    @param  env     SCons build environment whose compiler settings will be used"""
+
+    regeneration_inputs = [ env.File('#SConstruct').abspath ]
+    regeneration_inputs += _read_build_scripts
+
+    # Changes to the build system itself also require the Ninja build file to be regenerated
+    own_directory = os.path.dirname(os.path.abspath(__file__))
+    for file_name in sorted(os.listdir(own_directory)):
+        if file_name.endswith('.py'):
+            regeneration_inputs.append(os.path.join(own_directory, file_name))
+
+    ninjafile.write_ninja_file(
+        env, str(target[0]), env['NINJA_SCONS_COMMAND'], regeneration_inputs
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_all_build_scripts(environment, root_directory, ignored_directories = None):
     """Locates SCons build scripts in all directories below the specified root
 
-    @param  root_directory  Directory below which SCons scripts will be collected
-    @returns All SCons scripts below the specified root directory"""
+    @param  environment          Environment providing the intermediate and artifact directories
+    @param  root_directory       Directory below which SCons scripts will be collected
+    @param  ignored_directories  Additional directory names that will not be searched
+    @returns All SCons scripts below the specified root directory
+    @remarks
+        Directories holding build outputs, references and version control data are
+        skipped, as are directories containing a .gdignore file. The locations of
+        build scripts are remembered in an index inside the intermediate directory,
+        so directories whose modification time didn't change are not listed again."""
+
+    pruned_directory_names = _get_pruned_directory_names(environment, ignored_directories)
+
+    # Load the index from the previous run. If it was made for another root directory
+    # or with different pruning rules, it can't be trusted.
+    index_path = None
+    previous_index = {}
+    if 'INTERMEDIATE_DIRECTORY' in environment:
+        index_path = os.path.join(
+            environment['INTERMEDIATE_DIRECTORY'], _build_script_index_file_name
+        )
+        index = shared.load_json_file(index_path, {})
+        is_matching_index = (
+            (index.get('root') == os.path.abspath(root_directory)) and
+            (index.get('pruned') == pruned_directory_names)
+        )
+        if is_matching_index:
+            previous_index = index.get('directories', {})
 
+    current_index = {}
     scripts = []
 
-    for entry in os.listdir(root_directory):
-        path = os.path.join(root_directory, entry)
-        if os.path.isdir(path):
-            _recursively_collect_build_scripts(scripts, path)
+    # The root directory's own build scripts are the ones calling us, so only
+    # its subdirectories are searched
+    root_entry = _get_indexed_directory_entry(
+        root_directory, pruned_directory_names, previous_index, current_index, True
+    )
+    if not (root_entry is None):
+        for subdirectory in root_entry[2]:
+            _recursively_collect_build_scripts(
+                scripts,
+                os.path.join(root_directory, subdirectory),
+                pruned_directory_names,
+                previous_index,
+                current_index
+            )
+
+    if (not (index_path is None)) and (current_index != previous_index):
+        shared.save_json_file(
+            index_path,
+            {
+                'root': os.path.abspath(root_directory),
+                'pruned': pruned_directory_names,
+                'directories': current_index
+            }
+        )
 
     #scripts.reverse()
 
@@ -173,31 +494,198 @@ def _get_all_build_scripts(root_directory):
 
 # ----------------------------------------------------------------------------------------------- #
 
-def _recursively_collect_build_scripts(scripts, directory):
+def _recursively_collect_build_scripts(
+    scripts, directory, pruned_directory_names, previous_index, current_index
+):
     """Recursively searches for SCons build scripts and adds them to the provided list
 
-    @param  scripts    List to which any discovered build scripts will be added
-    @param  directory  Directory from which on the method will recursively search"""
+    @param  scripts                 List to which any discovered build scripts will be added
+    @param  directory               Directory from which on the method will recursively search
+    @param  pruned_directory_names  Names of directories that will not be searched
+    @param  previous_index          Directory entries remembered from the previous search
+    @param  current_index           Receives the directory entries of the current search"""
 
-    for entry in os.listdir(directory):
-        path = os.path.join(directory, entry)
-        if os.path.isdir(path):
-            _recursively_collect_build_scripts(scripts, path)
-        elif os.path.isfile(path):
-            if ('SConstruct' in entry) or ('SConscript' in entry):
-                scripts.append(path)
+    entry = _get_indexed_directory_entry(
+        directory, pruned_directory_names, previous_index, current_index
+    )
+    if entry is None:
+        return
+
+    for script_name in entry[1]:
+        scripts.append(os.path.join(directory, script_name))
+
+    for subdirectory in entry[2]:
+        _recursively_collect_build_scripts(
+            scripts,
+            os.path.join(directory, subdirectory),
+            pruned_directory_names,
+            previous_index,
+            current_index
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_indexed_directory_entry(
+    directory, pruned_directory_names, previous_index, current_index, is_root = False
+):
+    """Looks up the build scripts and subdirectories in a directory, either from
+    the index of the previous search or by listing the directory
+
+    @param  directory               Directory whose scripts and subdirectories will be returned
+    @param  pruned_directory_names  Names of directories that will not be searched
+    @param  previous_index          Directory entries remembered from the previous search
+    @param  current_index           Receives the directory entry that was looked up
+    @param  is_root                 Whether the directory is the root of the search
+    @returns A list containing the directory's modification time, the names of the build
+             scripts in it and the names of its subdirectories or None if it doesn't exist"""
+
+    try:
+        modification_time = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+    # Adding or removing a file in a directory updates its modification time,
+    # so if it didn't change, the entry from the previous search is still accurate
+    entry = previous_index.get(directory)
+    if (entry is None) or (entry[0] != modification_time):
+        script_names = []
+        subdirectory_names = []
+
+        with os.scandir(directory) as directory_entries:
+            for directory_entry in directory_entries:
+                if directory_entry.is_dir():
+                    if not _is_pruned_directory(directory_entry.name, pruned_directory_names):
+                        subdirectory_names.append(directory_entry.name)
+                elif directory_entry.is_file():
+                    if directory_entry.name == '.gdignore':
+                        if not is_root:
+                            script_names = []
+                            subdirectory_names = []
+                            break
+                    elif (
+                        ('SConstruct' in directory_entry.name) or
+                        ('SConscript' in directory_entry.name)
+                    ):
+                        script_names.append(directory_entry.name)
+
+        script_names.sort()
+        subdirectory_names.sort()
+        entry = [ modification_time, script_names, subdirectory_names ]
+
+    current_index[directory] = entry
+    return entry
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_pruned_directory_names(environment, ignored_directories = None):
+    """Collects the names of directories that will not be searched for build scripts
+
+    @param  environment          Environment providing the intermediate and artifact directories
+    @param  ignored_directories  Additional directory names that will not be searched
+    @returns A sorted list of directory names that will be skipped"""
+
+    pruned_directory_names = set(_ignored_build_script_directories)
+
+    for variable in [ 'INTERMEDIATE_DIRECTORY', 'ARTIFACT_DIRECTORY', 'REFERENCES_DIRECTORY' ]:
+        if variable in environment:
+            pruned_directory_names.add(os.path.basename(os.path.normpath(environment[variable])))
+
+    if not (ignored_directories is None):
+        pruned_directory_names.update(ignored_directories)
+
+    return sorted(pruned_directory_names)
 
+# ----------------------------------------------------------------------------------------------- #
+
+def _is_pruned_directory(directory_name, pruned_directory_names):
+    """Checks whether a directory should be skipped when searching for build scripts
+
+    @param  directory_name          Name of the directory that will be checked
+    @param  pruned_directory_names  Names of directories that will not be searched
+    @returns True if the directory should be skipped, False otherwise"""
+
+    # Hidden directories hold version control data, IDE settings or Godot's import cache
+    if directory_name.startswith('.'):
+        return True
+
+    return directory_name in pruned_directory_names
 
 # ----------------------------------------------------------------------------------------------- #
 
-def _parse_default_command_line_options():
+def _get_build_configurations():
+    """Splits the command line arguments into one set per requested build configuration
+
+    @returns A list of argument dictionaries with a single value for each variable
+    @remarks
+        The variables in _multi_configuration_variables accept comma-separated lists,
+        one set of arguments is returned for each combination of their values."""
+
+    configurations = [ dict(ARGUMENTS) ]
+
+    for variable_name in _multi_configuration_variables:
+        if not (variable_name in ARGUMENTS):
+            continue
+
+        values = []
+        for value in ARGUMENTS[variable_name].split(','):
+            value = value.strip()
+            if (len(value) > 0) and not (value in values):
+                values.append(value)
+        if len(values) == 0:
+            continue # Leave the empty value to the variable's validation
+
+        combined_configurations = []
+        for configuration in configurations:
+            for value in values:
+                combined_configuration = dict(configuration)
+                combined_configuration[variable_name] = value
+                combined_configurations.append(combined_configuration)
+        configurations = combined_configurations
+
+    return configurations
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _parse_default_command_line_options(arguments = None):
     """Parses the command line options controlling various build settings
 
+    @param  arguments  Command line arguments with a single value for each variable,
+                       None for the first build configuration requested
     @remarks
         This contains variables that work across all builds. Build-specific variables
         are discouraged, but would be irgnored by SCons' Variables class."""
 
-    command_line_variables = Variables(None, ARGUMENTS)
+    if arguments is None:
+        arguments = _get_build_configurations()[0]
+
+    command_line_variables = Variables(None, arguments)
+
+    # Whether to record a timing trace of the build
+    command_line_variables.Add(
+        BoolVariable(
+            'TRACE',
+            'Whether to write a Chrome trace of the build to the intermediate directory',
+            False
+        )
+    )
+
+    # Whether to profile the build scripts read via build_all()
+    command_line_variables.Add(
+        BoolVariable(
+            'PROFILE_READ',
+            'Whether to report which build scripts are slow to read and why',
+            False
+        )
+    )
+
+    # Whether the compiler should record where it spends its time
+    command_line_variables.Add(
+        BoolVariable(
+            'TIME_TRACE',
+            'Whether to report which headers, templates and functions are slow to compile',
+            False
+        )
+    )
 
     # Build configuration (also called build type in many SCons examples)
     command_line_variables.Add(
@@ -208,6 +696,52 @@ def _parse_default_command_line_options():
         )
     )
 
+    # Whether to trade debug build conveniences for shorter link times
+    command_line_variables.Add(
+        BoolVariable(
+            'FAST_LINK',
+            'Whether debug builds use split debug information and the fastest linker found',
+            False
+        )
+    )
+
+    # Upper limit for the automatically chosen number of parallel jobs
+    command_line_variables.Add(
+        'MAX_JOBS',
+        'Maximum number of parallel jobs when -j is not specified (0: no limit)',
+        0,
+        None,
+        int
+    )
+
+    # Memory available to links and exports, which can each take gigabytes
+    command_line_variables.Add(
+        'MEMORY_BUDGET',
+        'Memory in MiB that links and exports may use together (0: detect)',
+        0,
+        None,
+        int
+    )
+
+    # How often timestamps are distrusted and all dependencies are compared by contents
+    command_line_variables.Add(
+        'HASH_VERIFY_DAYS',
+        'Days after which one build compares all files by their contents (0: never)',
+        0,
+        None,
+        int
+    )
+
+    # Profile-guided optimization phase
+    command_line_variables.Add(
+        EnumVariable(
+            'PGO',
+            'Whether to build instrumented binaries or optimize using their profile data',
+            'none',
+            allowed_values=('none', 'generate', 'use')
+        )
+    )
+
     # Default architecture for the binaries. We follow the Debian practices,
     # which, while clueless and chaotic, are at least widely used.
     default_arch = 'amd64'
@@ -250,6 +784,181 @@ def _parse_default_command_line_options():
 
 # ----------------------------------------------------------------------------------------------- #
 
+def _enable_build_trace_if_requested(environment):
+    """Starts recording a timing trace of the build if the TRACE option is set
+
+    @param  environment  Environment whose settings will be checked for the TRACE option"""
+
+    if ('TRACE' in environment) and environment['TRACE']:
+        buildtrace = importlib.import_module('buildtrace')
+        buildtrace.enable(_get_trace_file_path(environment))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _enable_time_trace_if_requested(environment):
+    """Lets the C/C++ compiler record time traces if the TIME_TRACE option is set
+
+    @param  environment  Environment whose settings will be checked for the TIME_TRACE option
+    @remarks
+        With clang, the time traces of all translation units are merged into a report
+        in the intermediate directory at the end of the build. GCC prints a time
+        report for each translation unit while compiling instead."""
+
+    if ('TIME_TRACE' in environment) and environment['TIME_TRACE']:
+        report_file_path = os.path.join(
+            environment.Dir('#').abspath,
+            environment['INTERMEDIATE_DIRECTORY'],
+            'time-trace-report.json'
+        )
+        timetrace = importlib.import_module('timetrace')
+        timetrace.enable(environment, report_file_path, _compiled_objects)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _enable_shared_job_budget(environment):
+    """Makes the commands run by an environment share the job budget given via -j
+
+    @param  environment  Environment whose commands will have access to the jobserver
+    @remarks
+        Started after the build trace, so the trace doesn't include time spent waiting
+        for a job to become free. The memory budget is checked before a job is taken,
+        so links waiting for memory leave their job to the running links."""
+
+    _set_default_job_count(environment)
+    jobserver.enable()
+
+    memory_budget = None
+    if ('MEMORY_BUDGET' in environment) and (environment['MEMORY_BUDGET'] > 0):
+        memory_budget = environment['MEMORY_BUDGET']
+
+    memorybudget.enable(jobserver.get_job_count(), memory_budget)
+
+    if jobserver.is_supported():
+        environment['SPAWN'] = jobserver.spawn
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _enable_fast_change_detection(environment):
+    """Lets an environment reuse the cached hashes of large files whose attributes are unchanged
+
+    @param  environment  Environment whose targets will use the hash cache
+    @remarks
+        The hash cache is kept in the intermediate directory. If the HASH_VERIFY_DAYS
+        option is set, the first build after that many days ignores the timestamps
+        and the hash cache and compares all dependencies by their contents."""
+
+    cache_file_path = os.path.join(
+        environment.Dir('#').abspath, environment['INTERMEDIATE_DIRECTORY'], 'hash-cache.json'
+    )
+
+    verify_interval_days = 0
+    if 'HASH_VERIFY_DAYS' in environment:
+        verify_interval_days = environment['HASH_VERIFY_DAYS']
+
+    hashcache.enable(environment, cache_file_path, verify_interval_days)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _use_variant_signature_database(environment, variant_name = None, fallback = False):
+    """Stores the build's signatures in an SQLite database of its own build variant
+
+    @param  environment   Environment whose build variant names the database
+    @param  variant_name  Name of the database for environments without build variants
+                          or building several, None for the environment's variant
+    @param  fallback      Whether the database is only used if no environment with
+                          a build variant is created
+    @remarks
+        Each variant has its own database, so i.e. a debug and a release build can
+        run at the same time in the same checkout. SCons keeps one database per build,
+        so the first environment with a build variant decides which one that is."""
+
+    if variant_name is None:
+        variant_name = _get_variant_name(environment)
+
+    database_path = os.path.join(
+        environment.Dir('#').abspath,
+        environment['INTERMEDIATE_DIRECTORY'],
+        variant_name + '.sconsign.sqlite'
+    )
+    signaturedb.enable(environment, database_path, fallback)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_variant_name(environment):
+    """Determines the variant directory name of an environment for naming its database
+
+    @param  environment  Environment whose variant directory name will be returned
+    @returns The variant directory name or 'unknown' if no compiler could be found"""
+
+    try:
+        return environment.get_variant_directory_name()
+    except FileNotFoundError:
+        return 'unknown' # No compiler, the build will report it soon enough
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _set_default_job_count(environment):
+    """Lets the build run one job per usable CPU unless -j is specified
+
+    @param  environment  Environment whose settings will be checked for the MAX_JOBS option
+    @remarks
+        The CPU affinity and the control group's CPU quota are respected, so builds
+        in containers don't start a job for each CPU of the host. A -j option on the
+        command line always takes precedence."""
+
+    global _default_job_count
+
+    if not (_default_job_count is None):
+        return # Already chosen, the jobserver must not see a different job count
+
+    _default_job_count = cpuquota.get_usable_cpu_count()
+    if ('MAX_JOBS' in environment) and (environment['MAX_JOBS'] > 0):
+        _default_job_count = min(_default_job_count, environment['MAX_JOBS'])
+
+    SetOption('num_jobs', _default_job_count)
+
+    job_count = GetOption('num_jobs')
+    if job_count == _default_job_count:
+        print('Using -j' + str(job_count) + ' (' + _describe_cpus(environment) + ')')
+    else:
+        print('Using -j' + str(job_count) + ' as specified on the command line')
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _describe_cpus(environment):
+    """Describes the limits the automatically chosen number of parallel jobs is based on
+
+    @param  environment  Environment whose settings will be checked for the MAX_JOBS option
+    @returns A short description of the CPU affinity, CPU quota and job limit"""
+
+    if hasattr(os, 'sched_getaffinity'):
+        description = 'usable CPUs: ' + str(len(os.sched_getaffinity(0)))
+    else:
+        description = 'CPUs: ' + str(os.cpu_count() or 1)
+
+    cpu_quota = cpuquota.get_cpu_quota()
+    if not (cpu_quota is None):
+        description += ', CPU quota: ' + str(cpu_quota)
+
+    if ('MAX_JOBS' in environment) and (environment['MAX_JOBS'] > 0):
+        description += ', MAX_JOBS: ' + str(environment['MAX_JOBS'])
+
+    return description
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_trace_file_path(environment):
+    """Determines the path the timing trace of a traced build is written to
+
+    @param  environment  Environment providing the intermediate directory
+    @returns The absolute path of the trace file"""
+
+    return os.path.join(
+        environment.Dir('#').abspath, environment['INTERMEDIATE_DIRECTORY'], 'trace.json'
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
 def _register_generic_extension_methods(environment):
     """Registers general-purpose extension methodsinto a SCons environment
 
@@ -268,10 +977,15 @@ def _register_cplusplus_extension_methods(environment):
     environment.AddMethod(_add_cplusplus_package, 'add_package')
     environment.AddMethod(_add_cplusplus_project, 'add_project')
     environment.AddMethod(_add_cplusplus_source_directory, 'add_source_directory')
+    environment.AddMethod(_use_cplusplus_unity_build, 'use_unity_build')
+    environment.AddMethod(_use_cplusplus_precompiled_header, 'use_precompiled_header')
+    environment.AddMethod(_use_cplusplus_compile_cache, 'use_compile_cache')
+    environment.AddMethod(_use_cplusplus_dependency_files, 'use_dependency_files')
     environment.AddMethod(_build_cplusplus_library, 'build_library')
     environment.AddMethod(_build_cplusplus_unit_tests, 'build_unit_tests')
     environment.AddMethod(_build_cplusplus_executable, 'build_executable')
     environment.AddMethod(_run_cplusplus_unit_tests, 'run_unit_tests')
+    environment.AddMethod(_train_cplusplus_profile, 'train_profile')
 
 # ----------------------------------------------------------------------------------------------- #
 
@@ -476,10 +1190,50 @@ def _set_standard_cplusplus_linker_flags(environment):
     else:
         environment.Append(LINKFLAGS='-z defs') # Detect unresolved symbols in shared object
         environment.Append(LINKFLAGS='-Bsymbolic') # Prevent replacement on shared object syms
-        environment.Append(LINKFLAGS='-flto') # Compile all code in one unit at link time
+        if jobserver.is_supported() and (cplusplus.get_compiler_name(environment) == 'gcc'):
+            environment.Append(LINKFLAGS='-flto=jobserver') # Link in parallel with free jobs
+        else:
+            environment.Append(LINKFLAGS='-flto') # Compile all code in one unit at link time
         #environment.Append(LINKFLAGS='--gc-sections') # Remove unused code and data sections
         environment.Append(LINKFLAGS="-Wl,-rpath='$${ORIGIN}'") # Search libraries in current dir
 
+    # Link-time optimization compiles the whole program inside the linker
+    if _is_debug_build(environment):
+        environment.SetDefault(LINK_MEMORY_ESTIMATE = _link_memory_estimate)
+    else:
+        environment.SetDefault(LINK_MEMORY_ESTIMATE = _lto_link_memory_estimate)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _enable_fast_linking_if_requested(environment):
+    """Sets up debug builds for short link times if the FAST_LINK option is set
+
+    @param  environment  Environment whose settings will be checked for the FAST_LINK option
+    @remarks
+        Split DWARF keeps most debug information in .dwo files next to the object files,
+        so the linker no longer has to copy it. mold or lld are used if available, they
+        also build an index that lets GDB load the split debug information quickly.
+        Release builds and the Microsoft compiler are not affected."""
+
+    if (not ('FAST_LINK' in environment)) or (not environment['FAST_LINK']):
+        return
+    if (platform.system() == 'Windows') or (not _is_debug_build(environment)):
+        return
+
+    if cplusplus.supports_compiler_flag(environment, '-gsplit-dwarf'):
+        environment.Append(CFLAGS='-gsplit-dwarf') # Debug information in .dwo files
+        environment.Append(CXXFLAGS='-gsplit-dwarf') # Debug information in .dwo files
+        environment['SPLIT_DWARF'] = True
+
+    # Without mold or lld, the default linker (GNU ld) is used, it can't build a GDB index
+    linker_name = cplusplus.find_fast_linker(environment)
+    if not (linker_name is None):
+        environment.Append(CFLAGS='-ggnu-pubnames') # Symbol tables for the GDB index
+        environment.Append(CXXFLAGS='-ggnu-pubnames') # Symbol tables for the GDB index
+
+        environment.Append(LINKFLAGS='-fuse-ld=' + linker_name)
+        environment.Append(LINKFLAGS='-Wl,--gdb-index') # Fast debugger startup
+
 # ----------------------------------------------------------------------------------------------- #
 
 def _build_scons(environment, source, arguments, target):
@@ -489,7 +1243,11 @@ def _build_scons(environment, source, arguments, target):
     @param  source       Input file(s) for the build
     @param  arguments    Arguments that will be passed to SCons
     @param  target       Output file(s) produced by the build
-    @returns A scons build action producing the target file"""
+    @returns A scons build action producing the target file
+    @remarks
+        Unless the arguments specify a job count, the nested build runs as many jobs
+        as are free in the outer build when it starts, so it never adds its own jobs
+        on top of the outer build's job count."""
 
     # Clone the environment and use the real search PATH. This will not pollute
     # the environment in which the SCons subprocess runs, but is the only way
@@ -497,8 +1255,57 @@ def _build_scons(environment, source, arguments, target):
     # to also be in the system search PATH.
     cloned_environment = environment.Clone(ENV=os.environ)
 
-    # Try to locate SCons with the environment's new search path
-    scons_path = cloned_environment.WhereIs('scons')
+    cloned_environment['SCONS_EXECUTABLE'] = _find_scons_executable(cloned_environment)
+    cloned_environment['SCONS_ARGUMENTS'] = arguments
+
+    return cloned_environment.Command(
+        source = source,
+        action = Action(
+            _run_nested_scons, '$SCONS_EXECUTABLE $SCONS_ARGUMENTS',
+            varlist = [ 'SCONS_EXECUTABLE', 'SCONS_ARGUMENTS' ]
+        ),
+        target = target
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _run_nested_scons(target, source, env):
+    """Runs a nested SCons build with the jobs that are free in the outer build
+
+    @param  target  Output file(s) produced by the nested build
+    @param  source  Input file(s) for the nested build
+    @param  env     SCons build environment providing the SCons executable and arguments
+    @returns The exit code of the nested SCons build"""
+
+    arguments = env['SCONS_ARGUMENTS']
+
+    # The nested build already has the job slot of this build task, the jobs
+    # of the other slots are only added if no other build task is using them
+    additional_job_count = 0
+    if re.search(r'(^|\s)(-j|--jobs)', arguments) is None:
+        additional_job_count = jobserver.acquire_free_tokens(jobserver.get_job_count() - 1)
+        arguments = '-j' + str(1 + additional_job_count) + ' ' + arguments
+
+    if platform.system() == 'Windows':
+        command = '"' + env['SCONS_EXECUTABLE'] + '" ' + arguments
+    else:
+        command = env['SCONS_EXECUTABLE'] + ' ' + arguments
+
+    try:
+        return Action(command)(target, source, env, show = False)
+    finally:
+        jobserver.release_tokens(additional_job_count)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _find_scons_executable(environment):
+    """Locates the SCons executable
+
+    @param  environment  Environment whose search path will be used to look for SCons
+    @returns The path of the SCons executable or just 'scons' if it couldn't be found"""
+
+    # Try to locate SCons with the environment's search path
+    scons_path = environment.WhereIs('scons')
 
     # If not found, try with SCons.Util.WhereIs() which actually works differently
     # from environment.WhereIs()...
@@ -511,18 +1318,7 @@ def _build_scons(environment, source, arguments, target):
     if scons_path is None:
         scons_path = 'scons'
 
-    if platform.system() == 'Windows':
-        return cloned_environment.Command(
-            source = source,
-            action = '"' + scons_path + '" ' + arguments,
-            target = target
-        )
-    else:
-        return cloned_environment.Command(
-            source = source,
-            action = scons_path + ' ' + arguments,
-            target = target
-        )
+    return scons_path
 
 # ----------------------------------------------------------------------------------------------- #
 
@@ -596,15 +1392,27 @@ def _add_cplusplus_project(environment, project_directory, universal_package_nam
 
     environment.add_include_directory(include_directory)
 
-    # Path for the package's libraries
+    # Path for the package's libraries. If the project is built along with this one,
+    # link against the library it is going to build and let the link depend on its
+    # target, so it is built first. Otherwise look for existing binaries.
     project_artifact_directory = os.path.join(project_directory, environment['ARTIFACT_DIRECTORY'])
-    library_directory = cplusplus.find_or_guess_library_directory(
-        environment, project_artifact_directory
-    )
-    if library_directory is None:
-        raise FileNotFoundError(
-            'Could not find library directory for package in ' + project_directory
+    if _is_built_by_build_all(environment, project_directory):
+        library_directory = os.path.join(
+            project_artifact_directory, environment.get_build_directory_name()
+        )
+        environment.Append(
+            _PROJECT_LIBRARY_ALIASES = [
+                _get_project_library_alias(environment, project_directory)
+            ]
         )
+    else:
+        library_directory = cplusplus.find_or_guess_library_directory(
+            environment, project_artifact_directory
+        )
+        if library_directory is None:
+            raise FileNotFoundError(
+                'Could not find library directory for package in ' + project_directory
+            )
 
     environment.add_library_directory(library_directory)
 
@@ -626,6 +1434,47 @@ def _add_cplusplus_project(environment, project_directory, universal_package_nam
 
 # ----------------------------------------------------------------------------------------------- #
 
+def _is_built_by_build_all(environment, project_directory):
+    """Checks whether a project's build script is part of the build started by build_all()
+
+    @param  environment        Environment whose current directory the path is relative to
+    @param  project_directory  Directory holding the project
+    @returns True if build_all() reads the project's build script in this build"""
+
+    project_directory = environment.Dir(project_directory).srcnode().abspath
+    return project_directory in _build_all_project_directories
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_project_library_alias(environment, project_directory):
+    """Forms the name of the alias through which a project's installed library is built
+
+    @param  environment        Environment providing the build settings
+    @param  project_directory  Directory holding the project that builds the library
+    @returns The name of the alias for the project's library in the current build settings"""
+
+    return (
+        'library:' + environment.Dir(project_directory).srcnode().abspath +
+        ':' + environment.get_build_directory_name()
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _depend_on_project_libraries(environment, link):
+    """Makes a link wait for the libraries of the projects added via add_project()
+
+    @param  environment  Environment that may list the aliases of project libraries
+    @param  link         Targets produced by the link
+    @remarks
+        Only projects whose build scripts are read by build_all() are listed,
+        other projects are linked from the binaries they have already built."""
+
+    if '_PROJECT_LIBRARY_ALIASES' in environment:
+        for project_library_alias in environment['_PROJECT_LIBRARY_ALIASES']:
+            environment.Depends(link, environment.Alias(project_library_alias))
+
+# ----------------------------------------------------------------------------------------------- #
+
 def _add_cplusplus_source_directory(
     environment, source_directory, sources = None,
     scons_issue_2908_workaround_needed = False
@@ -668,6 +1517,24 @@ def _add_cplusplus_source_directory(
                 'Explicitly specified source file was not inside source directory'
             )
 
+    # In a unity build, sources are compiled in batches that #include several of them.
+    # Generated sources are left alone since the batches include the original files.
+    if ('UNITY_BATCH_SIZE' in environment) and (not scons_issue_2908_workaround_needed):
+        (batches, sources) = cplusplus.group_unity_batches(
+            sources, environment['UNITY_BATCH_SIZE'], environment.get('UNITY_EXCLUDED_SOURCES')
+        )
+        batch_counts = {}
+        for batch in batches:
+            batch_directory = os.path.dirname(batch[0])
+            batch_counts[batch_directory] = batch_counts.get(batch_directory, 0) + 1
+            variant_sources.append(
+                _generate_unity_source(
+                    environment, intermediate_build_directory,
+                    batch, batch_counts[batch_directory]
+                )
+            )
+
+    for file_path in sources:
         variant_file_path = os.path.join(intermediate_build_directory, file_path)
         variant_sources.append(variant_file_path)
 
@@ -679,6 +1546,299 @@ def _add_cplusplus_source_directory(
 
 # ----------------------------------------------------------------------------------------------- #
 
+def _use_cplusplus_unity_build(environment, batch_size = 8, excluded_sources = None):
+    """Enables unity builds, compiling C++ source code files in batches
+
+    @param  environment       Environment in which unity builds will be enabled
+    @param  batch_size        Maximum number of source code files compiled as one unit
+    @param  excluded_sources  File names or wildcard patterns of source code files that
+                              don't work in a unity build (i.e. due to conflicting
+                              file-local symbols) and will be compiled individually
+    @remarks
+        Must be called before any source directories are added. Each batch is
+        a generated .cpp file in the variant directory that #includes its sources,
+        so headers shared by the sources only need to be parsed once per batch."""
+
+    environment['UNITY_BATCH_SIZE'] = batch_size
+    if excluded_sources is None:
+        environment['UNITY_EXCLUDED_SOURCES'] = []
+    else:
+        environment['UNITY_EXCLUDED_SOURCES'] = list(excluded_sources)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _generate_unity_source(environment, intermediate_build_directory, batch, batch_index):
+    """Sets up the generation of a unity source file that #includes a batch of sources
+
+    @param  environment                   Environment in which the unity file will be generated
+    @param  intermediate_build_directory  Variant-specific intermediate directory
+    @param  batch                         Paths of the source files the unity file will include
+    @param  batch_index                   Running number of the batch within its directory
+    @returns The path of the generated unity source file"""
+
+    unity_directory = os.path.join(intermediate_build_directory, 'unity')
+
+    # Name the batch after the directory its sources are in, plus the running number
+    # in case the directory's sources were split into several batches
+    batch_name = os.path.dirname(batch[0]).replace(os.sep, '.').replace('/', '.').strip('.')
+    unity_file_path = os.path.join(
+        unity_directory, batch_name + '-' + str(batch_index) + '.cpp'
+    )
+
+    contents = '// Unity build batch generated by the Nuclex build system. Do not edit.\n'
+    for source in batch:
+        relative_path = os.path.relpath(source, unity_directory).replace(os.sep, '/')
+        contents += '#include "' + relative_path + '"\n'
+
+    # The file is only regenerated (and the batch only recompiled) if its
+    # contents, that is, the list of sources in the batch, change.
+    environment.Command(
+        source = environment.Value(contents),
+        action = Action(_write_value_to_file, 'Generating unity batch $TARGET'),
+        target = unity_file_path
+    )
+
+    return unity_file_path
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _write_value_to_file(target, source, env):
+    """Writes the contents of a SCons Value node into a file
+
+    @param  target  Expected to contain only one file, the file that will be written
+    @param  source  Expected to contain only one Value node, the contents of the file
+    @param  env     SCons build environment"""
+
+    with open(str(target[0]), 'w', encoding = 'utf-8') as target_file:
+        target_file.write(source[0].get_contents().decode('utf-8'))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _use_cplusplus_precompiled_header(environment, header):
+    """Precompiles a header and makes all C++ sources of the build use it
+
+    @param  environment  Environment in which the precompiled header will be used
+    @param  header       Path of the header that will be precompiled. It should include
+                         the heavy standard library and third-party headers used
+                         throughout the project.
+    @remarks
+        The header is force-included into all C++ sources, so they don't have to
+        #include it themselves. It is precompiled separately for each variant and
+        only rebuilt when the header or any of the headers it includes change."""
+
+    environment['PRECOMPILED_HEADER'] = header
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _use_cplusplus_compile_cache(
+    environment, maximum_size = 5 * 1024 * 1024 * 1024, compression = 'zlib'
+):
+    """Stores compiled object files in a cache from which they can be restored
+    when the same source is compiled with the same settings again
+
+    @param  environment   Environment whose compiled object files will be cached
+    @param  maximum_size  Maximum size of the cache in bytes (default: 5 GiB)
+    @param  compression   Compression of the cached object files ('none', 'zlib' or 'lzma')
+    @remarks
+        Object files are found via a hash of the preprocessed source code and
+        the compiler command line, so they are reused after switching branches or
+        build configurations and even between different variant directories."""
+
+    compilecache = importlib.import_module('compilecache')
+    compilecache.enable(environment, maximum_size, compression)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _use_cplusplus_dependency_files(environment):
+    """Tracks the headers used by each source file through dependency files written
+    by the compiler instead of scanning sources and headers for #includes in Python
+
+    @param  environment  Environment whose compiled object files will use dependency files
+    @remarks
+        Object files that haven't been compiled yet still use SCons' C scanner. After
+        that, the dependency file provides the exact list of headers the compiler
+        read, without searching through the include directories."""
+
+    dependencyfiles = importlib.import_module('dependencyfiles')
+    dependencyfiles.enable(environment)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _compile_cplusplus_sources(environment, variant_sources, position_independent):
+    """Compiles the C/C++ sources collected via add_source_directory() into object files
+
+    @param  environment           Environment controlling the build settings
+    @param  variant_sources       Paths of the sources in the variant directory
+    @param  position_independent  Whether the object files will be linked into
+                                  a shared library
+    @returns The object files that need to be linked"""
+
+    precompiled_header_nodes = []
+    objects = []
+
+    # Before the precompiled header, which has to be compiled with the same flags
+    profile_nodes = _set_up_profile_guided_optimization(environment, variant_sources)
+
+    if 'PRECOMPILED_HEADER' in environment:
+        (precompiled_header_nodes, objects) = _set_up_precompiled_header(
+            environment, position_independent
+        )
+
+    if position_independent:
+        objects += environment.SharedObject(variant_sources)
+    else:
+        objects += environment.Object(variant_sources)
+
+    if len(precompiled_header_nodes) > 0:
+        environment.Depends(objects, precompiled_header_nodes)
+    if len(profile_nodes) > 0:
+        environment.Depends(objects, profile_nodes)
+
+    # With split DWARF, the compiler writes the debug information into a .dwo file
+    if ('SPLIT_DWARF' in environment) and environment['SPLIT_DWARF']:
+        for object_node in objects:
+            environment.SideEffect(os.path.splitext(object_node.abspath)[0] + '.dwo', object_node)
+
+    header_directory = None
+    if 'HEADER_DIRECTORY' in environment:
+        header_directory = environment.Dir(environment['HEADER_DIRECTORY']).srcnode().abspath
+    _compiled_objects.append((objects, header_directory))
+
+    return objects
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _set_up_profile_guided_optimization(environment, variant_sources):
+    """Adds the compiler flags for the profile-guided optimization phase selected via PGO
+
+    @param  environment      Environment whose compiler flags will be adjusted
+    @param  variant_sources  Paths of the sources in the variant directory
+    @returns The nodes the object files need to depend on to pick up new profile data"""
+
+    if (not ('PGO' in environment)) or (environment['PGO'] == 'none'):
+        return []
+
+    pgo = importlib.import_module('pgo')
+
+    profile_directory = _get_profile_directory(environment)
+    variant_directory = environment.Dir(_put_in_intermediate_path(environment, '')).abspath
+
+    if environment['PGO'] == 'generate':
+        pgo.add_instrumentation(environment, profile_directory, variant_directory)
+        return []
+    else:
+        return pgo.add_profile(environment, profile_directory, variant_directory, variant_sources)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_profile_directory(environment):
+    """Determines the directory the profile data for profile-guided optimization goes to
+
+    @param  environment  Environment whose object files the profile data belongs to
+    @returns The absolute path of the profile directory
+    @remarks
+        The instrumented and the optimized build use different variant directories,
+        so the profile directory is named after the variant directory of the latter."""
+
+    profile_directory_name = environment.get_build_directory_name(instrumented = False)
+    if 'INTERMEDIATE_SUFFIX' in environment:
+        profile_directory_name += '-' + environment['INTERMEDIATE_SUFFIX']
+
+    return environment.Dir(
+        os.path.join(environment['INTERMEDIATE_DIRECTORY'], 'profiles', profile_directory_name)
+    ).abspath
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _set_up_precompiled_header(environment, position_independent):
+    """Sets up the build of a precompiled header and the flags to use it
+
+    @param  environment           Environment in which the precompiled header will be used
+    @param  position_independent  Whether the object files will be linked into
+                                  a shared library
+    @returns A tuple of the nodes the object files need to depend on and
+             any additional object files that need to be linked"""
+
+    header_absolute_path = environment.File(environment['PRECOMPILED_HEADER']).srcnode().abspath
+    (header_title, header_extension) = os.path.splitext(os.path.basename(header_absolute_path))
+
+    # Libraries and executables of the same project are compiled with different flags
+    # in the same variant directory, so each gets its own precompiled header
+    if position_independent:
+        precompiled_header_directory = _put_in_intermediate_path(environment, 'pch-shared')
+    else:
+        precompiled_header_directory = _put_in_intermediate_path(environment, 'pch-static')
+
+    # The precompiled header must be built with the flags of the sources it will be
+    # used in, but must not force-include itself, so grab a copy of the settings now
+    precompiled_header_environment = environment.Clone()
+
+    if platform.system() == 'Windows':
+
+        # The Microsoft compiler creates precompiled headers from a source file
+        # and also produces an object file from it that needs to be linked.
+        # Since the debug database is set via /Fd in CXXFLAGS, precompiled header
+        # and object files will write their debug information into the same PDB.
+        source_path = os.path.join(precompiled_header_directory, header_title + '.cpp')
+        environment.Command(
+            source = environment.Value('#include "' + header_absolute_path + '"\n'),
+            action = Action(_write_value_to_file, 'Generating $TARGET'),
+            target = source_path
+        )
+
+        precompiled_header_environment['PCHSTOP'] = header_absolute_path
+        build_precompiled_header = precompiled_header_environment.PCH(
+            os.path.join(precompiled_header_directory, header_title + '.pch'), source_path
+        )
+
+        # SCons' PCH variable would also apply the precompiled header to C sources,
+        # which the Microsoft compiler rejects, so it is only added to the C++ flags
+        environment.Append(CXXFLAGS='/Yu"' + header_absolute_path + '"')
+        environment.Append(CXXFLAGS='/Fp"' + build_precompiled_header[0].abspath + '"')
+        environment.Append(CXXFLAGS='/FI"' + header_absolute_path + '"')
+
+        return ([ build_precompiled_header[0] ], [ build_precompiled_header[1] ])
+
+    else:
+
+        # GCC and clang look for a precompiled header next to each header they
+        # include. A stub header is force-included from the intermediate directory
+        # so the precompiled header from the matching variant is picked up.
+        stub_header_path = os.path.join(
+            precompiled_header_directory, header_title + header_extension
+        )
+        build_stub_header = environment.Command(
+            source = environment.Value('#include "' + header_absolute_path + '"\n'),
+            action = Action(_write_value_to_file, 'Generating $TARGET'),
+            target = stub_header_path
+        )
+
+        if position_independent:
+            precompile_command = (
+                '$SHCXX -x c++-header -o $TARGET $SHCXXFLAGS $SHCCFLAGS $_CCCOMCOM $SOURCE'
+            )
+        else:
+            precompile_command = (
+                '$CXX -x c++-header -o $TARGET $CXXFLAGS $CCFLAGS $_CCCOMCOM $SOURCE'
+            )
+
+        # Precompiling the stub rather than the header itself avoids warnings about
+        # '#pragma once' in the main file. SCons' scanner follows the stub's #include,
+        # so the precompiled header is rebuilt if any header included by it changes.
+        build_precompiled_header = precompiled_header_environment.Command(
+            source = build_stub_header,
+            action = precompile_command,
+            target = stub_header_path + '.gch'
+        )
+
+        stub_header_absolute_path = environment.File(stub_header_path).abspath
+        environment.Append(CXXFLAGS=['-include', stub_header_absolute_path])
+        environment.Append(CXXFLAGS='-Winvalid-pch') # Report unusable precompiled headers
+
+        return (build_stub_header + build_precompiled_header, [])
+
+# ----------------------------------------------------------------------------------------------- #
+
 def _install_artifacts(environment, artifacts):
     artifact_directory = os.path.join(
         environment['ARTIFACT_DIRECTORY'],
@@ -741,25 +1901,39 @@ def _build_cplusplus_library(
     else:
         raise FileNotFoundError('No source files added to compile')
 
+    # Compile the sources into object files that can be linked
+    objects = _compile_cplusplus_sources(environment, variant_sources, not static)
+
+    # Remember the object files so the unit tests can link them instead of recompiling
+    if 'SOURCE_DIRECTORY' in environment:
+        _library_objects[_get_library_objects_key(environment)] = objects
+
     # Build either a static or a shared library
     build_library = None
     if static:
-        build_library = environment.StaticLibrary(library_path, variant_sources)
+        build_library = environment.StaticLibrary(library_path, objects)
     else:
-        build_library = environment.SharedLibrary(library_path, variant_sources)
+        build_library = environment.SharedLibrary(library_path, objects)
+        _set_link_memory_estimate(environment, build_library)
+    _depend_on_project_libraries(environment, build_library)
 
     # If we're on Windows, a side effect of building a library in debug mode is
     # that a PDB file will be generated. Deal with that.
     if (platform.system() == 'Windows') and _is_debug_build(environment):
         build_debug_database = environment.SideEffect(pdb_file_absolute_path, build_library)
-        return _install_artifacts(environment, build_library + build_debug_database)
+        install_library = _install_artifacts(environment, build_library + build_debug_database)
     else:
-        return _install_artifacts(environment, build_library)
+        install_library = _install_artifacts(environment, build_library)
+
+    # Lets projects that add this one via add_project() link after it has been installed
+    environment.Alias(_get_project_library_alias(environment, '.'), install_library)
+
+    return install_library
 
 # ----------------------------------------------------------------------------------------------- #
 
 def _build_cplusplus_executable(
-    environment, universal_executable_name, console = False
+    environment, universal_executable_name, console = False, library_objects = None
 ):
     """Creates a vanilla C/C++ executable
 
@@ -767,6 +1941,8 @@ def _build_cplusplus_executable(
     @param  universal_executable_name  Name of the executable in universal format
                                        (i.e. 'My.Awesome.App')
     @param  console                    Whether to build a shell/command line executable
+    @param  library_objects            Object files from a build_library() call that will
+                                       be linked in instead of compiling the source directory
     @remarks
         Assumes the default conventions, i.e. all source code is contained in a directory
         named 'Source' and all headers in a directory named 'Include'.
@@ -782,7 +1958,7 @@ def _build_cplusplus_executable(
         environment.add_include_directory(environment['HEADER_DIRECTORY'])
 
     # Recursively search for the source code files or transform the existing file list
-    if 'SOURCE_DIRECTORY' in environment:
+    if ('SOURCE_DIRECTORY' in environment) and (library_objects is None):
         environment.add_source_directory(environment['SOURCE_DIRECTORY'])
 
     executable_path = _put_in_intermediate_path(
@@ -812,8 +1988,15 @@ def _build_cplusplus_executable(
     else:
         raise FileNotFoundError('No source files added to compile')
 
+    # Compile the sources into object files that can be linked
+    objects = _compile_cplusplus_sources(environment, variant_sources, False)
+    if not (library_objects is None):
+        objects = objects + library_objects
+
     # Build the executable
-    build_executable = environment.Program(executable_path, variant_sources)
+    build_executable = environment.Program(executable_path, objects)
+    _set_link_memory_estimate(environment, build_executable)
+    _depend_on_project_libraries(environment, build_executable)
     if (platform.system() == 'Windows') and _is_debug_build(environment):
         build_debug_database = environment.SideEffect(pdb_file_absolute_path, build_executable)
         return _install_artifacts(environment, build_executable + build_debug_database)
@@ -829,7 +2012,15 @@ def _build_cplusplus_unit_tests(
 
     @param  environment                Environment controlling the build settings
     @param  universal_executable_name  Name of the library in universal format
-                                       (i.e. 'My.Awesome.Stuff')"""
+                                       (i.e. 'My.Awesome.Stuff')
+    @remarks
+        If build_library() has been called for the same source directory and build
+        settings before, the unit tests link the library's object files. Otherwise,
+        the source directory is compiled a second time for the unit tests."""
+
+    library_objects = None
+    if 'SOURCE_DIRECTORY' in environment:
+        library_objects = _library_objects.get(_get_library_objects_key(environment))
 
     environment.add_project('../ThirdParty/gtest', [ 'gtest', 'gtest_main' ])
     if not (platform.system() == 'Windows'):
@@ -841,22 +2032,53 @@ def _build_cplusplus_unit_tests(
         environment.add_source_directory(environment['TESTS_DIRECTORY'])
 
     return _build_cplusplus_executable(
-        environment, universal_executable_name, console = True
+        environment, universal_executable_name, console = True,
+        library_objects = library_objects
     )
 
 # ----------------------------------------------------------------------------------------------- #
 
-def _run_cplusplus_unit_tests(environment, universal_test_executable_name):
+def _set_link_memory_estimate(environment, link):
+    """Lets a link wait for memory if other links or exports already use up the budget
+
+    @param  environment  Environment that may specify a LINK_MEMORY_ESTIMATE in MiB
+    @param  link         Targets produced by the link"""
+
+    if 'LINK_MEMORY_ESTIMATE' in environment:
+        memorybudget.set_memory_estimate(link, environment['LINK_MEMORY_ESTIMATE'])
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_library_objects_key(environment):
+    """Forms the key under which the object files of a library build are remembered
+
+    @param  environment  Environment the library is or would be built in
+    @returns A key identifying the library's source directory and build settings"""
+
+    source_directory = environment.Dir(environment['SOURCE_DIRECTORY']).srcnode().abspath
+    return (source_directory, environment.get_variant_directory_name())
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _run_cplusplus_unit_tests(
+    environment, universal_test_executable_name, shard_count = None
+):
     """Runs the unit tests executable comiled from a build_unit_test_executable() call
 
     @param  environment                     Environment used to locate the unit test executable
     @param  universal_test_executable_name  Name of the unit test executable from the build step
+    @param  shard_count                     Number of processes the tests will be split across,
+                                            defaults to the number of CPUs
     @remarks
         This executes the unit test executable and produces an XML file detailing
-        the test results for CI servers and other processing."""
+        the test results for CI servers and other processing. The tests are run in
+        parallel shards whose results are merged into a single XML file."""
 
     environment = environment.Clone()
 
+    if not (shard_count is None):
+        environment['TEST_SHARD_COUNT'] = shard_count
+
     # Figure out the path the unit tests executable would have been compiled to
     test_executable_name = cplusplus.get_platform_specific_executable_name(
         universal_test_executable_name
@@ -876,14 +2098,74 @@ def _run_cplusplus_unit_tests(environment, universal_test_executable_name):
             environment, 'gtest-results.xml'
         )
 
+    gtest = importlib.import_module('gtest')
+    run_tests_action = Action(
+        gtest.run_sharded_tests, 'Running unit tests $SOURCE',
+        varlist = [ 'TEST_SHARD_COUNT' ]
+    )
+
+    # Unless another training run is set up, the unit tests provide the profile data
+    if ('PGO' in environment) and (environment['PGO'] == 'generate'):
+        pgo = importlib.import_module('pgo')
+        run_tests_action = [
+            Action(pgo.prepare_training, None),
+            run_tests_action,
+            Action(pgo.finish_training, None)
+        ]
+
     return environment.Command(
         source = test_executable_path,
-        action = '-$SOURCE --gtest_output=xml:$TARGET',
+        action = run_tests_action,
         target = test_results_path
     )
 
 # ----------------------------------------------------------------------------------------------- #
 
+def _train_cplusplus_profile(
+    environment, universal_executable_name, arguments = None
+):
+    """Runs an executable to record profile data for profile-guided optimization
+
+    @param  environment                Environment used to locate the executable
+    @param  universal_executable_name  Name of the executable from a build_executable() call
+    @param  arguments                  Command line arguments passed to the executable
+    @returns The training run or None if this is not a build with PGO=generate
+    @remarks
+        Use this to train with a benchmark or another representative workload. When
+        run_unit_tests() is also called, the profile data of both runs is combined.
+        Afterwards, a build with PGO=use compiles optimized binaries with the profile."""
+
+    if (not ('PGO' in environment)) or (environment['PGO'] != 'generate'):
+        return None
+
+    pgo = importlib.import_module('pgo')
+    environment = environment.Clone()
+
+    if not (arguments is None):
+        environment['PGO_TRAINING_ARGUMENTS'] = arguments
+
+    executable_path = _put_in_artifact_path(
+        environment, cplusplus.get_platform_specific_executable_name(universal_executable_name)
+    )
+    training_log_path = _put_in_intermediate_path(
+        environment, universal_executable_name + '.training.log'
+    )
+
+    return environment.Command(
+        source = executable_path,
+        action = [
+            Action(pgo.prepare_training, None),
+            Action(
+                pgo.run_training, 'Recording profile data with $SOURCE',
+                varlist = [ 'PGO_TRAINING_ARGUMENTS' ]
+            ),
+            Action(pgo.finish_training, None)
+        ],
+        target = training_log_path
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
 def _build_msbuild_project(environment, msbuild_project_path):
     """Builds an MSBuild project
 
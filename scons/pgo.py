@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+
+import os
+import glob
+import time
+import hashlib
+import importlib
+import subprocess
+import threading
+
+from SCons.Node.FS import File
+from SCons.Util import WhereIs
+
+"""
+Profile-guided optimization for C/C++ builds
+
+A build with PGO=generate compiles instrumented binaries that record how often each
+branch and function is executed. Running them on a representative workload (the unit
+tests or a benchmark) collects profile data which a build with PGO=use feeds back into
+the optimizer, letting it lay out and inline code for the paths that actually run hot.
+
+Each profile directory holds a manifest with the signatures of the sources the profile
+was recorded for, so the optimized build can tell when sources have changed since.
+"""
+
+shared = importlib.import_module('shared')
+cplusplus = importlib.import_module('cplusplus')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Name of the file recording which sources a profile directory holds profile data for
+_manifest_file_name = 'profile-manifest.json'
+
+# Name of the merged profile written for clang builds
+_merged_profile_file_name = 'merged.profdata'
+
+# File patterns of the raw profile data written by instrumented executables
+_raw_profile_patterns = [ '*.gcda', '*.profraw' ]
+
+# GCC flag that names profile files relative to a directory instead of by full path
+_profile_prefix_flag = '-fprofile-prefix-path='
+
+# Whether the lack of support for the profile prefix flag has been reported
+_profile_prefix_warning_shown = False
+
+# Number of out-of-date sources listed by name when reporting a stale profile
+_reported_stale_source_count = 5
+
+# Profile directories whose profile data from earlier builds has already been deleted
+_cleared_profile_directories = set()
+
+# Training runs can execute in parallel, but may share profile directories
+_training_lock = threading.Lock()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def add_instrumentation(environment, profile_directory, variant_directory):
+    """Makes an environment compile instrumented code that records profile data
+
+    @param  environment        Environment whose compiler flags will be adjusted
+    @param  profile_directory  Absolute path of the directory receiving the profile data
+    @param  variant_directory  Absolute path of the variant directory object files go to
+    @remarks
+        GCC names its profile files after the object files. They are named relative
+        to the variant directory, so the optimized build, which has a different variant
+        directory, finds them under the same name."""
+
+    compiler_name = cplusplus.get_compiler_name(environment)
+    if compiler_name == 'gcc':
+        environment.Append(
+            CCFLAGS = [
+                '-fprofile-generate=' + profile_directory,
+                '-fprofile-update=prefer-atomic' # Multi-threaded code counts correctly
+            ]
+        )
+        environment.Append(CCFLAGS = _get_profile_prefix_flags(environment, variant_directory))
+    elif compiler_name == 'clang':
+        environment.Append(CCFLAGS = [ '-fprofile-generate=' + profile_directory ])
+    else:
+        raise ValueError('Profile-guided optimization is only supported with GCC and clang')
+
+    environment.Append(LINKFLAGS = [ '-fprofile-generate' ]) # Link the profiling runtime
+    environment['PGO_PROFILE_DIRECTORY'] = profile_directory
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_profile_prefix_flags(environment, variant_directory):
+    """Determines the flags that name GCC's profile files relative to the variant directory
+
+    @param  environment        Environment whose compiler will be checked
+    @param  variant_directory  Absolute path of the variant directory object files go to
+    @returns The compiler flags, empty if the compiler doesn't support them
+    @remarks
+        -fprofile-prefix-path was added in GCC 12. Older versions name the profile files
+        after the full path of the object files, so the optimized build, which uses
+        a different variant directory, builds without profile data."""
+
+    if cplusplus.supports_compiler_flag(environment, _profile_prefix_flag + '.'):
+        return [ _profile_prefix_flag + variant_directory ]
+
+    global _profile_prefix_warning_shown
+    if not _profile_prefix_warning_shown:
+        print(
+            '\033[93mWarning: the compiler does not support ' + _profile_prefix_flag +
+            ' (GCC 12 or later), the optimized build will not find the profile data\033[0m'
+        )
+        _profile_prefix_warning_shown = True
+
+    return []
+
+# ----------------------------------------------------------------------------------------------- #
+
+def add_profile(environment, profile_directory, variant_directory, sources):
+    """Makes an environment optimize its code using previously recorded profile data
+
+    @param  environment        Environment whose compiler flags will be adjusted
+    @param  profile_directory  Absolute path of the directory holding the profile data
+    @param  variant_directory  Absolute path of the variant directory object files go to
+    @param  sources            Source files that will be compiled in the environment
+    @returns The files the object files need to depend on so they're recompiled when
+             new profile data is recorded, empty if no profile data is available"""
+
+    manifest_path = os.path.join(profile_directory, _manifest_file_name)
+    manifest = shared.load_json_file(manifest_path)
+    if manifest is None:
+        print(
+            'No profile data in ' + profile_directory + ', ' +
+            'build and train with PGO=generate first'
+        )
+        return []
+
+    # Functions whose code no longer matches the profile are simply optimized without it,
+    # the stale sources are reported below instead of warning for each function
+    compiler_name = cplusplus.get_compiler_name(environment)
+    if compiler_name == 'gcc':
+        environment.Append(
+            CCFLAGS = [
+                '-fprofile-use=' + profile_directory,
+                '-Wno-missing-profile',
+                '-Wno-coverage-mismatch'
+            ]
+        )
+        environment.Append(CCFLAGS = _get_profile_prefix_flags(environment, variant_directory))
+        environment.Append(LINKFLAGS = [ '-fprofile-use' ]) # Optimizations done via LTO
+    elif compiler_name == 'clang':
+        merged_profile_path = os.path.join(profile_directory, _merged_profile_file_name)
+        if not os.path.isfile(merged_profile_path):
+            print('No merged profile in ' + profile_directory + ', train with PGO=generate')
+            return []
+
+        environment.Append(
+            CCFLAGS = [
+                '-fprofile-use=' + merged_profile_path,
+                '-Wno-profile-instr-unprofiled',
+                '-Wno-profile-instr-out-of-date'
+            ]
+        )
+    else:
+        raise ValueError('Profile-guided optimization is only supported with GCC and clang')
+
+    _report_stale_sources(environment, manifest, profile_directory, sources)
+
+    return [ environment.File(manifest_path) ]
+
+# ----------------------------------------------------------------------------------------------- #
+
+def prepare_training(target, source, env):
+    """Deletes outdated profile data before an instrumented executable is run
+
+    @param  target  Not used
+    @param  source  Instrumented executable that will be run
+    @param  env     SCons build environment
+    @remarks
+        Profile data from earlier builds may belong to different code. Data recorded
+        in the current build is kept, so several training runs add up."""
+
+    with _training_lock:
+        for profile_directory in _collect_trained_sources(source[0]):
+            if profile_directory in _cleared_profile_directories:
+                continue
+            _cleared_profile_directories.add(profile_directory)
+
+            os.makedirs(profile_directory, exist_ok = True)
+
+            stale_file_paths = [ os.path.join(profile_directory, _manifest_file_name) ]
+            stale_file_paths.append(os.path.join(profile_directory, _merged_profile_file_name))
+            for pattern in _raw_profile_patterns:
+                stale_file_paths.extend(glob.glob(os.path.join(profile_directory, pattern)))
+
+            for stale_file_path in stale_file_paths:
+                if os.path.isfile(stale_file_path):
+                    os.remove(stale_file_path)
+
+    return 0
+
+# ----------------------------------------------------------------------------------------------- #
+
+def run_training(target, source, env):
+    """Runs an instrumented executable to record profile data
+
+    @param  target  Expected to contain only one file, the log of the training run
+    @param  source  Instrumented executable that will be run
+    @param  env     SCons build environment providing PGO_TRAINING_ARGUMENTS
+    @returns The exit code of the executable"""
+
+    arguments = [ source[0].abspath ]
+    if 'PGO_TRAINING_ARGUMENTS' in env:
+        arguments.extend(env['PGO_TRAINING_ARGUMENTS'])
+
+    try:
+        completed_process = subprocess.run(
+            arguments,
+            stdout = subprocess.PIPE,
+            stderr = subprocess.STDOUT,
+            env = shared.get_process_environment(env)
+        )
+    except OSError as error:
+        print('Could not run ' + str(source[0]) + ': ' + str(error))
+        return 1
+
+    output = completed_process.stdout.decode('utf-8', errors = 'replace')
+    with open(target[0].abspath, 'w', encoding = 'utf-8') as log_file:
+        log_file.write(output)
+
+    if completed_process.returncode != 0:
+        print(output, end = '' if output.endswith('\n') else '\n')
+
+    return completed_process.returncode
+
+# ----------------------------------------------------------------------------------------------- #
+
+def finish_training(target, source, env):
+    """Merges the recorded profile data and records which sources it belongs to
+
+    @param  target  Not used
+    @param  source  Instrumented executable that has been run
+    @param  env     SCons build environment
+    @returns 0 if the profile data was processed, 1 if merging it failed"""
+
+    trained_sources = _collect_trained_sources(source[0])
+
+    with _training_lock:
+        if cplusplus.get_compiler_name(env) == 'clang':
+            if not _merge_raw_profiles(env, list(trained_sources.keys())):
+                return 1
+
+        for profile_directory, source_signatures in trained_sources.items():
+            manifest_path = os.path.join(profile_directory, _manifest_file_name)
+            manifest = shared.load_json_file(manifest_path, { 'sources': {} })
+
+            manifest['sources'].update(source_signatures)
+            manifest['trained'] = time.time() # New profile data, recompile optimized code
+
+            shared.save_json_file(manifest_path, manifest)
+
+    return 0
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _collect_trained_sources(executable):
+    """Looks up the instrumented sources that were linked into an executable
+
+    @param  executable  Executable whose instrumented sources will be collected
+    @returns A dictionary with the signatures of the sources by absolute source path,
+             for each profile directory the sources record their profile data in"""
+
+    trained_sources = {}
+
+    visited_nodes = set()
+    pending_nodes = [ executable ]
+    while len(pending_nodes) > 0:
+        node = pending_nodes.pop()
+        for child in node.children():
+            if (child in visited_nodes) or not child.has_builder():
+                continue
+            visited_nodes.add(child)
+            pending_nodes.append(child)
+
+            profile_directory = child.get_build_env().get('PGO_PROFILE_DIRECTORY')
+            if profile_directory is None:
+                continue
+
+            # Object files are the only targets compiled directly from source files
+            for child_source in child.sources:
+                if child_source.has_builder():
+                    continue # Object files being linked, generated sources
+                if not isinstance(child_source.disambiguate(), File):
+                    continue # Values, i.e. the contents of generated files
+
+                source_node = child_source.srcnode()
+                trained_sources.setdefault(profile_directory, {})[source_node.abspath] = (
+                    _get_source_signature(source_node.abspath)
+                )
+
+    return trained_sources
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _merge_raw_profiles(environment, profile_directories):
+    """Merges the raw profiles written by clang-instrumented executables
+
+    @param  environment          Environment used to look up the compiler version
+    @param  profile_directories  Profile directories the raw profiles were written to
+    @returns True if the profiles were merged, False if merging failed
+    @remarks
+        Clang's profiles are keyed by function, not by object file, so the raw profiles
+        of all directories are merged into a single profile stored in each directory."""
+
+    raw_profile_paths = []
+    for profile_directory in profile_directories:
+        raw_profile_paths.extend(glob.glob(os.path.join(profile_directory, '*.profraw')))
+
+    if len(raw_profile_paths) == 0:
+        print('Training run did not write any profile data')
+        return False
+
+    # Distributions install llvm-profdata with the LLVM version appended
+    profile_tool_path = WhereIs('llvm-profdata')
+    if profile_tool_path is None:
+        compiler_version = cplusplus.get_compiler_version(environment)
+        if not (compiler_version is None):
+            profile_tool_path = WhereIs('llvm-profdata-' + str(compiler_version[0]))
+
+    if profile_tool_path is None:
+        print('llvm-profdata not found, it is needed to merge clang profile data')
+        return False
+
+    for profile_directory in profile_directories:
+        merged_profile_path = os.path.join(profile_directory, _merged_profile_file_name)
+        exit_code = subprocess.call(
+            [ profile_tool_path, 'merge', '-output=' + merged_profile_path ] + raw_profile_paths
+        )
+        if exit_code != 0:
+            return False
+
+    return True
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _report_stale_sources(environment, manifest, profile_directory, sources):
+    """Warns about sources that have changed since their profile data was recorded
+
+    @param  environment        Environment the sources will be compiled in
+    @param  manifest           Manifest of the profile directory
+    @param  profile_directory  Directory holding the profile data
+    @param  sources            Source files that will be compiled"""
+
+    source_signatures = manifest.get('sources', {})
+
+    stale_source_names = []
+    profiled_source_count = 0
+    for source in sources:
+        source_node = environment.File(source).srcnode()
+        if source_node.has_builder():
+            continue # Generated sources, i.e. unity build batches, aren't tracked
+
+        recorded_signature = source_signatures.get(source_node.abspath)
+        if recorded_signature is None:
+            continue # Code not covered by the training run
+
+        profiled_source_count += 1
+        if recorded_signature != _get_source_signature(source_node.abspath):
+            stale_source_names.append(source_node.name)
+
+    if len(stale_source_names) > 0:
+        listed_names = ', '.join(stale_source_names[0:_reported_stale_source_count])
+        if len(stale_source_names) > _reported_stale_source_count:
+            listed_names += ', ...'
+
+        print(
+            'Profile data in {} is out of date for {} of {} sources ({}), '.format(
+                profile_directory, len(stale_source_names), profiled_source_count, listed_names
+            ) +
+            'changed code is optimized without it until trained again with PGO=generate'
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_source_signature(source_path):
+    """Calculates a signature that changes whenever the contents of a source file change
+
+    @param  source_path  Absolute path of the source file
+    @returns The signature of the source file or None if it could not be read
+    @remarks
+        SCons' own content signatures can't be used here because requesting them
+        while the build scripts are read keeps SCons from storing build information."""
+
+    try:
+        with open(source_path, 'rb') as source_file:
+            return hashlib.sha256(source_file.read()).hexdigest()
+    except OSError:
+        return None
+
+# ----------------------------------------------------------------------------------------------- #
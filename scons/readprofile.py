@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import atexit
+import pstats
+import cProfile
+import importlib
+import threading
+import tracemalloc
+
+import SCons.Script
+import SCons.Script.Main
+
+"""
+Profiler for the reading phase of SCons builds
+
+Measures how long each build script read via build_all() takes to evaluate, where the
+time goes (compiler probes, directory walks, project file parsing...) and how much
+memory each script allocates. At the end of the build, a ranking of the build scripts
+is written as JSON together with a collapsed-stack file that flame graph tools such as
+flamegraph.pl, speedscope or inferno can render, and the time spent reading the build
+scripts is compared to the time spent building.
+"""
+
+shared = importlib.import_module('shared')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Seconds between two samples of the call stack taken for the collapsed-stack file
+_sampling_interval = 0.001
+
+# Number of functions listed for each build script in the report
+_reported_function_count = 15
+
+# Number of build scripts listed on the console
+_reported_script_count = 10
+
+# Path the JSON report will be written to, None while profiling is disabled
+_report_file_path = None
+
+# Measurements of each build script, in the order the scripts were read
+_script_profiles = []
+
+# Number of times each collapsed call stack was seen by the sampler
+_stack_samples = {}
+
+# Identifier of the thread reading the build scripts, None while no script is read
+_sampled_thread_id = None
+
+# Times at which SCons started and finished building the targets
+_build_start_time = None
+_build_end_time = None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(report_file_path):
+    """Starts profiling the build scripts read via read_build_script()
+
+    @param  report_file_path  Path the JSON report will be written to, the collapsed
+                              stacks are written next to it with the extension '.folded'
+    @remarks
+        Only the first call has an effect. Allocations are traced from here on,
+        which slows down the reading phase noticeably."""
+
+    global _report_file_path
+
+    if not (_report_file_path is None):
+        return
+
+    _report_file_path = report_file_path
+
+    tracemalloc.start()
+
+    original_build_targets = SCons.Script.Main._build_targets
+
+    def build_targets_with_timing(*arguments, **keyword_arguments):
+        return _build_targets_with_timing(original_build_targets, arguments, keyword_arguments)
+
+    SCons.Script.Main._build_targets = build_targets_with_timing
+
+    sampler_thread = threading.Thread(target = _sample_call_stacks, daemon = True)
+    sampler_thread.start()
+
+    atexit.register(_finish_build)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def read_build_script(environment, build_script):
+    """Reads a build script while measuring its time and memory use
+
+    @param  environment   Environment through which the build script will be read
+    @param  build_script  Path of the build script that will be read
+    @returns Whatever the build script returned via SCons' Return()"""
+
+    global _sampled_thread_id
+
+    # Only the outermost build script is measured, a build script calling build_all()
+    # includes the nested build scripts in its own measurements
+    if not (_sampled_thread_id is None):
+        return environment.SConscript(build_script)
+
+    profiler = cProfile.Profile()
+
+    tracemalloc.reset_peak()
+    (start_memory, start_peak_memory) = tracemalloc.get_traced_memory()
+    start_time = time.perf_counter()
+
+    _sampled_thread_id = threading.get_ident()
+    profiler.enable()
+    try:
+        return environment.SConscript(build_script)
+    finally:
+        profiler.disable()
+        _sampled_thread_id = None
+
+        seconds = time.perf_counter() - start_time
+        (end_memory, peak_memory) = tracemalloc.get_traced_memory()
+
+        _script_profiles.append(
+            {
+                'script': os.path.abspath(build_script),
+                'seconds': seconds,
+                'allocated_mib': (end_memory - start_memory) / 1048576.0,
+                'peak_mib': (peak_memory - start_memory) / 1048576.0,
+                'functions': _get_slowest_functions(profiler)
+            }
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _build_targets_with_timing(original_build_targets, arguments, keyword_arguments):
+    """Records when SCons starts and finishes building the targets
+
+    @param  original_build_targets  SCons' own function building the targets
+    @param  arguments               Positional arguments for SCons' function
+    @param  keyword_arguments       Keyword arguments for SCons' function
+    @returns Whatever SCons' function returned"""
+
+    global _build_start_time, _build_end_time
+
+    # All build scripts have been read, stop tracing allocations for the build
+    tracemalloc.stop()
+
+    _build_start_time = time.time()
+    try:
+        return original_build_targets(*arguments, **keyword_arguments)
+    finally:
+        _build_end_time = time.time()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _sample_call_stacks():
+    """Periodically records the call stack of the thread reading a build script"""
+
+    while True:
+        time.sleep(_sampling_interval)
+
+        sampled_thread_id = _sampled_thread_id
+        if sampled_thread_id is None:
+            continue
+
+        frame = sys._current_frames().get(sampled_thread_id)
+        if frame is None:
+            continue
+
+        stack_entries = []
+        while not (frame is None):
+            code = frame.f_code
+            stack_entries.append(os.path.basename(code.co_filename) + ':' + code.co_name)
+            frame = frame.f_back
+
+        stack_entries.reverse()
+        stack = ';'.join(stack_entries)
+        _stack_samples[stack] = _stack_samples.get(stack, 0) + 1
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_slowest_functions(profiler):
+    """Extracts the functions a build script spent the most time in from its profile
+
+    @param  profiler  Profiler that measured the build script
+    @returns A list of dictionaries with the name, call count, own and cumulative
+             seconds of the functions with the highest cumulative time"""
+
+    statistics = pstats.Stats(profiler).stats
+
+    functions = []
+    for (file_path, line, function_name), timing in statistics.items():
+        (primitive_calls, total_calls, own_seconds, cumulative_seconds, callers) = timing
+        functions.append(
+            {
+                'name': os.path.basename(file_path) + ':' + str(line) + ':' + function_name,
+                'calls': total_calls,
+                'own_seconds': own_seconds,
+                'cumulative_seconds': cumulative_seconds
+            }
+        )
+
+    functions.sort(key = lambda entry: entry['cumulative_seconds'], reverse = True)
+    return functions[0:_reported_function_count]
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _finish_build():
+    """Writes the reading phase report when SCons exits"""
+
+    end_time = time.time()
+
+    total_seconds = end_time - SCons.Script.start_time
+    if _build_start_time is None:
+        reading_seconds = total_seconds # Stopped while reading or nothing to build
+        building_seconds = 0.0
+    else:
+        reading_seconds = _build_start_time - SCons.Script.start_time
+        building_seconds = _build_end_time - _build_start_time
+
+    script_profiles = sorted(
+        _script_profiles, key = lambda entry: entry['seconds'], reverse = True
+    )
+
+    report = {
+        'total_seconds': total_seconds,
+        'reading_seconds': reading_seconds,
+        'build_script_seconds': sum(entry['seconds'] for entry in script_profiles),
+        'building_seconds': building_seconds,
+        'scripts': script_profiles
+    }
+    shared.save_json_file(_report_file_path, report)
+
+    folded_file_path = os.path.splitext(_report_file_path)[0] + '.folded'
+    with open(folded_file_path, 'w') as folded_file:
+        for stack, count in sorted(_stack_samples.items()):
+            folded_file.write(stack + ' ' + str(count) + '\n')
+
+    _print_report(report, folded_file_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _print_report(report, folded_file_path):
+    """Prints the slowest build scripts and the split between reading and building
+
+    @param  report            Report as written at the end of the build
+    @param  folded_file_path  Path of the collapsed-stack file"""
+
+    print(
+        'Reading took {:.2f}s, {:.2f}s of it in build scripts read via build_all(), '.format(
+            report['reading_seconds'], report['build_script_seconds']
+        ) +
+        'building took {:.2f}s'.format(report['building_seconds'])
+    )
+
+    if len(report['scripts']) > 0:
+        print('   Seconds  Alloc MiB  Peak MiB  Build script')
+        for entry in report['scripts'][0:_reported_script_count]:
+            print(
+                '  {:>8.3f}  {:>9.1f}  {:>8.1f}  {}'.format(
+                    entry['seconds'], entry['allocated_mib'], entry['peak_mib'], entry['script']
+                )
+            )
+
+    print(
+        'Full report written to ' + _report_file_path + ', collapsed stacks to ' +
+        folded_file_path
+    )
+
+# ----------------------------------------------------------------------------------------------- #
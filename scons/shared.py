@@ -2,6 +2,9 @@
 
 import os
 import shutil
+import platform
+import json
+import tempfile
 
 """
 Shared code for SCons projects
@@ -82,3 +85,138 @@ def setup_variant_dirs(
         scons_environment.VariantDir(build_directory, subdirectory, duplicate = 0)
 
 # ----------------------------------------------------------------------------------------------- #
+
+def get_cache_directory(subdirectory = None):
+    """Determines the directory in which persistent build caches are stored
+
+    @param  subdirectory  Optional subdirectory inside the cache directory
+    @returns The path of the cache directory, which is created if it doesn't exist
+    @remarks
+        The cache directory can be moved via the NUCLEX_CACHE_DIRECTORY environment
+        variable. Otherwise, it follows the conventions of the platform (XDG on Linux,
+        the local application data folder on Windows)."""
+
+    if 'NUCLEX_CACHE_DIRECTORY' in os.environ:
+        cache_directory = os.environ['NUCLEX_CACHE_DIRECTORY']
+    elif platform.system() == 'Windows':
+        cache_directory = os.path.join(
+            os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'Nuclex', 'BuildCache'
+        )
+    else:
+        cache_directory = os.path.join(
+            os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+            'nuclex-build'
+        )
+
+    if not (subdirectory is None):
+        cache_directory = os.path.join(cache_directory, subdirectory)
+
+    os.makedirs(cache_directory, exist_ok = True)
+
+    return cache_directory
+
+# ----------------------------------------------------------------------------------------------- #
+
+def load_json_file(file_path, default = None):
+    """Loads a JSON file, returning a default value if it is missing or unreadable
+
+    @param  file_path  Path of the JSON file that will be loaded
+    @param  default    Value that will be returned if the file can't be loaded
+    @returns The contents of the JSON file or the default value"""
+
+    try:
+        with open(file_path, 'r', encoding = 'utf-8') as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+# ----------------------------------------------------------------------------------------------- #
+
+def save_json_file(file_path, contents):
+    """Atomically writes a JSON file so concurrent builds never see a partial file
+
+    @param  file_path  Path the JSON file will be written to
+    @param  contents   Object that will be serialized into the JSON file"""
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok = True)
+
+    (file_handle, temporary_path) = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+    try:
+        with os.fdopen(file_handle, 'w', encoding = 'utf-8') as json_file:
+            json.dump(contents, json_file)
+        os.replace(temporary_path, file_path)
+    except OSError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_process_environment(environment):
+    """Builds the process environment for running a tool from within a build action
+
+    @param  environment  SCons build environment providing the 'ENV' dictionary
+    @returns A dictionary of environment variables with only string values"""
+
+    process_environment = {}
+    for key, value in environment['ENV'].items():
+        if isinstance(value, (list, tuple)):
+            value = os.pathsep.join(str(item) for item in value)
+        process_environment[key] = str(value)
+
+    return process_environment
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_cgroup_directories(controller):
+    """Lists the control groups the build process runs in for a cgroup controller
+
+    @param  controller  Name of the controller (i.e. 'cpu' or 'memory') whose groups
+                        will be listed
+    @returns A list holding, for each control group hierarchy with the controller,
+             a list of the directories of the build process' group and its parent
+             groups, innermost first
+    @remarks
+        Inside a container, the group's own directory usually is the mount directory,
+        so the parent groups are only walked up to the mount directory. Without control
+        groups (i.e. on Windows), the returned list is empty."""
+
+    try:
+        with open('/proc/self/cgroup', 'r') as cgroup_file:
+            cgroup_lines = cgroup_file.read().splitlines()
+    except OSError:
+        return []
+
+    cgroup_directories = []
+
+    # Each line is 'hierarchy-id:controllers:path', cgroup v2 has no controller list
+    for cgroup_line in cgroup_lines:
+        (hierarchy_id, controllers, cgroup_path) = cgroup_line.split(':', 2)
+        if controllers == '':
+            mount_directories = [ '/sys/fs/cgroup' ]
+        elif controller in controllers.split(','):
+            mount_directories = [ '/sys/fs/cgroup/' + controllers, '/sys/fs/cgroup/' + controller ]
+        else:
+            continue
+
+        for mount_directory in mount_directories:
+            if os.path.isdir(mount_directory):
+                mount_directory = os.path.normpath(mount_directory)
+                group_directory = os.path.normpath(
+                    os.path.join(mount_directory, cgroup_path.lstrip('/'))
+                )
+
+                group_directories = [ group_directory ]
+                while group_directory != mount_directory:
+                    parent_directory = os.path.dirname(group_directory)
+                    if parent_directory == group_directory:
+                        break # Group path outside of the mount directory, can't go higher
+                    group_directory = parent_directory
+                    group_directories.append(group_directory)
+
+                cgroup_directories.append(group_directories)
+                break
+
+    return cgroup_directories
+
+# ----------------------------------------------------------------------------------------------- #
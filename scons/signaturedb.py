@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import sqlite3
+import threading
+
+"""
+SQLite-backed signature database for SCons
+
+SCons' default signature database (.sconsign.dblite) is a single pickle holding the
+signatures of every build variant. It is loaded completely on start, rewritten
+completely on exit and two SCons processes building different variants in the same
+checkout (i.e. DEBUG=1 and a release build) overwrite each other's signatures.
+
+This module implements the dbm interface SCons expects from a signature database
+on top of SQLite. The signatures of a directory are only read when SCons looks at
+that directory and only the directories whose signatures changed are written. Each
+build variant gets its own database file, so builds of different variants never
+touch the same file, and the write-ahead log lets builds of the same variant read
+while another one is writing.
+"""
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Milliseconds a build waits for another build of the same variant to finish writing
+_busy_timeout_milliseconds = 60000
+
+# Path of the signature database in use, None while SCons' default database is used
+_database_path = None
+
+# Whether the database in use was only chosen until an environment picks its own
+_is_fallback = False
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(environment, database_path, fallback = False):
+    """Stores the signatures of the build in an SQLite database
+
+    @param  environment    Environment through which the database will be selected
+    @param  database_path  Path of the SQLite database the signatures will be stored in
+    @param  fallback       Whether the database is only used if no other call picks one
+    @remarks
+        SCons has one signature database per build, so only the first call that is
+        not a fallback has an effect. A fallback is used when no such call happens,
+        i.e. a generic environment reading the build scripts of C++ projects lets
+        the first C++ environment decide. SCons only opens the database when it looks
+        at the signatures of a file, so all calls have to happen before that."""
+
+    global _database_path, _is_fallback
+
+    if not (_database_path is None):
+        if fallback or not _is_fallback:
+            return
+
+    _database_path = os.path.abspath(database_path)
+    _is_fallback = fallback
+    environment.SConsignFile(_database_path, sys.modules[__name__])
+
+# ----------------------------------------------------------------------------------------------- #
+
+def get_database_path():
+    """Returns the path of the signature database the build uses
+
+    @returns The path of the SQLite database or None if SCons' default database is used"""
+
+    return _database_path
+
+# ----------------------------------------------------------------------------------------------- #
+
+def open(file, flag = 'r', mode = 0o666):
+    """Opens the signature database, called by SCons as part of the dbm interface
+
+    @param  file  Path of the SQLite database that will be opened
+    @param  flag  'r' to open for reading only, 'c' to create the database if needed
+    @param  mode  Permissions for a newly created database file, ignored
+    @returns A dictionary-like object mapping directories to their pickled signatures"""
+
+    if flag == 'r':
+        if not os.path.isfile(file):
+            raise FileNotFoundError('Signature database ' + file + ' does not exist')
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok = True)
+
+    try:
+        connection = _connect(file, flag)
+    except sqlite3.DatabaseError as error:
+        if flag == 'r':
+            raise OSError(str(error)) from error
+
+        # Like SCons does with corrupt .sconsign files, start over with empty signatures
+        print('Ignoring corrupt signature database ' + file + ' (' + str(error) + ')')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(file + suffix):
+                os.remove(file + suffix)
+        connection = _connect(file, flag)
+
+    return _SignatureDatabase(file, flag, connection)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _connect(file, flag):
+    """Opens an SQLite connection to the signature database and prepares its table
+
+    @param  file  Path of the SQLite database that will be opened
+    @param  flag  'r' to open for reading only, 'c' to create the database if needed
+    @returns The SQLite connection"""
+
+    if flag == 'r':
+        connection = sqlite3.connect(
+            'file:' + file + '?mode=ro', uri = True, check_same_thread = False
+        )
+    else:
+        connection = sqlite3.connect(file, check_same_thread = False)
+
+    connection.execute('PRAGMA busy_timeout = ' + str(_busy_timeout_milliseconds))
+
+    if flag != 'r':
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS signatures (' +
+            'directory TEXT PRIMARY KEY NOT NULL, entries BLOB NOT NULL' +
+            ') WITHOUT ROWID'
+        )
+        connection.commit()
+
+    return connection
+
+# ----------------------------------------------------------------------------------------------- #
+
+class _SignatureDatabase:
+    """Maps directories to their pickled signatures as SCons' dbm interface requires
+
+    SCons indexes the database like a dictionary, which needs an object, so this
+    is the one place the build scripts can't make do with plain functions."""
+
+    def __init__(self, file, flag, connection):
+        self._file = file
+        self._flag = flag
+        self._connection = connection
+        self._lock = threading.Lock()
+
+    def __getitem__(self, directory):
+        with self._lock:
+            row = self._get_connection().execute(
+                'SELECT entries FROM signatures WHERE directory = ?', (directory,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(directory)
+        return row[0]
+
+    def __setitem__(self, directory, entries):
+        self._check_writable()
+        with self._lock:
+            self._get_connection().execute(
+                'INSERT OR REPLACE INTO signatures (directory, entries) VALUES (?, ?)',
+                (directory, entries)
+            )
+
+    def __delitem__(self, directory):
+        self._check_writable()
+        with self._lock:
+            self._get_connection().execute(
+                'DELETE FROM signatures WHERE directory = ?', (directory,)
+            )
+
+    def __contains__(self, directory):
+        try:
+            self[directory]
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return self._get_connection().execute(
+                'SELECT COUNT(*) FROM signatures'
+            ).fetchone()[0]
+
+    def keys(self):
+        with self._lock:
+            rows = self._get_connection().execute('SELECT directory FROM signatures').fetchall()
+        return [ row[0] for row in rows ]
+
+    def items(self):
+        with self._lock:
+            return self._get_connection().execute(
+                'SELECT directory, entries FROM signatures'
+            ).fetchall()
+
+    def sync(self):
+        """Writes the signatures stored since the last call in one transaction"""
+        with self._lock:
+            if (self._flag != 'r') and not (self._connection is None):
+                self._connection.commit()
+
+    def close(self):
+        """Commits and closes the connection, it is reopened if SCons keeps going
+
+        SCons closes the database after writing the signatures, which in interactive
+        mode (as used by watch.py) happens after each build of the same process."""
+        self.sync()
+        with self._lock:
+            if not (self._connection is None):
+                self._connection.close()
+                self._connection = None
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = _connect(self._file, self._flag)
+        return self._connection
+
+    def _check_writable(self):
+        if self._flag == 'r':
+            raise OSError('Signature database was opened for reading only')
+
+# ----------------------------------------------------------------------------------------------- #
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+"""
+Startup time benchmark for the nuclex build scripts
+
+Runs SCons on a minimal SConstruct for each kind of environment and measures how long
+importing nuclex.py and creating the environment takes, as well as which of the build
+system's modules end up being loaded. Each environment should only load the modules
+for its own language, a C++ build has no use for the .NET or Blender support.
+
+Run it before and after changing the imports to catch startup regressions:
+
+    python startupbenchmark.py --runs 10 --limit-ms 100
+"""
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Kinds of environments that will be measured, by the name of their create_*_environment()
+_environment_kinds = [ 'generic', 'cplusplus', 'dotnet', 'blender', 'godot' ]
+
+# Minimal build script that measures the import of nuclex.py and the environment creation
+_sconstruct_template = '''
+import os
+import sys
+import time
+import importlib
+
+sys.path.append({scons_directory!r})
+
+start_time = time.perf_counter()
+nuclex = importlib.import_module('nuclex')
+environment = nuclex.create_{environment_kind}_environment()
+startup_seconds = time.perf_counter() - start_time
+
+own_modules = []
+for module_name, module in list(sys.modules.items()):
+    module_path = getattr(module, '__file__', None) or ''
+    if os.path.dirname(os.path.abspath(module_path)) == {scons_directory!r}:
+        own_modules.append(module_name)
+
+print('startup-seconds=' + str(startup_seconds))
+print('loaded-modules=' + ','.join(sorted(own_modules)))
+'''
+
+# ----------------------------------------------------------------------------------------------- #
+
+def run_benchmark(scons_executable, run_count):
+    """Measures the startup time for each kind of environment
+
+    @param  scons_executable  Path of the SCons executable that will run the build scripts
+    @param  run_count         Number of times each build script is run, the median is reported
+    @returns A list of (environment kind, median startup seconds, median process seconds,
+             loaded modules) tuples, None for the times of environments that failed"""
+
+    own_directory = os.path.dirname(os.path.abspath(__file__))
+    work_directory = tempfile.mkdtemp(prefix = 'startupbenchmark-')
+    try:
+        results = []
+        for environment_kind in _environment_kinds:
+            project_directory = os.path.join(work_directory, environment_kind)
+            os.mkdir(project_directory)
+
+            with open(os.path.join(project_directory, 'SConstruct'), 'w') as sconstruct_file:
+                sconstruct_file.write(
+                    _sconstruct_template.format(
+                        scons_directory = own_directory, environment_kind = environment_kind
+                    )
+                )
+
+            startup_durations = []
+            process_durations = []
+            loaded_modules = []
+            for run_index in range(run_count):
+                measurement = _run_sconstruct(scons_executable, project_directory)
+                if measurement is None:
+                    break
+                startup_durations.append(measurement[0])
+                process_durations.append(measurement[1])
+                loaded_modules = measurement[2]
+
+            if len(startup_durations) < run_count:
+                results.append((environment_kind, None, None, []))
+            else:
+                results.append(
+                    (
+                        environment_kind,
+                        statistics.median(startup_durations),
+                        statistics.median(process_durations),
+                        loaded_modules
+                    )
+                )
+
+        return results
+
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def print_results(results):
+    """Prints the measured startup times as a table
+
+    @param  results  Results as returned by run_benchmark()"""
+
+    print('  Environment  Startup ms  Process ms  Modules loaded')
+    for environment_kind, startup_seconds, process_seconds, loaded_modules in results:
+        if startup_seconds is None:
+            print('  {:<11}  {:>10}  {:>10}  -'.format(environment_kind, 'failed', '-'))
+        else:
+            print(
+                '  {:<11}  {:>10.1f}  {:>10.1f}  {}'.format(
+                    environment_kind,
+                    startup_seconds * 1000.0,
+                    process_seconds * 1000.0,
+                    ', '.join(loaded_modules)
+                )
+            )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _run_sconstruct(scons_executable, project_directory):
+    """Runs SCons on a benchmark build script once
+
+    @param  scons_executable   Path of the SCons executable that will run the build script
+    @param  project_directory  Directory containing the benchmark build script
+    @returns A tuple of (startup seconds, process seconds, loaded modules) or None
+             if the build script failed"""
+
+    # A dry run with a fixed job count keeps SCons from doing anything but reading
+    start_time = time.perf_counter()
+    completed_process = subprocess.run(
+        [ scons_executable, '-Q', '-n', '-j1' ],
+        cwd = project_directory,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.STDOUT
+    )
+    process_seconds = time.perf_counter() - start_time
+
+    output = completed_process.stdout.decode('utf-8', errors = 'replace')
+    if completed_process.returncode != 0:
+        print(output, end = '' if output.endswith('\n') else '\n')
+        return None
+
+    startup_seconds = None
+    loaded_modules = []
+    for line in output.splitlines():
+        if line.startswith('startup-seconds='):
+            startup_seconds = float(line[len('startup-seconds='):])
+        elif line.startswith('loaded-modules='):
+            loaded_modules = list(filter(len, line[len('loaded-modules='):].split(',')))
+
+    if startup_seconds is None:
+        return None
+
+    return (startup_seconds, process_seconds, loaded_modules)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def main(arguments):
+    """Runs the startup time benchmark and prints the results
+
+    @param  arguments  Command line arguments without the script name
+    @returns The exit code for the process"""
+
+    parser = argparse.ArgumentParser(description = 'Startup time benchmark for build scripts')
+    parser.add_argument(
+        '--scons', default = shutil.which('scons') or 'scons',
+        help = 'SCons executable that runs the build scripts (default: scons in PATH)'
+    )
+    parser.add_argument(
+        '--runs', type = int, default = 5,
+        help = 'number of times each build script is run (default: 5)'
+    )
+    parser.add_argument(
+        '--limit-ms', type = float, default = None,
+        help = 'fail if any environment takes longer than this to start up'
+    )
+    options = parser.parse_args(arguments)
+
+    print('Startup of each environment kind, median of {} runs:'.format(options.runs))
+    results = run_benchmark(options.scons, options.runs)
+    print_results(results)
+
+    exit_code = 0
+    for environment_kind, startup_seconds, process_seconds, loaded_modules in results:
+        if startup_seconds is None:
+            exit_code = 1
+        elif (not (options.limit_ms is None)) and (startup_seconds * 1000.0 > options.limit_ms):
+            print(
+                '{} environment took {:.1f} ms to start up, the limit is {:.1f} ms'.format(
+                    environment_kind, startup_seconds * 1000.0, options.limit_ms
+                )
+            )
+            exit_code = 1
+
+    return exit_code
+
+# ----------------------------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+
+import os
+import atexit
+import shutil
+import importlib
+import subprocess
+
+"""
+Compiler time trace report for C/C++ builds
+
+Makes clang write a time trace for each translation unit it compiles and, at the end
+of the build, merges these traces into one report listing the headers that took
+longest to parse, the most expensive template instantiations and the functions that
+took longest to optimize, similar to what ClangBuildAnalyzer does.
+
+GCC has no per-translation-unit trace files, it prints a time report for each
+translation unit to the console instead.
+"""
+
+shared = importlib.import_module('shared')
+cplusplus = importlib.import_module('cplusplus')
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Trace events for template instantiations
+_instantiation_event_names = [ 'InstantiateClass', 'InstantiateFunction' ]
+
+# Trace events measuring the compiler frontend and backend of a translation unit
+_phase_event_names = [ 'Frontend', 'Backend' ]
+
+# Number of entries listed on the console for each category
+_reported_entry_count = 10
+
+# Path the report will be written to, None while time tracing is disabled
+_report_file_path = None
+
+# List of (object files, header directory) tuples whose traces will be merged
+_compiled_objects = None
+
+# ----------------------------------------------------------------------------------------------- #
+
+def enable(environment, report_file_path, compiled_objects):
+    """Makes the compiler measure where it spends its time for each translation unit
+
+    @param  environment       Environment whose compiler will record time traces
+    @param  report_file_path  Path the merged JSON report will be written to
+    @param  compiled_objects  List of (object files, header directory) tuples that
+                              receives all object files compiled in the build
+    @remarks
+        Changing the compiler flags recompiles everything once, so the first build with
+        time tracing covers all translation units. Object files restored from a compile
+        cache have no trace of their own."""
+
+    global _report_file_path, _compiled_objects
+
+    compiler_name = cplusplus.get_compiler_name(environment)
+    if compiler_name == 'clang':
+        if not cplusplus.supports_compiler_flag(environment, '-ftime-trace'):
+            print('Compiler does not support -ftime-trace, no time trace will be recorded')
+            return
+
+        # Clang writes the trace next to the object file, replacing its extension
+        environment.Append(CCFLAGS = [ '-ftime-trace' ])
+
+        if _report_file_path is None:
+            _report_file_path = report_file_path
+            _compiled_objects = compiled_objects
+            atexit.register(_finish_build)
+
+    elif compiler_name == 'gcc':
+        environment.Append(CCFLAGS = [ '-ftime-report' ])
+
+    else:
+        print('Time traces are only supported with clang and GCC')
+
+# ----------------------------------------------------------------------------------------------- #
+
+def write_time_trace_report(object_paths, report_file_path):
+    """Merges the time traces of several translation units into one report
+
+    @param  object_paths      Paths of the object files whose time traces will be merged
+    @param  report_file_path  Path the JSON report will be written to
+    @returns The number of translation units that had an up-to-date time trace"""
+
+    headers = {}
+    instantiations = {}
+    templates = {}
+    functions = {}
+    translation_units = []
+
+    for object_path in object_paths:
+        trace = _load_time_trace(object_path)
+        if trace is None:
+            continue
+
+        phase_microseconds = dict.fromkeys(_phase_event_names, 0)
+
+        for event in trace.get('traceEvents', []):
+            if event.get('ph') != 'X':
+                continue
+
+            name = event.get('name')
+            duration = event.get('dur', 0)
+            detail = event.get('args', {}).get('detail')
+
+            if name == 'Source':
+                _add_duration(headers, detail, duration)
+            elif name in _instantiation_event_names:
+                _add_duration(instantiations, detail, duration)
+                _add_duration(templates, _get_template_name(detail), duration)
+            elif name == 'OptFunction':
+                _add_duration(functions, detail, duration)
+            elif name in phase_microseconds:
+                phase_microseconds[name] += duration
+
+        translation_units.append(
+            {
+                'name': object_path,
+                'frontend_seconds': phase_microseconds['Frontend'] / 1000000.0,
+                'backend_seconds': phase_microseconds['Backend'] / 1000000.0
+            }
+        )
+
+    translation_units.sort(
+        key = lambda entry: entry['frontend_seconds'] + entry['backend_seconds'],
+        reverse = True
+    )
+
+    report = {
+        'translation_units': translation_units,
+        'headers': _rank_entries(headers),
+        'instantiations': _rank_entries(instantiations),
+        'templates': _rank_entries(templates),
+        'functions': _rank_entries(functions, _demangle_names(list(functions.keys())))
+    }
+    shared.save_json_file(report_file_path, report)
+
+    if len(translation_units) > 0:
+        _print_report(report, report_file_path)
+
+    return len(translation_units)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _finish_build():
+    """Merges the time traces of all compiled translation units when SCons exits"""
+
+    object_paths = []
+    for objects, header_directory in _compiled_objects:
+        for object_node in objects:
+            object_path = object_node.abspath
+            if not (object_path in object_paths):
+                object_paths.append(object_path)
+
+    write_time_trace_report(object_paths, _report_file_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _load_time_trace(object_path):
+    """Loads the time trace clang wrote when compiling an object file
+
+    @param  object_path  Path of the object file whose time trace will be loaded
+    @returns The time trace or None if there is no time trace for the current object file"""
+
+    trace_path = os.path.splitext(object_path)[0] + '.json'
+
+    # A trace older than its object file is left over from a compile without tracing
+    try:
+        if os.path.getmtime(trace_path) < os.path.getmtime(object_path):
+            return None
+    except OSError:
+        return None
+
+    return shared.load_json_file(trace_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _add_duration(entries, name, duration):
+    """Adds the duration of a trace event to the totals of the event's subject
+
+    @param  entries   Dictionary of [total microseconds, count] lists by name
+    @param  name      Name of the header, template or function the event measured
+    @param  duration  Duration of the event in microseconds"""
+
+    if name is None:
+        return
+
+    entry = entries.get(name)
+    if entry is None:
+        entries[name] = [ duration, 1 ]
+    else:
+        entry[0] += duration
+        entry[1] += 1
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _get_template_name(instantiation):
+    """Strips the template arguments from an instantiated class or function
+
+    @param  instantiation  Name of the instantiation as recorded by clang
+    @returns The name of the template, so all its instantiations can be summed up"""
+
+    if instantiation is None:
+        return None
+
+    argument_list_index = instantiation.find('<')
+    if argument_list_index == -1:
+        return instantiation
+    else:
+        return instantiation[0:argument_list_index] + '<$>'
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _rank_entries(entries, display_names = None):
+    """Sorts the measured headers, templates or functions by their total duration
+
+    @param  entries        Dictionary of [total microseconds, count] lists by name
+    @param  display_names  Optional dictionary of names to show instead of the keys
+    @returns A list of dictionaries with the name, total seconds and count of each entry"""
+
+    ranked_entries = []
+    for name, (duration, count) in entries.items():
+        if not (display_names is None):
+            name = display_names.get(name, name)
+
+        ranked_entries.append(
+            { 'name': name, 'seconds': duration / 1000000.0, 'count': count }
+        )
+
+    ranked_entries.sort(key = lambda entry: entry['seconds'], reverse = True)
+    return ranked_entries
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _demangle_names(names):
+    """Turns mangled C++ symbol names into readable names
+
+    @param  names  Mangled symbol names that will be demangled
+    @returns A dictionary of readable names by mangled name, empty if c++filt is missing"""
+
+    cplusplus_filter_path = shutil.which('c++filt')
+    if (cplusplus_filter_path is None) or (len(names) == 0):
+        return {}
+
+    try:
+        completed_process = subprocess.run(
+            [ cplusplus_filter_path ],
+            input = '\n'.join(names).encode('utf-8'),
+            stdout = subprocess.PIPE,
+            stderr = subprocess.DEVNULL
+        )
+    except OSError:
+        return {}
+
+    demangled_names = completed_process.stdout.decode('utf-8', errors = 'replace').splitlines()
+    if (completed_process.returncode != 0) or (len(demangled_names) != len(names)):
+        return {}
+
+    return dict(zip(names, demangled_names))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _print_report(report, report_file_path):
+    """Prints the most expensive parts of the compilation to the console
+
+    @param  report            Report as written by write_time_trace_report()
+    @param  report_file_path  Path of the JSON report with all entries"""
+
+    print(
+        'Time trace of {} translation units:'.format(len(report['translation_units']))
+    )
+    print('  Frontend s  Backend s  Translation unit')
+    for entry in report['translation_units'][0:_reported_entry_count]:
+        print(
+            '  {:>10.2f}  {:>9.2f}  {}'.format(
+                entry['frontend_seconds'], entry['backend_seconds'], entry['name']
+            )
+        )
+
+    _print_entries('Headers that took longest to parse:', report['headers'])
+    _print_entries('Most expensive template instantiations:', report['instantiations'])
+    _print_entries('Templates that took longest to instantiate:', report['templates'])
+    _print_entries('Functions that took longest to optimize:', report['functions'])
+
+    print('Full report written to ' + report_file_path)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _print_entries(title, ranked_entries):
+    """Prints the top entries of one category of the time trace report
+
+    @param  title           Title printed above the entries
+    @param  ranked_entries  Entries sorted by their total duration"""
+
+    if len(ranked_entries) == 0:
+        return
+
+    print(title)
+    print('   Total s  Count  Name')
+    for entry in ranked_entries[0:_reported_entry_count]:
+        print(
+            '  {:>8.2f}  {:>5}  {}'.format(entry['seconds'], entry['count'], entry['name'])
+        )
+
+# ----------------------------------------------------------------------------------------------- #
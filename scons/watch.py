@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import shutil
+import struct
+import argparse
+import platform
+import threading
+import subprocess
+
+"""
+Watch mode for SCons builds
+
+Keeps one SCons process running in interactive mode, so the build scripts are read,
+the compiler is probed and the dependency graph is set up only once. The project
+directory is watched for changes (via inotify on Linux, by polling elsewhere) and
+each batch of changes makes the SCons process rebuild whatever is out of date.
+When a build script or a module of the build system changes, SCons is restarted
+so the build scripts are read again.
+
+Run it from the directory containing the SConstruct, arguments it doesn't know are
+passed on to SCons:
+
+    python watch.py -Q DEBUG=1 .
+"""
+
+# ----------------------------------------------------------------------------------------------- #
+
+# Prompt SCons prints in interactive mode when it is ready for the next command
+_prompt = 'scons>>> '
+
+# Start of the lines SCons prints for errors, i.e. a target that failed to build
+_error_prefix = 'scons: *** '
+
+# Names of files whose changes require SCons to read the build scripts again
+_build_script_names = [ 'SConstruct', 'Sconstruct', 'sconstruct', 'SConscript' ]
+
+# Directories that never contain inputs of the build
+_ignored_directory_names = [ 'obj', 'bin', 'References', '__pycache__', 'CVS' ]
+
+# Seconds between two scans of the project directory when inotify is not available
+_polling_interval = 0.5
+
+# inotify event flags, see inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+
+# Events that indicate a file or directory has changed
+_watched_events = (
+    _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+)
+
+# Layout of the fixed-size part of an inotify event (wd, mask, cookie, name length)
+_inotify_event_header = struct.Struct('iIII')
+
+# ----------------------------------------------------------------------------------------------- #
+
+def watch(project_directory, scons_executable, scons_arguments, debounce_seconds):
+    """Rebuilds a project whenever any of its files change
+
+    @param  project_directory  Directory containing the SConstruct that will be watched
+    @param  scons_executable   Path of the SCons executable that will be run
+    @param  scons_arguments    Additional arguments passed to SCons, i.e. targets
+    @param  debounce_seconds   Time to wait for further changes before rebuilding
+    @returns The exit code for the process
+    @remarks
+        Each build checks all requested targets, but only against the dependency graph
+        kept in memory, so only the targets affected by the changes are rebuilt."""
+
+    own_directory = os.path.dirname(os.path.abspath(__file__))
+
+    watched_directories = [ project_directory ]
+    if not _is_below_directory(own_directory, project_directory):
+        watched_directories.append(own_directory)
+
+    scons = _start_scons(project_directory, scons_executable, scons_arguments)
+    try:
+        succeeded = _run_scons_command(scons, 'build')
+        _report_build_result(scons, 'Built' if succeeded else 'Build failed')
+        print('Press Ctrl+C to stop')
+
+        for changed_paths in _watch_for_changes(watched_directories, debounce_seconds):
+            start_time = time.perf_counter()
+            if scons['exited']:
+                print('Restarting SCons') # Exited earlier, i.e. due to a broken build script
+                scons = _start_scons(project_directory, scons_executable, scons_arguments)
+            elif any(_requires_reading(path, own_directory) for path in changed_paths):
+                print('Build scripts changed, restarting SCons')
+                _stop_scons(scons)
+                scons = _start_scons(project_directory, scons_executable, scons_arguments)
+
+            succeeded = _run_scons_command(scons, 'build')
+            _report_build_result(
+                scons,
+                '{} after {} changed {} in {:.2f}s'.format(
+                    'Rebuilt' if succeeded else 'Build failed',
+                    len(changed_paths),
+                    'file' if len(changed_paths) == 1 else 'files',
+                    time.perf_counter() - start_time
+                )
+            )
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        _stop_scons(scons)
+
+    return 0
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _start_scons(project_directory, scons_executable, scons_arguments):
+    """Starts SCons in interactive mode and waits until it has read the build scripts
+
+    @param  project_directory  Directory SCons will be run in
+    @param  scons_executable   Path of the SCons executable that will be run
+    @param  scons_arguments    Additional arguments passed to SCons
+    @returns A dictionary holding the SCons process, the event signalling that
+             SCons is waiting for the next command and whether it failed or exited"""
+
+    process_environment = dict(os.environ)
+    process_environment['PYTHONUNBUFFERED'] = '1' # Prompt must arrive without delay
+
+    process = subprocess.Popen(
+        [ scons_executable, '--interactive' ] + scons_arguments,
+        cwd = project_directory,
+        stdin = subprocess.PIPE,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.STDOUT, # Error messages tell whether a build has failed
+        env = process_environment
+    )
+
+    scons = {
+        'process': process, 'ready': threading.Event(), 'failed': False, 'exited': False
+    }
+
+    relay_thread = threading.Thread(target = _relay_output, args = (scons,), daemon = True)
+    relay_thread.start()
+
+    scons['ready'].wait()
+    return scons
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _stop_scons(scons):
+    """Ends an interactive SCons process
+
+    @param  scons  SCons process as returned by _start_scons()"""
+
+    process = scons['process']
+    if process.poll() is None:
+        try:
+            process.stdin.write(b'exit\n')
+            process.stdin.close()
+        except OSError:
+            pass
+
+    process.wait()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _run_scons_command(scons, command):
+    """Sends a command to an interactive SCons process and waits until it's done
+
+    @param  scons    SCons process as returned by _start_scons()
+    @param  command  Command that will be sent, i.e. 'build'
+    @returns True if the command ran without errors, False if it failed or SCons exited"""
+
+    # SCons may have reported errors while reading the build scripts
+    if scons['failed'] or scons['exited']:
+        scons['failed'] = False
+        return False
+
+    scons['ready'].clear()
+    try:
+        scons['process'].stdin.write(command.encode('utf-8') + b'\n')
+        scons['process'].stdin.flush()
+    except OSError:
+        return False # SCons exited, the relay thread signals readiness
+
+    scons['ready'].wait()
+
+    succeeded = not (scons['failed'] or scons['exited'])
+    scons['failed'] = False
+
+    return succeeded
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _report_build_result(scons, message):
+    """Prints the outcome of a build and what the watcher is going to do next
+
+    @param  scons    SCons process as returned by _start_scons()
+    @param  message  Message describing the outcome of the build"""
+
+    if not scons['exited']:
+        print(message + ', watching for changes')
+    else:
+        scons['process'].wait()
+        print(
+            'SCons exited with code ' + str(scons['process'].returncode) +
+            ', it will be restarted when files change'
+        )
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _relay_output(scons):
+    """Passes the output of an interactive SCons process on and detects its prompt
+
+    @param  scons  SCons process as returned by _start_scons()
+    @remarks
+        Error messages from SCons mark the current command as failed."""
+
+    output_descriptor = scons['process'].stdout.fileno()
+
+    pending_output = ''
+    while True:
+        chunk = os.read(output_descriptor, 65536)
+        if len(chunk) == 0:
+            break
+
+        pending_output += chunk.decode('utf-8', errors = 'replace')
+        if _error_prefix in pending_output:
+            scons['failed'] = True
+
+        # The prompt is swallowed, the watcher prints its own status instead
+        if pending_output.endswith(_prompt):
+            sys.stdout.write(pending_output[0:-len(_prompt)])
+            sys.stdout.flush()
+            pending_output = ''
+            scons['ready'].set()
+            continue
+
+        # Hold back the last, incomplete line, it may be the start of the prompt
+        line_end_index = pending_output.rfind('\n')
+        if line_end_index != -1:
+            sys.stdout.write(pending_output[0:line_end_index + 1])
+            sys.stdout.flush()
+            pending_output = pending_output[line_end_index + 1:]
+
+    sys.stdout.write(pending_output)
+    sys.stdout.flush()
+    scons['exited'] = True
+    scons['ready'].set()
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _requires_reading(path, own_directory):
+    """Checks whether a changed file requires SCons to read the build scripts again
+
+    @param  path           Path of the file that has changed
+    @param  own_directory  Directory holding the modules of the build system
+    @returns True if the file is a build script or a module of the build system"""
+
+    if os.path.basename(path) in _build_script_names:
+        return True
+
+    return path.endswith('.py') and _is_below_directory(path, own_directory)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _is_below_directory(path, directory):
+    """Checks whether a path is inside a directory or one of its subdirectories
+
+    @param  path       Path that will be checked
+    @param  directory  Directory the path may be in
+    @returns True if the path is inside the directory, False otherwise"""
+
+    relative_path = os.path.relpath(os.path.abspath(path), os.path.abspath(directory))
+    return not (relative_path == '..' or relative_path.startswith('..' + os.sep))
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _is_ignored(name):
+    """Checks whether a file or directory should be ignored by the watcher
+
+    @param  name  Name of the file or directory
+    @returns True if changes to the file or directory don't affect the build"""
+
+    # Hidden files and directories, editor swap and backup files
+    if name.startswith('.') or name.endswith('~') or name.endswith('.swp'):
+        return True
+
+    return name in _ignored_directory_names
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _watch_for_changes(watched_directories, debounce_seconds):
+    """Waits for files in the watched directories to change
+
+    @param  watched_directories  Directories that will be watched, including subdirectories
+    @param  debounce_seconds     Time to wait for further changes before reporting a batch
+    @returns A generator producing a list of changed paths for each batch of changes"""
+
+    if platform.system() == 'Linux':
+        library_path = ctypes.util.find_library('c')
+        if not (library_path is None):
+            libc = ctypes.CDLL(library_path, use_errno = True)
+            if hasattr(libc, 'inotify_init1'):
+                return _watch_with_inotify(libc, watched_directories, debounce_seconds)
+
+    return _watch_by_polling(watched_directories, debounce_seconds)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _watch_with_inotify(libc, watched_directories, debounce_seconds):
+    """Waits for files to change using Linux' inotify API
+
+    @param  libc                 C runtime library providing the inotify functions
+    @param  watched_directories  Directories that will be watched, including subdirectories
+    @param  debounce_seconds     Time to wait for further changes before reporting a batch
+    @returns A generator producing a list of changed paths for each batch of changes"""
+
+    inotify_descriptor = libc.inotify_init1(os.O_CLOEXEC)
+    if inotify_descriptor < 0:
+        error_number = ctypes.get_errno()
+        raise OSError(error_number, 'Could not initialize inotify: ' + os.strerror(error_number))
+
+    # inotify watches single directories, so each subdirectory needs its own watch
+    watched_directories_by_descriptor = {}
+
+    def add_directory_tree(root_directory):
+        for directory, directory_names, file_names in os.walk(root_directory):
+            directory_names[:] = [name for name in directory_names if not _is_ignored(name)]
+
+            watch_descriptor = libc.inotify_add_watch(
+                inotify_descriptor, os.fsencode(directory), _watched_events
+            )
+            if watch_descriptor >= 0:
+                watched_directories_by_descriptor[watch_descriptor] = directory
+
+    for watched_directory in watched_directories:
+        add_directory_tree(watched_directory)
+
+    try:
+        while True:
+            select.select([ inotify_descriptor ], [], [])
+
+            changed_paths = set()
+            while True:
+                events = os.read(inotify_descriptor, 65536)
+
+                offset = 0
+                while offset < len(events):
+                    (watch_descriptor, mask, cookie, name_length) = (
+                        _inotify_event_header.unpack_from(events, offset)
+                    )
+                    offset += _inotify_event_header.size
+                    name = os.fsdecode(events[offset:offset + name_length].rstrip(b'\0'))
+                    offset += name_length
+
+                    directory = watched_directories_by_descriptor.get(watch_descriptor)
+                    if mask & _IN_Q_OVERFLOW:
+                        changed_paths.update(watched_directories) # Events lost, just rebuild
+                    elif mask & _IN_IGNORED:
+                        watched_directories_by_descriptor.pop(watch_descriptor, None)
+                    elif (directory is None) or _is_ignored(name):
+                        continue
+                    elif (mask & _IN_ISDIR) and (mask & (_IN_CREATE | _IN_MOVED_TO)):
+                        add_directory_tree(os.path.join(directory, name))
+                        changed_paths.add(os.path.join(directory, name))
+                    else:
+                        changed_paths.add(os.path.join(directory, name))
+
+                # Editors and version control touch several files at once, wait until
+                # things calm down so they're all handled by a single build
+                (readable, writable, failed) = select.select(
+                    [ inotify_descriptor ], [], [], debounce_seconds
+                )
+                if len(readable) == 0:
+                    break
+
+            if len(changed_paths) > 0:
+                yield sorted(changed_paths)
+
+    finally:
+        os.close(inotify_descriptor)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _watch_by_polling(watched_directories, debounce_seconds):
+    """Waits for files to change by regularly comparing their modification times
+
+    @param  watched_directories  Directories that will be watched, including subdirectories
+    @param  debounce_seconds     Time to wait for further changes before reporting a batch
+    @returns A generator producing a list of changed paths for each batch of changes"""
+
+    file_states = _scan_file_states(watched_directories)
+    while True:
+        time.sleep(_polling_interval)
+
+        new_file_states = _scan_file_states(watched_directories)
+        if new_file_states == file_states:
+            continue
+
+        # Wait until the files stop changing, then report everything at once
+        while True:
+            time.sleep(debounce_seconds)
+            settled_file_states = _scan_file_states(watched_directories)
+            if settled_file_states == new_file_states:
+                break
+            new_file_states = settled_file_states
+
+        changed_paths = set(file_states.keys()) ^ set(new_file_states.keys())
+        for path, state in new_file_states.items():
+            if (path in file_states) and (file_states[path] != state):
+                changed_paths.add(path)
+
+        file_states = new_file_states
+        yield sorted(changed_paths)
+
+# ----------------------------------------------------------------------------------------------- #
+
+def _scan_file_states(watched_directories):
+    """Records the modification time and size of all files in the watched directories
+
+    @param  watched_directories  Directories whose files will be recorded
+    @returns A dictionary of (modification time, size) tuples by file path"""
+
+    file_states = {}
+    for watched_directory in watched_directories:
+        for directory, directory_names, file_names in os.walk(watched_directory):
+            directory_names[:] = [name for name in directory_names if not _is_ignored(name)]
+            for file_name in file_names:
+                if _is_ignored(file_name):
+                    continue
+
+                file_path = os.path.join(directory, file_name)
+                try:
+                    file_status = os.stat(file_path)
+                except OSError:
+                    continue # Deleted while scanning
+
+                file_states[file_path] = (file_status.st_mtime_ns, file_status.st_size)
+
+    return file_states
+
+# ----------------------------------------------------------------------------------------------- #
+
+def main(arguments):
+    """Runs SCons in watch mode
+
+    @param  arguments  Command line arguments without the script name
+    @returns The exit code for the process"""
+
+    parser = argparse.ArgumentParser(
+        description = 'Rebuilds a SCons project whenever its files change',
+        epilog = 'All other arguments are passed to SCons, i.e. targets and variables'
+    )
+    parser.add_argument(
+        '--directory', default = os.getcwd(),
+        help = 'directory containing the SConstruct (default: current directory)'
+    )
+    parser.add_argument(
+        '--scons', default = shutil.which('scons') or 'scons',
+        help = 'SCons executable that will be run (default: scons in PATH)'
+    )
+    parser.add_argument(
+        '--ignore', action = 'append', default = [], metavar = 'NAME',
+        help = 'name of another directory holding build outputs that will not be watched'
+    )
+    parser.add_argument(
+        '--debounce-ms', type = float, default = 50.0,
+        help = 'time to wait for further changes before rebuilding (default: 50)'
+    )
+    (options, scons_arguments) = parser.parse_known_args(arguments)
+
+    _ignored_directory_names.extend(options.ignore)
+
+    return watch(
+        os.path.abspath(options.directory),
+        options.scons,
+        scons_arguments,
+        options.debounce_ms / 1000.0
+    )
+
+# ----------------------------------------------------------------------------------------------- #
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))